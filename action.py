@@ -93,10 +93,7 @@ class ROAD(Action):
             return
 
         # Build a road on the specified place
-        board._game.build_road(player=player,
-                               path_coords=self.edge,
-                               ensure_connected=True,
-                               cost_resources=True)
+        board._build_road(self.edge)
         if IS_DEBUG:  # Logging for debugging
             self._logger.debug('ROAD construction is successful.')
 
@@ -129,10 +126,7 @@ class VILLAGE(Action):
             return
 
         # Build a settlement on the specified place
-        board._game.build_settlement(player=player,
-                                     coords=self.node,
-                                     ensure_connected=True,
-                                     cost_resources=True)
+        board._build_settlement(self.node)
         if IS_DEBUG:  # Logging for debugging
             self._logger.debug('VILLAGE construction is successful.')
 
@@ -165,9 +159,7 @@ class UPGRADE(Action):
             return
 
         # Build a city on the specified place
-        board._game.upgrade_settlement_to_city(player=player,
-                                               coords=self.node,
-                                               cost_resources=True)
+        board._upgrade_to_city(self.node)
         if IS_DEBUG:  # Logging for debugging
             self._logger.debug('City UPGRADE is successful.')
 
@@ -4,6 +4,7 @@ from typing import List
 from action import *
 from board import GameBoard, RESOURCES
 from queue import LifoQueue
+from visited import ExactVisitedSet
 
 
 def _make_action_sequence(state: dict) -> List[Action]:
@@ -34,7 +35,8 @@ class Agent:  # Do not change the name of this class!
         # Read initial state
         initial_state = board.get_initial_state()
         frontier.put(initial_state)
-        reached = [initial_state['state_id']]
+        reached = ExactVisitedSet()
+        reached.add(initial_state['state_id'])
 
         # Until the frontier is nonempty,
         while not frontier.empty():
@@ -76,7 +78,7 @@ class Agent:  # Do not change the name of this class!
                 # Add parent information to the next state
                 child['parent'] = (state, action)
                 frontier.put(child)
-                reached.append(child['state_id'])
+                reached.add(child['state_id'])
 
         # Return empty list if search fails.
         return []
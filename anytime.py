@@ -0,0 +1,206 @@
+# Priority queue for the frontier
+import heapq
+# Logging method for search progress
+import logging
+# Type specification for Python code
+from typing import Callable, List, Optional, Sequence
+
+# Import action specifications and the board
+from action import Action, PASS
+from board import GameBoard
+# Import the resource-dominance index for pruning
+from dominance import DominanceIndex
+
+
+def victory_point_gap(state: dict) -> int:
+    """
+    Admissible heuristic: the number of victory points still needed to end the game.
+    Each action gives at most one victory point (VILLAGE or UPGRADE), so at least this many actions are needed.
+
+    :param state: State representation
+    :return: Lower bound of the number of actions to the end of the game
+    """
+    player = state['player_id']
+    points = sum(2 if i['type'] == 'CITY' else 1
+                 for i in state['board']['intersections'].values()
+                 if i['type'] is not None and i['owner'] == player)
+    return max(0, 4 - points)
+
+
+class AnytimeWeightedAStar:
+    """
+    Anytime search driver: runs weighted A* (f = g + w * h, where g is the number of actions) repeatedly
+    with decreasing weights, and always holds the shortest plan found so far.
+    A large weight finds a plan quickly; smaller weights improve it, and the run with w = 1 proves it optimal
+    (if the heuristic is admissible). Nodes which cannot beat the best plan are pruned.
+
+    The board budgets (`remaining_time()` and `memory_budget()`) are checked regularly, and the best plan so far
+    is returned when either of them is about to run out, instead of being terminated with no result.
+    States in the frontier are kept as compact binary records (see `GameBoard.encode_state`), and successors are
+    generated with partial-order reduction (see `GameBoard.get_successor_actions`).
+
+    With a target (e.g., a configuration from `goals.enumerate_goals`), only the actions allowed by the target are
+    generated, a game end is accepted only when the target is reached, and the heuristic also counts the pieces of
+    the target not yet built.
+
+    With dominance pruning, a successor is pruned when a state with the same buildings, roads and dice roll and
+    at least as many resources has been reached with at most the same number of actions (See DominanceIndex).
+
+    Usage (in an agent):
+        return AnytimeWeightedAStar().search(board)
+        # or, toward the best goal configuration:
+        return AnytimeWeightedAStar(target=enumerate_goals(board.get_initial_state())[0]).search(board)
+    """
+
+    #: [PRIVATE] Logger instance for the driver's function calls
+    _logger = logging.getLogger('Anytime')
+
+    def __init__(self, weights: Sequence[float] = (5.0, 3.0, 2.0, 1.5, 1.0),
+                 heuristic: Callable[[dict], float] = victory_point_gap,
+                 time_margin: float = 30.0, memory_margin: int = 512 * 1024 ** 2, check_interval: int = 100,
+                 target=None, dominance: bool = False):
+        """
+        :param weights: Weights of the heuristic for each run, in decreasing order
+        :param heuristic: Function estimating the number of actions from a state to the end of the game
+        :param time_margin: Seconds to keep in reserve. The search stops when less time remains.
+        :param memory_margin: Bytes to keep in reserve. The search stops when less memory remains.
+        :param check_interval: Number of expansions between checking the budgets
+        :param target: Goal configuration to search toward (See goals.GoalConfiguration). None to accept any goal.
+        :param dominance: If True, prune successors dominated in resources by a state reached before
+            (See dominance.DominanceIndex)
+        """
+        self.weights = list(weights)
+        self.heuristic = heuristic
+        self.time_margin = time_margin
+        self.memory_margin = memory_margin
+        self.check_interval = check_interval
+        self.target = target
+        self.dominance = dominance
+        #: Number of successors pruned by dominance
+        self.dominated = 0
+        #: Best plan found so far, and its number of actions
+        self.best_plan: Optional[List[Action]] = None
+        self.best_cost = float('inf')
+
+    def _estimate(self, state: dict) -> float:
+        """
+        [PRIVATE] :return: Heuristic value of the state, including the pieces of the target not yet built
+        """
+        h = self.heuristic(state)
+        if self.target is not None:
+            h = max(h, self.target.remaining(state))
+        return h
+
+    def _out_of_budget(self, board: GameBoard) -> bool:
+        """
+        [PRIVATE] :return: True if the time or memory is about to run out
+        """
+        return board.remaining_time() < self.time_margin or board.memory_budget() < self.memory_margin
+
+    def search(self, board: GameBoard) -> List[Action]:
+        """
+        Search for the shortest plan until the budgets run out or the plan is proven optimal.
+
+        :param board: Game board to manipulate
+        :return: The best plan found. (Empty list if no plan has been found.)
+        """
+        for weight in self.weights:
+            finished = self._weighted_astar(board, weight)
+            self._logger.info(f'Weighted A* with w={weight}: best plan has {self.best_cost} actions '
+                              f'({"finished" if finished else "stopped by the budget"}).')
+            if not finished:
+                break
+            if weight <= 1.0 and self.best_plan is not None:
+                # A* with an admissible heuristic: the plan is optimal.
+                break
+
+        return list(self.best_plan) if self.best_plan is not None else []
+
+    def _weighted_astar(self, board: GameBoard, weight: float) -> bool:
+        """
+        [PRIVATE] Run a weighted A*, updating the best plan.
+
+        :param board: Game board to manipulate
+        :param weight: Weight of the heuristic
+        :return: True if the search has finished, False if it has been stopped by the budgets.
+        """
+        initial = board.get_initial_state()
+        # Search tree: node index -> (parent node index, action from the parent)
+        tree = [(-1, None)]
+        # Frontier entries: (f, -g, node index, binary state record). Deeper nodes first on ties.
+        frontier = [(weight * self._estimate(initial), 0, 0, board.encode_state(initial))]
+        # Best g found for each (state record, previous action); the previous action matters for successor
+        # generation, except after PASS. (Same keys as MemoryBoundedAStar)
+        reached = {(frontier[0][3], None): 0}
+        # Pareto-maximal resources for each layout (and previous action)
+        index = DominanceIndex(board) if self.dominance else None
+        if index is not None:
+            index.insert(frontier[0][3])
+        expansions = 0
+
+        while frontier:
+            expansions += 1
+            if expansions % self.check_interval == 0 and self._out_of_budget(board):
+                return False
+
+            _, g, node, record = heapq.heappop(frontier)
+            g = -g
+            if g + 1 >= self.best_cost:
+                # No successor can beat the best plan.
+                continue
+
+            state = board.decode_state(record, lazy=True)
+            board.set_to_state(state)
+            previous = tree[node][1]
+
+            for action in board.get_successor_actions(previous):
+                if self.target is not None and not self.target.allows(action):
+                    continue
+                # The child is valid until the next simulation, and is read only before it.
+                child = board.simulate_action(state, action, lazy=True)
+                child_g = g + 1
+                h = self._estimate(child)
+                if child_g + h >= self.best_cost:
+                    continue
+                # Same condition as board.is_game_end(), without restoring the child on the board
+                is_end = victory_point_gap(child) == 0
+                if is_end and self.target is not None and not self.target.is_reached(child):
+                    # The game ended before the target is built.
+                    continue
+
+                record = board.encode_state(child)
+                # Successors after PASS do not depend on the previous action. (See get_successor_actions)
+                key = (record, None if isinstance(action, PASS) else repr(action))
+                if reached.get(key, float('inf')) <= child_g:
+                    continue
+                reached[key] = child_g
+                if index is not None and not index.insert(record, cost=child_g, tag=key[1]):
+                    self.dominated += 1
+                    continue
+
+                tree.append((node, action))
+                child_node = len(tree) - 1
+                if is_end:
+                    self.best_plan = self._plan(tree, child_node)
+                    self.best_cost = child_g
+                    self._logger.info(f'Found a plan with {child_g} actions (w={weight}).')
+                    continue
+
+                heapq.heappush(frontier, (child_g + weight * h, -child_g, child_node, record))
+
+        return True
+
+    @staticmethod
+    def _plan(tree: list, node: int) -> List[Action]:
+        """
+        [PRIVATE] Read the actions from the root to the node.
+        """
+        actions = []
+        while node > 0:
+            node, action = tree[node]
+            actions.append(action)
+        return actions[::-1]
+
+
+# Export the driver and the heuristic
+__all__ = ['AnytimeWeightedAStar', 'victory_point_gap']
@@ -0,0 +1,196 @@
+# Package for reading/writing baselines
+import json
+# Logging method for benchmark progress
+import logging
+# Random number generator (for seeding boards)
+import random
+# Library for exiting with a status code
+import sys
+# Command line argument parser
+from argparse import ArgumentParser
+# Exception raised when a queue is empty
+from queue import Empty
+# Package for file handling
+from pathlib import Path
+# Time functions
+from time import time
+# Type specification for Python code
+from typing import Dict, List
+
+# Import the board and the evaluation process
+from board import GameBoard
+from agents.load import get_all_agents
+from evaluate import execute, evaluation_context, missing_result, SEARCH_DEADLINE, TIME_LIMIT as EVALUATION_TIME_LIMIT
+
+#: Default baseline file, committed with the repository
+BASELINE = Path(__file__).parent / 'benchmark_baseline.json'
+#: Default seeds of the benchmark boards
+SEEDS = [0, 1, 2]
+#: Default time limit for a run (sec)
+TIME_LIMIT = 30
+#: Default tolerances: metric -> (relative tolerance, absolute tolerance). A metric regresses when it is worse than
+#: the baseline by more than both of them. Counts and plans are deterministic, so they have no tolerance.
+TOLERANCES = {
+    'wall': (0.30, 0.5),  # Wall clock time (sec)
+    'cpu': (0.30, 0.5),  # CPU time, user + system (sec)
+    'memory_mb': (0.25, 20.0),  # Peak memory growth during the search (MB)
+    'expanded': (0.0, 0.0),  # Number of states expanded
+    'route': (0.0, 0.0),  # Length of the longest route
+    'actions': (0.0, 0.0),  # Number of actions of the plan
+}
+#: Metrics where a larger value is better
+_LARGER_IS_BETTER = {'route'}
+#: Agents left out unless they are given by --agents, with the reasons. (Their runs would only record timeouts.)
+EXCLUDED_AGENTS = {
+    'default': 'DFS trying PASS before VILLAGE and UPGRADE, so it passes forever and never ends the game',
+}
+
+
+def make_problem(seed: int) -> dict:
+    """
+    Build a benchmark problem. The same seed gives the same problem in any process.
+
+    :param seed: Seed of the board
+    :return: Problem specification, exported from a GameBoard
+    """
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    return board._export_problem()
+
+
+def run_benchmark(agents: List[str], seeds: List[int], time_limit: float) -> Dict[str, dict]:
+    """
+    Run each agent on each seeded board, one run at a time, so that runs do not disturb each other's timings.
+    (Each run is a fresh evaluation process, as in evaluate.py, so that it can be stopped at the time limit.)
+
+    :param agents: Names of agents to run
+    :param seeds: Seeds of the boards
+    :param time_limit: Time limit for a run (sec)
+    :return: Dictionary of '<agent>/<seed>' -> measurements
+    """
+    context = evaluation_context(agents)
+    result_queue = context.Queue()
+    runs = {}
+
+    for seed in seeds:
+        problem = make_problem(seed)
+        for agent in agents:
+            begin = time()
+            # The search deadline keeps the same share of the time limit as in the evaluation.
+            deadline = begin + time_limit * SEARCH_DEADLINE / EVALUATION_TIME_LIMIT
+            proc = execute(problem, agent, result_queue, context, dict(trial=seed, deadline=deadline))
+            result = None
+            status = None
+            while result is None:
+                try:
+                    result = result_queue.get(timeout=0.5)
+                except Empty:
+                    if time() > begin + time_limit:
+                        proc.terminate()
+                        result, status = missing_result(proc, f'Exceeded {time_limit} sec.'), 'timeout'
+                    elif not proc.is_alive():
+                        result = missing_result(proc)
+            proc.join()
+
+            metrics = result['metrics'] or {}
+            if status is None:
+                status = 'failed' if result['failure'] else 'solved'
+            runs[f'{agent}/{seed}'] = {
+                'status': status,
+                'wall': metrics.get('wall'),
+                'cpu': metrics['cpu_user'] + metrics['cpu_system'] if metrics else None,
+                'memory_mb': metrics.get('memory_mb'),
+                'expanded': metrics.get('expanded'),
+                'route': result['route'],
+                'actions': result['actions'] if result['actions'] != float('inf') else None,
+            }
+            logging.info(f'Benchmark {agent} on seed {seed}: {runs[f"{agent}/{seed}"]}')
+
+    return runs
+
+
+def compare(runs: Dict[str, dict], baseline: dict) -> List[str]:
+    """
+    Compare measurements with the baseline.
+
+    :param runs: Measurements from run_benchmark
+    :param baseline: Baseline dictionary (with 'tolerances' and 'runs')
+    :return: List of regression messages
+    """
+    tolerances = dict(TOLERANCES, **{k: tuple(v) for k, v in baseline.get('tolerances', {}).items()})
+    regressions = []
+
+    print(f'{"run":24s} {"metric":10s} {"baseline":>12s} {"current":>12s} {"change":>8s}')
+    for key, run in sorted(runs.items()):
+        base = baseline.get('runs', {}).get(key)
+        if base is None:
+            print(f'{key:24s} (no baseline)')
+            continue
+
+        if run['status'] != base['status']:
+            message = f'{key}: status changed from {base["status"]} to {run["status"]}'
+            print(f'{key:24s} {"status":10s} {base["status"]:>12s} {run["status"]:>12s}'
+                  f'{"  REGRESSION" if base["status"] == "solved" else ""}')
+            if base['status'] == 'solved':
+                regressions.append(message)
+            continue
+
+        for metric, (relative, absolute) in tolerances.items():
+            old, new = base.get(metric), run.get(metric)
+            if old is None or new is None:
+                continue
+            worse = old - new if metric in _LARGER_IS_BETTER else new - old
+            change = f'{(new - old) / old * 100:+7.1f}%' if old else ''
+            flag = ''
+            if worse > max(abs(old) * relative, absolute):
+                flag = '  REGRESSION'
+                regressions.append(f'{key}: {metric} {old} -> {new}')
+            print(f'{key:24s} {metric:10s} {old:12.3f} {new:12.3f} {change:>8s}{flag}')
+
+    return regressions
+
+
+# Main function
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Run every agent on seeded boards, and compare with the stored baseline.')
+    parser.add_argument('--baseline', type=str, default=str(BASELINE), help='Baseline JSON file.')
+    parser.add_argument('--update', action='store_true', help='Write the measurements as the new baseline.')
+    parser.add_argument('--agents', type=str, nargs='*', default=None,
+                        help='Agents to run. (Default: all, except EXCLUDED_AGENTS)')
+    parser.add_argument('--seeds', type=int, nargs='*', default=None, help='Seeds of boards. (Default: baseline)')
+    parser.add_argument('--time-limit', type=float, default=None, help='Time limit for a run. (Default: baseline)')
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    seeds = args.seeds if args.seeds else baseline.get('seeds', SEEDS)
+    time_limit = args.time_limit if args.time_limit else baseline.get('time_limit', TIME_LIMIT)
+    if args.agents:
+        agents = args.agents
+    else:
+        agents = [agent for agent in get_all_agents() if agent not in EXCLUDED_AGENTS]
+        for agent, reason in EXCLUDED_AGENTS.items():
+            logging.info(f'Benchmark skips {agent}: {reason}')
+
+    runs = run_benchmark(agents, seeds, time_limit)
+
+    if args.update:
+        baseline = {
+            'seeds': seeds,
+            'time_limit': time_limit,
+            'tolerances': baseline.get('tolerances', TOLERANCES),
+            'runs': dict({key: run for key, run in baseline.get('runs', {}).items()
+                          if key.split('/')[0] not in EXCLUDED_AGENTS}, **runs)
+        }
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f'Baseline is written to {baseline_path}')
+        sys.exit(0)
+
+    regressions = compare(runs, baseline)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s):')
+        for message in regressions:
+            print(f' - {message}')
+        sys.exit(1)
+    print('\nNo regression.')
@@ -5,6 +5,12 @@ import os
 import sys
 # Object-level deep copy method
 from copy import deepcopy
+# Hash function for fingerprinting problems
+from hashlib import sha1
+# Binary packing of state records
+from struct import Struct
+# Clock for the time budget
+from time import time
 # Random number generators
 from random import randint as random_integer, choice as random_choice, shuffle as random_shuffle
 # Type specification for Python code
@@ -13,12 +19,13 @@ from typing import Tuple, List, Dict
 # Import some class definitions that implements the Settlers of Catan game.
 from pycatan import Game, Resource
 from pycatan.board import BeginnerBoard, BuildingType, Building, BoardRenderer
+from pycatan.errors import NotEnoughResourcesError
 
 # Process information class: for memory usage tracking
 from psutil import Process as PUInfo, NoSuchProcess
 
 # Import action specifications
-from action import Action
+from action import Action, PASS, ROAD, VILLAGE, UPGRADE, TRADE
 # Import some utilities
 from util import tuple_to_coordinate, count_building, coordinate_to_tuple, tuple_to_path_coordinate
 
@@ -145,10 +152,10 @@ def _read_state(game: Game, player: int) -> dict:
                 res.name: cnt  # For each resource, the number of resource cards will be stored
                 for res, cnt in game.players[player].resources.items()
             },
-            'harbors': [  # Information about the connected harbors, with the coordinate names
+            'harbors': sorted(  # Information about the connected harbors, with the coordinate names (sorted)
                 tuple(sorted(coordinate_to_tuple(c) for c in h.path_coords))
                 for h in game.players[player].connected_harbors
-            ]
+            )
         }
     }
 
@@ -208,6 +215,727 @@ def _restore_state(game: Game, state: dict):
     return player
 
 
+class _StateCodec:
+    """
+    [PRIVATE] Encoder/decoder between state representations and compact fixed-size binary records.
+
+    Record layout (little endian):
+        - header: player ID (1 byte), connected harbors bitmask (2 bytes), dice roll (4 bytes),
+          resource counts in the order of RESOURCES (5 x 4 bytes)
+        - intersections: 4 bits per intersection, in the sorted order of coordinates.
+          (0 = empty, otherwise 1 + 2 * owner + (1 if city else 0))
+        - paths: 3 bits per path, in the sorted order of coordinates. (0 = empty, otherwise 1 + owner)
+    """
+
+    #: Format of the record header: the layout part (player ID, connected harbors bitmask, dice roll),
+    #: followed by the resource counts
+    LAYOUT_HEADER = Struct('<BHI')
+    RESOURCE_COUNTS = Struct(f'<{len(RESOURCES)}I')
+    HEADER = Struct(LAYOUT_HEADER.format + RESOURCE_COUNTS.format[1:])
+
+    def __init__(self, game: Game):
+        """
+        Build the tables for encoding and decoding, from the layout of the given game board.
+
+        :param game: Game whose board layout will be used
+        """
+        self._game = game
+        board = game.board
+
+        # Coordinates in the order of the binary layout (sorted, so that it is stable across processes)
+        self.intersections = sorted(coordinate_to_tuple(c) for c in board.intersections)
+        self.paths = sorted(tuple(sorted(coordinate_to_tuple(c) for c in p)) for p in board.paths)
+        self.harbors = sorted(tuple(sorted(coordinate_to_tuple(c) for c in p)) for p in board.harbors)
+        self._intersection_index = {c: i for i, c in enumerate(self.intersections)}
+        self._path_index = {p: i for i, p in enumerate(self.paths)}
+        self._harbor_index = {h: i for i, h in enumerate(self.harbors)}
+
+        self._intersection_bytes = (len(self.intersections) * 4 + 7) // 8
+        self._path_bytes = (len(self.paths) * 3 + 7) // 8
+        #: Size of a record in bytes
+        self.size = self.HEADER.size + self._intersection_bytes + self._path_bytes
+
+        # Information for building dictionaries in the same order as _read_state
+        self._intersection_order = [(coordinate_to_tuple(c), self._intersection_index[coordinate_to_tuple(c)],
+                                     _coordinate_to_identifier(c))
+                                    for c in board.intersections]
+        self._path_order = []
+        for p in board.paths:
+            key = tuple(sorted(coordinate_to_tuple(c) for c in p))
+            self._path_order.append((key, self._path_index[key], '-'.join(sorted(_coordinate_to_identifier(c)
+                                                                                 for c in p))))
+
+        # Tables keyed by pycatan's coordinates, for reading/writing the board directly
+        self._coords_index = {c: self._intersection_index[coordinate_to_tuple(c)] for c in board.intersections}
+        self._path_coords_index = {p: self._path_index[tuple(sorted(coordinate_to_tuple(c) for c in p))]
+                                   for p in board.paths}
+        self._harbor_coords = [tuple_to_path_coordinate(h) for h in self.harbors]
+        self._harbor_coords_index = {p: i for i, p in enumerate(self._harbor_coords)}
+        self._coords_order = list(self._coords_index.items())
+        self._path_coords_order = list(self._path_coords_index.items())
+
+        # Constant parts of state identifier
+        identifier = _unique_game_state_identifier(game).split('/')
+        self._hex_identifier = identifier[0]
+        self._harbor_identifier = identifier[-1]
+
+    def split(self, record: bytes) -> Tuple[bytes, Tuple[int, ...]]:
+        """
+        Split a binary record into its layout (the record without the resource counts) and the resource counts.
+
+        :param record: Binary record
+        :return: Tuple of (layout bytes, resource counts in the order of RESOURCES)
+        """
+        offset = self.LAYOUT_HEADER.size
+        return (bytes(record[:offset]) + bytes(record[self.HEADER.size:]),
+                self.RESOURCE_COUNTS.unpack_from(record, offset))
+
+    def encode(self, state: dict) -> bytes:
+        """
+        Encode a state representation into a binary record.
+
+        :param state: State representation (as returned by simulate_action)
+        :return: Binary record
+        """
+        if isinstance(state, _LazyState) and state._codec is self and state._is_intact():
+            # The snapshot is the record itself.
+            return state._record
+
+        resources = state['player']['resources']
+        harbors = 0
+        for h in state['player']['harbors']:
+            harbors |= 1 << self._harbor_index[tuple(h)]
+
+        intersections = 0
+        for c, i in state['board']['intersections'].items():
+            if i['type'] is not None:
+                code = 1 + 2 * i['owner'] + (1 if i['type'] == BuildingType.CITY.name else 0)
+                intersections |= code << (4 * self._intersection_index[c])
+
+        paths = 0
+        for p, i in state['board']['paths'].items():
+            if i['type']:
+                paths |= (1 + i['owner']) << (3 * self._path_index[p])
+
+        return (self.HEADER.pack(state['player_id'], harbors, state['dice_roll'],
+                                 *[resources[r] for r in RESOURCES]) +
+                intersections.to_bytes(self._intersection_bytes, 'little') +
+                paths.to_bytes(self._path_bytes, 'little'))
+
+    def snapshot(self, player: int, dice_roll: int) -> bytes:
+        """
+        Encode the current board directly into a binary record, without building a state representation.
+
+        :param player: Index of the player
+        :param dice_roll: Current dice roll
+        :return: Binary record (same as `encode(_read_state(...))`)
+        """
+        game = self._game
+        owners = {p: idx for idx, p in enumerate(game.players)}
+
+        intersections = 0
+        for c, i in game.board.intersections.items():
+            if i.building is not None:
+                code = 1 + 2 * owners[i.building.owner] + (1 if i.building.building_type is BuildingType.CITY else 0)
+                intersections |= code << (4 * self._coords_index[c])
+
+        paths = 0
+        for p, i in game.board.paths.items():
+            if i.building is not None:
+                paths |= (1 + owners[i.building.owner]) << (3 * self._path_coords_index[p])
+
+        harbors = 0
+        for h in game.players[player].connected_harbors:
+            harbors |= 1 << self._harbor_coords_index[frozenset(h.path_coords)]
+
+        resources = game.players[player].resources
+        return (self.HEADER.pack(player, harbors, dice_roll, *[resources[Resource[r]] for r in RESOURCES]) +
+                intersections.to_bytes(self._intersection_bytes, 'little') +
+                paths.to_bytes(self._path_bytes, 'little'))
+
+    def restore(self, record) -> int:
+        """
+        Restore the board directly from a binary record, without building a state representation.
+        (Same as `_restore_state(game, decode(record))`, except for the checks of hexes and harbors.)
+
+        :param record: Binary record
+        :return: Index of the player
+        """
+        game = self._game
+        player, harbors, _, intersections, paths, resources = self._unpack(record)
+
+        for c, index in self._coords_order:
+            code = (intersections >> (4 * index)) & 0xF
+            building = None
+            if code:
+                owner, is_city = divmod(code - 1, 2)
+                building = Building(building_type=BuildingType.CITY if is_city else BuildingType.SETTLEMENT,
+                                    owner=game.players[owner])
+            game.board.intersections[c].building = building
+
+        for p, index in self._path_coords_order:
+            code = (paths >> (3 * index)) & 0x7
+            game.board.paths[p].building = \
+                Building(building_type=BuildingType.ROAD, owner=game.players[code - 1]) if code else None
+
+        owner = game.players[player]
+        for r, count in zip(RESOURCES, resources):
+            owner.resources[Resource[r]] = count
+        owner.connected_harbors = {game.board.harbors[p] for i, p in enumerate(self._harbor_coords) if harbors >> i & 1}
+        return player
+
+    def _unpack(self, record) -> tuple:
+        """
+        [PRIVATE] :return: Tuple of (player, harbors bitmask, dice roll, intersections bits, paths bits,
+            list of resource counts in the order of RESOURCES)
+        """
+        header = self.HEADER.size
+        player, harbors, dice_roll, *resources = self.HEADER.unpack_from(record)
+        intersections = int.from_bytes(record[header:header + self._intersection_bytes], 'little')
+        paths = int.from_bytes(record[header + self._intersection_bytes:self.size], 'little')
+        return player, harbors, dice_roll, intersections, paths, resources
+
+    def _build_intersections(self, intersections: int) -> dict:
+        """
+        [PRIVATE] :return: 'intersections' dictionary of a state representation
+        """
+        intersection_dict = {}
+        for c, index, _ in self._intersection_order:
+            code = (intersections >> (4 * index)) & 0xF
+            if code:
+                owner, is_city = divmod(code - 1, 2)
+                building = BuildingType.CITY if is_city else BuildingType.SETTLEMENT
+                intersection_dict[c] = {'type': building.name, 'owner': owner}
+            else:
+                intersection_dict[c] = {'type': None, 'owner': None}
+        return intersection_dict
+
+    def _build_paths(self, paths: int) -> dict:
+        """
+        [PRIVATE] :return: 'paths' dictionary of a state representation
+        """
+        path_dict = {}
+        for p, index, _ in self._path_order:
+            code = (paths >> (3 * index)) & 0x7
+            if code:
+                path_dict[p] = {'type': True, 'owner': code - 1}
+            else:
+                path_dict[p] = {'type': False, 'owner': None}
+        return path_dict
+
+    def _build_hexes(self) -> dict:
+        """
+        [PRIVATE] :return: 'hexes' dictionary of a state representation
+        """
+        return {
+            coordinate_to_tuple(c): {'type': h.hex_type.name, 'dice': h.token_number}
+            for c, h in self._game.board.hexes.items()
+        }
+
+    def _build_harbors(self) -> dict:
+        """
+        [PRIVATE] :return: 'harbors' dictionary of a state representation
+        """
+        return {
+            tuple(sorted(coordinate_to_tuple(c) for c in p)): {
+                'type': i.resource.name if i.resource is not None else None
+            }
+            for p, i in self._game.board.harbors.items()
+        }
+
+    def _build_player(self, player: int, harbors: int, resources: list) -> dict:
+        """
+        [PRIVATE] :return: 'player' dictionary of a state representation
+        """
+        resources = dict(zip(RESOURCES, resources))
+        return {
+            # Resources of the player (in the order of pycatan's Resource)
+            'resources': {res.name: resources[res.name] for res in self._game.players[player].resources},
+            # Connected harbors (sorted, as _read_state does)
+            'harbors': [h for i, h in enumerate(self.harbors) if harbors >> i & 1]
+        }
+
+    def _state_id(self, player: int, intersections: int, paths: int, resources: list) -> str:
+        """
+        [PRIVATE] :return: State identifier, same as `_unique_game_state_identifier`
+        """
+        intersection_ids = []
+        for _, index, identifier in self._intersection_order:
+            code = (intersections >> (4 * index)) & 0xF
+            if code:
+                owner, is_city = divmod(code - 1, 2)
+                building = BuildingType.CITY if is_city else BuildingType.SETTLEMENT
+                intersection_ids.append(identifier + str(owner) + str(building.value))
+
+        path_ids = []
+        for _, index, identifier in self._path_order:
+            code = (paths >> (3 * index)) & 0x7
+            if code:
+                path_ids.append(identifier + str(code - 1))
+
+        # Resources of other players are not stored in a state, so read them from the game.
+        resources = dict(zip(RESOURCES, resources))
+        players = ':'.join([
+            '.'.join(str(r.value) + str(resources[r.name] if idx == player else c)
+                     for r, c in sorted(p.resources.items(), key=lambda t: t[0].name))
+            for idx, p in enumerate(self._game.players)
+        ])
+
+        return (f'{self._hex_identifier}/{":".join(intersection_ids)}/{":".join(path_ids)}/'
+                f'{players}/{self._harbor_identifier}')
+
+    def decode(self, record) -> dict:
+        """
+        Decode a binary record into a state representation.
+        The result is identical to what `_read_state` gives after restoring the state on this board.
+
+        :param record: Binary record (bytes-like object)
+        :return: State representation
+        """
+        player, harbors, dice_roll, intersections, paths, resources = self._unpack(record)
+        return {
+            'state_id': self._state_id(player, intersections, paths, resources),
+            'player_id': player,
+            'board': {
+                'hexes': self._build_hexes(),
+                'intersections': self._build_intersections(intersections),
+                'paths': self._build_paths(paths),
+                'harbors': self._build_harbors(),
+            },
+            'player': self._build_player(player, harbors, resources),
+            'dice_roll': dice_roll
+        }
+
+
+class _LazyDict(dict):
+    """
+    [PRIVATE] Dictionary whose values are built from a binary record on first access, and cached afterward.
+    It works as a plain dictionary: any operation on the whole dictionary (iteration, len, copy, comparison,
+    pickling, ...) builds the remaining values first. Copies (copy, deepcopy, pickling) are plain dictionaries.
+    """
+
+    __slots__ = ('_codec', '_record', '_pending')
+    #: Keys in the order of _read_state
+    _ORDER = ()
+
+    def __init__(self, codec: _StateCodec, record: bytes, pending, **values):
+        """
+        :param codec: Codec which made the record
+        :param record: Binary record
+        :param pending: Keys whose values are not built yet
+        :param values: Values built already
+        """
+        super().__init__(**values)
+        self._codec = codec
+        self._record = record
+        self._pending = set(pending)
+
+    def _build(self, key):
+        """
+        [PRIVATE] Build the value of a pending key.
+        """
+        raise NotImplementedError()
+
+    def __missing__(self, key):
+        if key not in self._pending:
+            raise KeyError(key)
+        self._pending.discard(key)
+        value = self._build(key)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _materialize(self) -> '_LazyDict':
+        """
+        [PRIVATE] Build all pending values, keeping the order of keys.
+        """
+        if self._pending:
+            for key in list(self._pending):
+                self[key]
+            items = [(k, dict.__getitem__(self, k)) for k in self._ORDER if dict.__contains__(self, k)]
+            items += [(k, v) for k, v in dict.items(self) if k not in self._ORDER]
+            dict.clear(self)
+            dict.update(self, items)
+        return self
+
+    def __contains__(self, key):
+        return key in self._pending or dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        self._pending.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key in self._pending:
+            self._pending.discard(key)
+        else:
+            dict.__delitem__(self, key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        self._materialize()
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        return dict.popitem(self._materialize())
+
+    def update(self, *args, **kwargs):
+        dict.update(self._materialize(), *args, **kwargs)
+
+    def clear(self):
+        self._pending.clear()
+        dict.clear(self)
+
+    def __iter__(self):
+        return dict.__iter__(self._materialize())
+
+    def __reversed__(self):
+        return dict.__reversed__(self._materialize())
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._pending)
+
+    def keys(self):
+        return dict.keys(self._materialize())
+
+    def values(self):
+        return dict.values(self._materialize())
+
+    def items(self):
+        return dict.items(self._materialize())
+
+    def __eq__(self, other):
+        return dict.__eq__(self._materialize(), other._materialize() if isinstance(other, _LazyDict) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return dict.__repr__(self._materialize())
+
+    def copy(self) -> dict:
+        return dict(self.items())
+
+    def __deepcopy__(self, memo) -> dict:
+        return deepcopy(dict(self.items()), memo)
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self.items()),)
+
+
+class _LazyBoard(_LazyDict):
+    """
+    [PRIVATE] 'board' dictionary of a lazy state: hexes, intersections, paths and harbors are built on access.
+    """
+
+    __slots__ = ()
+    _ORDER = ('hexes', 'intersections', 'paths', 'harbors')
+
+    def _build(self, key):
+        codec = self._codec
+        if key == 'hexes':
+            return codec._build_hexes()
+        if key == 'harbors':
+            return codec._build_harbors()
+        _, _, _, intersections, paths, _ = codec._unpack(self._record)
+        if key == 'intersections':
+            return codec._build_intersections(intersections)
+        return codec._build_paths(paths)
+
+
+class _LazyState(_LazyDict):
+    """
+    [PRIVATE] State representation holding a compact snapshot (binary record) of the board.
+    'state_id', 'board' (and each of its dictionaries) and 'player' are built only when they are accessed.
+    While 'board' and 'player' are not accessed (so not modified either), the board is restored directly
+    from the snapshot, and encoding the state returns the snapshot itself.
+    """
+
+    __slots__ = ()
+    _ORDER = ('state_id', 'player_id', 'board', 'player', 'dice_roll')
+
+    def __init__(self, codec: _StateCodec, record: bytes):
+        player, _, dice_roll, _, _, _ = codec._unpack(record)
+        super().__init__(codec, record, ('state_id', 'board', 'player'), player_id=player, dice_roll=dice_roll)
+
+    def _is_intact(self) -> bool:
+        """
+        [PRIVATE] :return: True if the board and the player's information are still the same as the snapshot
+        """
+        return ('board' in self._pending and 'player' in self._pending and
+                dict.get(self, 'player_id') == self._record[0])
+
+    def _build(self, key):
+        codec = self._codec
+        player, harbors, _, intersections, paths, resources = codec._unpack(self._record)
+        if key == 'state_id':
+            return codec._state_id(player, intersections, paths, resources)
+        if key == 'board':
+            return _LazyBoard(codec, self._record, _LazyBoard._ORDER)
+        return codec._build_player(player, harbors, resources)
+
+
+def _intersection_neighbors(game: Game) -> Dict[object, tuple]:
+    """
+    [PRIVATE] Build the adjacency of intersections, which does not change during a game.
+
+    :param game: Game whose board layout will be used
+    :return: Dictionary of intersection coordinate -> tuple of the coordinates connected by a path
+    """
+    board = game.board
+    return {coords: tuple(other.coords for other in board.get_intersection_connected_intersections(intersection))
+            for coords, intersection in board.intersections.items()}
+
+
+class _PlayerStatistics:
+    """
+    [PRIVATE] Statistics of the current player, derived from the board.
+    GameBoard keeps them up to date whenever a building is constructed, so that they can be read in O(1).
+
+    The legal placements of roads and villages are also kept here. They change only around the last-built piece,
+    so they are updated locally on each build (with the same rules as pycatan's get_valid_road_coords and
+    get_valid_settlement_coords with ensure_connected=True), instead of scanning the whole board on each query.
+    """
+
+    __slots__ = ('settlements', 'cities', 'roads', 'victory_points', 'multiplier', 'harbors', 'trading_rates',
+                 'neighbors', 'legal_roads', 'legal_villages', 'changes')
+    #: Fields which are replaced (not updated in place) on each build, and can be saved by reference
+    _SCALARS = ('settlements', 'cities', 'roads', 'victory_points', 'multiplier', 'harbors', 'trading_rates')
+
+    def __init__(self, game: Game = None, player: int = 0, neighbors: Dict[object, tuple] = None):
+        """
+        Count the statistics from the board.
+
+        :param game: Game to read. If None, all statistics will be empty.
+        :param player: Index of the player
+        :param neighbors: Adjacency of intersections (See _intersection_neighbors). Computed if not given.
+        """
+        #: Number of settlements (villages), cities and roads
+        self.settlements = 0
+        self.cities = 0
+        self.roads = 0
+        #: Victory points from buildings (1 per settlement, 2 per city)
+        self.victory_points = 0
+        #: Number of resource cards received on a dice roll (1 + number of cities)
+        self.multiplier = 1
+        #: Resource types of the connected harbors (None for a generic 3:1 harbor)
+        self.harbors = frozenset()
+        #: Trading rate of each resource, i.e., the number of cards to give for one card
+        self.trading_rates = {r: 4 for r in RESOURCES}
+        #: Adjacency of intersections (shared, as it never changes)
+        self.neighbors = neighbors if neighbors is not None else {}
+        #: Path coordinates (frozenset of two Coords) where the player can build a road
+        self.legal_roads = set()
+        #: Intersection coordinates (Coords) where the player can build a village
+        self.legal_villages = set()
+        #: Journal of changes to the legal placements, while it is not None: list of (set, element, added)
+        self.changes = None
+
+        if game is not None:
+            owner = game.players[player]
+            buildings = count_building(game.board.intersections.values(), owner)
+            self.settlements = buildings[BuildingType.SETTLEMENT]
+            self.cities = buildings[BuildingType.CITY]
+            self.roads = count_building(game.board.paths.values(), owner)[BuildingType.ROAD]
+            self.victory_points = self.settlements + 2 * self.cities
+            self.multiplier = 1 + self.cities
+            self.connect_harbors(owner)
+
+            # Collect the legal placements from the player's pieces
+            if neighbors is None:
+                self.neighbors = _intersection_neighbors(game)
+            board = game.board
+            for coords, intersection in board.intersections.items():
+                if intersection.building is not None and intersection.building.owner is owner:
+                    self._open_paths(board, coords)
+            for path_coords, path in board.paths.items():
+                if path.building is not None and path.building.owner is owner:
+                    for coords in path_coords:
+                        self._reach(board, coords, owner)
+
+    def save(self) -> tuple:
+        """
+        Save the statistics before a build, and start a journal of the changes to the legal placements.
+        (The sets of legal placements are not copied, so saving costs O(1).)
+
+        :return: Saved statistics, to be passed to `restore`
+        """
+        self.changes = []
+        return tuple(getattr(self, field) for field in self._SCALARS), self.changes
+
+    def restore(self, saved: tuple):
+        """
+        Restore the statistics saved by `save`, reverting the changes in its journal.
+
+        :param saved: Saved statistics
+        """
+        scalars, changes = saved
+        for field, value in zip(self._SCALARS, scalars):
+            setattr(self, field, value)
+        for placements, element, added in reversed(changes):
+            if added:
+                placements.discard(element)
+            else:
+                placements.add(element)
+        if self.changes is changes:
+            self.changes = None
+
+    def _add(self, placements: set, element):
+        """
+        [PRIVATE] Add a legal placement, recording the change in the journal.
+        """
+        if element not in placements:
+            placements.add(element)
+            if self.changes is not None:
+                self.changes.append((placements, element, True))
+
+    def _discard(self, placements: set, element):
+        """
+        [PRIVATE] Remove a legal placement, recording the change in the journal.
+        """
+        if element in placements:
+            placements.discard(element)
+            if self.changes is not None:
+                self.changes.append((placements, element, False))
+
+    def connect_harbors(self, player):
+        """
+        Read the connected harbors of the player, and update the trading rates. (Same rates as pycatan's trades)
+
+        :param player: Player object of pycatan
+        """
+        harbors = frozenset(h.resource.name if h.resource is not None else None for h in player.connected_harbors)
+        if harbors == self.harbors:
+            return
+
+        self.harbors = harbors
+        generic_rate = 3 if None in harbors else 4
+        self.trading_rates = {r: 2 if r in harbors else generic_rate for r in RESOURCES}
+
+    def _open_paths(self, board, coords):
+        """
+        [PRIVATE] Mark the empty paths at the intersection as legal roads.
+        (The player's piece is at or reaches the intersection, and no other player's building blocks it.)
+        """
+        for other in self.neighbors[coords]:
+            path_coords = frozenset((coords, other))
+            if board.paths[path_coords].building is None:
+                self._add(self.legal_roads, path_coords)
+
+    def _reach(self, board, coords, player):
+        """
+        [PRIVATE] Update the legal placements around an intersection which the player's road reaches.
+        """
+        building = board.intersections[coords].building
+        if building is None or building.owner is player:
+            # A road can be extended, unless the intersection is blocked by another player's building.
+            self._open_paths(board, coords)
+        if building is None and all(board.intersections[other].building is None for other in self.neighbors[coords]):
+            # A village can be built at an empty intersection connected by a road, keeping the distance rule.
+            self._add(self.legal_villages, coords)
+
+    def add_road(self, board, path_coords, player):
+        """
+        :param board: Board of pycatan, after building the road
+        :param path_coords: Path coordinate of the road (frozenset of two Coords)
+        :param player: Player object of pycatan
+        """
+        self.roads += 1
+        self._discard(self.legal_roads, path_coords)
+        for coords in path_coords:
+            self._reach(board, coords, player)
+
+    def add_settlement(self, board, coords, player):
+        """
+        :param board: Board of pycatan, after building the settlement
+        :param coords: Intersection coordinate of the settlement
+        :param player: Player object of pycatan
+        """
+        self.settlements += 1
+        self.victory_points += 1
+        # No village can be built at or next to the settlement.
+        self._discard(self.legal_villages, coords)
+        for other in self.neighbors[coords]:
+            self._discard(self.legal_villages, other)
+        # Roads can start from the settlement.
+        self._open_paths(board, coords)
+        # A new settlement may be placed next to a harbor.
+        self.connect_harbors(player)
+
+    def upgrade_to_city(self):
+        self.settlements -= 1
+        self.cities += 1
+        self.victory_points += 1
+        self.multiplier += 1
+
+
+def _negative_cost(building: BuildingType) -> Dict[str, int]:
+    """
+    [PRIVATE] :return: Changes of resource cards by paying for a building (resource name -> negative amount)
+    """
+    return {res.name: -amount for res, amount in building.get_required_resources().items()}
+
+
+def _action_order(action: Action) -> tuple:
+    """
+    [PRIVATE] Canonical order of actions within a turn: trades first, then roads, villages and cities,
+    each in the ascending order of resources or coordinates.
+
+    :param action: Action other than PASS
+    :return: Sort key of the action
+    """
+    if isinstance(action, TRADE):
+        return 0, RESOURCES.index(action.given.name), RESOURCES.index(action.request.name)
+    if isinstance(action, ROAD):
+        return 1, tuple(sorted(coordinate_to_tuple(c) for c in action.edge))
+    if isinstance(action, VILLAGE):
+        return 2, coordinate_to_tuple(action.node)
+    return 3, coordinate_to_tuple(action.node)
+
+
+def _depends_on(previous: Action, action: Action, game: Game) -> bool:
+    """
+    [PRIVATE] Check whether an action may have become applicable only because of the previous action.
+    If this returns False, the two actions can be swapped: both orders are applicable and reach the same state.
+    (It may return True for independent actions; that only leaves some duplicate orders.)
+
+    :param previous: Action done just before (other than PASS)
+    :param action: Action to do next
+    :param game: Game where the actions are done
+    :return: True if the action can depend on the previous action
+    """
+    if isinstance(action, TRADE):
+        if isinstance(previous, TRADE):
+            # A trade can use the resource received by the previous trade.
+            return previous.request == action.given
+        # A village next to a harbor can lower the trading rate. (Other builds only consume resources.)
+        return isinstance(previous, VILLAGE) and \
+            any(previous.node in harbor.path_coords for harbor in game.board.harbors.values())
+
+    if isinstance(previous, TRADE):
+        # Resources from a trade can be used by any build.
+        return True
+
+    if isinstance(action, ROAD):
+        # A road is connected through an adjacent road or village.
+        if isinstance(previous, ROAD):
+            return not previous.edge.isdisjoint(action.edge)
+        return isinstance(previous, VILLAGE) and previous.node in action.edge
+
+    if isinstance(action, VILLAGE):
+        # A village needs an adjacent road, and a city frees one of the three village pieces.
+        return (isinstance(previous, ROAD) and action.node in previous.edge) or isinstance(previous, UPGRADE)
+
+    # A city needs a village on the same node.
+    return isinstance(previous, VILLAGE) and previous.node == action.node
+
+
 class GameBoard:
     """
     The game board object.
@@ -233,6 +961,26 @@ class GameBoard:
     _process_info = None
     #: [PRIVATE] Maximum memory usage. Don't access this directly in your agent code!
     _max_memory = 0
+    #: [PRIVATE] The number of states expanded (restored by set_to_state). Don't access this directly in your agent code!
+    _expansion_count = 0
+    #: [PRIVATE] The number of simulate_action calls. Don't access this directly in your agent code!
+    _simulation_count = 0
+    #: [PRIVATE] Allocation profiler, notified whenever the memory usage is updated. (Only in profiling mode)
+    _memory_profiler = None
+    #: [PRIVATE] Stack of undo records for actions applied by push(). Don't access this directly in your agent code!
+    _undo_stack = []
+    #: [PRIVATE] Encoder/decoder of binary state records
+    _codec = None
+    #: [PRIVATE] Timestamp when the evaluator stops the search. None if there's no time limit.
+    _deadline = None
+    #: [PRIVATE] Memory usage (bytes) at which the evaluator stops the search. None if there's no memory limit.
+    _memory_limit = None
+    #: [PRIVATE] Recorder of board calls as binary events. (Only in tracing mode)
+    _tracer = None
+    #: [PRIVATE] Statistics of the current player (building counts, victory points, ...), kept up to date.
+    _stats = _PlayerStatistics()
+    #: [PRIVATE] Adjacency of intersections on the board
+    _neighbors = None
 
     def _initialize(self):
         """
@@ -246,6 +994,8 @@ class GameBoard:
             self._logger.debug('Initializing a new game board...')
         # Initialize a new game board
         self._game = Game(BeginnerBoard())
+        self._codec = _StateCodec(self._game)
+        self._neighbors = _intersection_neighbors(self._game)
         # Initialize board renderer for debugging purposes
         if IS_DEBUG:  # Logging for debug
             self._renderer = BoardRenderer(self._game.board)
@@ -260,6 +1010,7 @@ class GameBoard:
         # Set an order for dice roll (not used actually)
         self._dice_roll_order = [i + j for i in range(1, 7) for j in range(1, 7)]
         self._dice_roll = 0
+        self._undo_stack = []
         random_shuffle(self._dice_roll_order)
         if IS_DEBUG:  # Logging for debug
             self._logger.debug(f'The order of dice rolls = {self._dice_roll_order}')
@@ -270,16 +1021,17 @@ class GameBoard:
 
             # Query all applicable nodes for the initial village.
             applicable_nodes = self._game.board.get_valid_settlement_coords(player, ensure_connected=False)
-            # Choose a random node
-            chosen_node = random_choice(list(applicable_nodes))
+            # Choose a random node (Sorted, so that the same seed gives the same board in any process)
+            chosen_node = random_choice(sorted(applicable_nodes, key=coordinate_to_tuple))
             # Make the initial village(settlement)
             self._game.build_settlement(player=player, coords=chosen_node,
                                         cost_resources=False, ensure_connected=False)
 
             # Query all applicable road options adjacent to the lastly built village
             applicable_edges = self._game.board.get_valid_road_coords(player, connected_intersection=chosen_node)
-            # Choose a random edge
-            chosen_path = random_choice(list(applicable_edges))
+            # Choose a random edge (Sorted, as above)
+            chosen_path = random_choice(sorted(applicable_edges,
+                                               key=lambda p: sorted(coordinate_to_tuple(c) for c in p)))
             # Make the initial route
             self._game.build_road(player=player, path_coords=chosen_path, cost_resources=False)
 
@@ -287,6 +1039,9 @@ class GameBoard:
             self._logger.debug('After constructing initial village: \n' + _unique_game_state_identifier(self._game))
             self._renderer.render_board()
 
+        # Count the statistics of the initial buildings
+        self._stats = _PlayerStatistics(self._game, self._player_number, self._neighbors)
+
         # Run until the current dice roll matches with the player ID (pass the other players)
         for _ in range(self._player_number + 1):
             # For each player, roll the dice (deterministically)
@@ -312,6 +1067,83 @@ class GameBoard:
         # Update memory usage
         self._update_memory_usage()
 
+    def _export_problem(self) -> dict:
+        """
+        Export the problem of this board, so that another board (possibly in another process) can load it.
+        ONLY for evaluation purposes.
+        [WARN] Don't access this method in your agent code.
+
+        :return: Dictionary of the initial state and the order of dice rolls
+        """
+        return {
+            'initial': deepcopy(self._initial),  # Initial state representation
+            'dice_roll_order': list(self._dice_roll_order)  # Order of dice rolls
+        }
+
+    def _load_problem(self, problem: dict):
+        """
+        Load a problem exported by `_export_problem`. The board should be initialized before loading,
+        possibly in another process which forked the current process.
+        ONLY for evaluation purposes.
+        [WARN] Don't access this method in your agent code.
+
+        :param problem: Exported problem specification
+        """
+        # Track the memory usage of this process (The board may have been built in another process.)
+        self._process_info = PUInfo(os.getpid())
+        self._max_memory = 0
+
+        # Clear the resources of all players, as only the player's resources are stored in a state.
+        for player in self._game.players:
+            for res in player.resources:
+                player.resources[res] = 0
+        self._game.longest_road_owner = None
+
+        self._initial = deepcopy(problem['initial'])
+        self._dice_roll_order = list(problem['dice_roll_order'])
+        self._set_to_state(self._initial)
+
+        # Reset search statistics
+        self._expansion_count = 0
+        self._simulation_count = 0
+
+        if IS_DEBUG:  # Logging for debug
+            self._logger.debug(f'Problem loaded. The order of dice rolls = {self._dice_roll_order}')
+
+    def _problem_fingerprint(self) -> str:
+        """
+        Compute a fingerprint of the current problem, which is stable across processes and runs.
+        (The hexagon part of the state identifier is excluded, as its order can differ among processes.)
+        ONLY for evaluation purposes.
+
+        :return: Hexadecimal string of the fingerprint
+        """
+        initial = self._initial
+        layout = (
+            # Buildings on the intersections
+            sorted((c, i['type'], i['owner']) for c, i in initial['board']['intersections'].items()
+                   if i['type'] is not None),
+            # Roads on the paths
+            sorted((p, i['owner']) for p, i in initial['board']['paths'].items() if i['type']),
+            # Resources of the player
+            sorted(initial['player']['resources'].items()),
+            initial['player_id'],
+            initial['dice_roll'],
+            list(self._dice_roll_order)
+        )
+        return sha1(repr(layout).encode('utf-8')).hexdigest()
+
+    def _get_search_statistics(self) -> Dict[str, int]:
+        """
+        Get the statistics of the search done on this board. ONLY for evaluation purposes.
+
+        :return: Dictionary with the number of expanded states and the number of simulate_action calls
+        """
+        return {
+            'expanded': self._expansion_count,  # Number of set_to_state calls
+            'simulated': self._simulation_count  # Number of simulate_action calls
+        }
+
     def _add_yield(self):
         """
         Add yield for every turn, as specified in the README.md file.
@@ -319,8 +1151,7 @@ class GameBoard:
 
         # Query the player's current building state
         player = self._game.players[self._player_number]
-        bldg_count = count_building(self._game.board.intersections.values(), player)
-        multiple = 1 + bldg_count[BuildingType.CITY]
+        multiple = self._stats.multiplier
 
         player.add_resources({
             Resource[r.upper()]: multiple
@@ -331,14 +1162,35 @@ class GameBoard:
         """
         Restore the board to the initial state for repeated evaluation.
 
+        :param specific_state: A state representation which the board reset to
+        """
+        # Count the number of expanded states
+        self._expansion_count += 1
+        self._set_to_state(specific_state)
+
+        if self._tracer is not None:  # Recording for tracing
+            self._tracer.record('set_to_state', state=self._initial if specific_state is None else specific_state)
+
+    def _set_to_state(self, specific_state=None):
+        """
+        [PRIVATE] Restore the board to the given state, without counting it as an expansion.
+
         :param specific_state: A state representation which the board reset to
         """
         if specific_state is None:
             specific_state = self._initial
 
-        # Restore the board to the given state.
-        self._player_number = _restore_state(self._game, specific_state)
+        # Restore the board to the given state. (A snapshot is restored directly, if it is not modified.)
+        if isinstance(specific_state, _LazyState) and specific_state._codec is self._codec and \
+                specific_state._is_intact():
+            self._player_number = self._codec.restore(specific_state._record)
+        else:
+            self._player_number = _restore_state(self._game, specific_state)
         self._dice_roll = specific_state['dice_roll']
+        # Recount the statistics of the restored buildings
+        self._stats = _PlayerStatistics(self._game, self._player_number, self._neighbors)
+        # Actions applied before cannot be undone anymore.
+        self._undo_stack = []
 
         # Update memory usage
         self._update_memory_usage()
@@ -355,9 +1207,8 @@ class GameBoard:
         :param state: A state to check. If None, then it will use the initial state.
         :return: True if the game ends at the given state
         """
-        player = self._game.players[self._player_number]
-        adjustment = -2 if player is self._game.longest_road_owner else 0
-        is_game_end = self._game.get_victory_points(player) + adjustment >= 4
+        # Victory points from the buildings only. (Points of the longest road are not counted.)
+        is_game_end = self._stats.victory_points >= 4
         if IS_DEBUG:  # Logging for debug
             self._logger.debug(f'Querying whether the game ends in this state... Answer = {is_game_end}')
         return is_game_end
@@ -386,25 +1237,22 @@ class GameBoard:
         if IS_DEBUG:  # Logging for debug
             self._logger.debug('Querying applicable roads...')
 
-        # Query the player's current building state
-        player = self._game.players[self._player_number]
-        path_count = count_building(self._game.board.paths.values(), player)
-
         # If the number of current road is 10, then we cannot build a road anymore.
-        if path_count[BuildingType.ROAD] >= 10:
+        if self._stats.roads >= 10:
             if IS_DEBUG:  # Logging for debug
                 self._logger.debug('All road blocks are already in use. You cannot construct it now.')
             return []
 
-        # Read all applicable positions
-        applicable_positions = \
-            self._game.board.get_valid_road_coords(self._game.players[self._player_number],
-                                                   ensure_connected=True)
-        # Make it to a basic python tuples
-        applicable_positions = [
+        # Read all applicable positions (kept up to date on each build)
+        applicable_positions = self._stats.legal_roads
+        # Make it to a basic python tuples.
+        # (Sorted: the set is filled in the order of board.intersections and board.paths, which pycatan builds
+        #  from a set of Hex objects hashed by their addresses. Coords hash deterministically, but the order of
+        #  a set also depends on the order of insertion, so it differs between processes on the same board.)
+        applicable_positions = sorted(
             tuple(sorted([coordinate_to_tuple(coord) for coord in coord_set]))
             for coord_set in applicable_positions
-        ]
+        )
 
         # Update memory usage
         self._update_memory_usage()
@@ -421,24 +1269,20 @@ class GameBoard:
         :return: A copy of the list of applicable village coordinates.
             (List of Coordinate tuples[Q, R].)
         """
-        # Query the player's current building state
-        player = self._game.players[self._player_number]
-        village_count = count_building(self._game.board.intersections.values(), player)
-
         # If the number of current village is 3, then we cannot build a village anymore.
-        if village_count[BuildingType.SETTLEMENT] >= 3:
+        if self._stats.settlements >= 3:
             if IS_DEBUG:  # Logging for debug
                 self._logger.debug('All village blocks are already in use. You cannot construct it now.')
             return []
 
-        # Read all applicable positions
-        applicable_positions = \
-            self._game.board.get_valid_settlement_coords(player, ensure_connected=True)
-        # Make it to a basic python tuples
-        applicable_positions = [
+        # Read all applicable positions (kept up to date on each build)
+        applicable_positions = self._stats.legal_villages
+        # Make it to a basic python tuples (sorted, as the order of the set differs between processes;
+        # See get_applicable_roads)
+        applicable_positions = sorted(
             coordinate_to_tuple(coord)
             for coord in applicable_positions
-        ]
+        )
 
         # Update memory usage
         self._update_memory_usage()
@@ -455,12 +1299,10 @@ class GameBoard:
         :return: A copy of the list of applicable village coordinates.
             (List of Coordinate tuples[Q, R].)
         """
-        # Query the player's current building state
         player = self._game.players[self._player_number]
-        village_count = count_building(self._game.board.intersections.values(), player)
 
         # If the number of current city is 3, then we cannot build a city anymore.
-        if village_count[BuildingType.CITY] >= 3:
+        if self._stats.cities >= 3:
             if IS_DEBUG:  # Logging for debug
                 self._logger.debug('All city blocks are already in use. You cannot construct it now.')
             return []
@@ -468,11 +1310,12 @@ class GameBoard:
         # Read all applicable positions
         applicable_positions = \
             self._game.board.get_valid_city_coords(player)
-        # Make it to a basic python tuples
-        applicable_positions = [
+        # Make it to a basic python tuples (sorted, as the order of the set differs between processes;
+        # See get_applicable_roads)
+        applicable_positions = sorted(
             coordinate_to_tuple(coord)
             for coord in applicable_positions
-        ]
+        )
 
         # Update memory usage
         self._update_memory_usage()
@@ -482,6 +1325,86 @@ class GameBoard:
         # Return applicable positions as list of tuples.
         return applicable_positions
 
+    def get_successor_actions(self, previous_action: Action = None) -> List[Action]:
+        """
+        Get the applicable actions at the current board, skipping the orders of actions which only reorder
+        independent actions of the same turn (partial-order reduction).
+        Within a turn, an action is generated only when it comes after the previous action in a canonical order
+        (trades before builds; roads, villages and cities in the ascending order of coordinates),
+        or when it may depend on the previous action (e.g., a road extending the previous road).
+
+        Every state reachable by any sequence of actions stays reachable, by a sequence of the same length
+        which obeys the canonical order. As the generated actions depend on the previous action,
+        a search pruning duplicate states should identify a state together with its previous action,
+        e.g., `(state['state_id'], repr(previous_action))`. Otherwise, some states may become unreachable.
+
+        Builds which the player cannot afford are not generated, as they do nothing. (See get_productive_actions)
+
+        :param previous_action: Action which led to the current board. None (or PASS) at the start of a turn.
+        :return: List of applicable actions: trades, cities, villages, PASS and roads.
+        """
+        # Build productive actions, in the same order as the default agents.
+        actions = self.get_productive_actions()
+
+        if previous_action is None or isinstance(previous_action, PASS):
+            # Any action can start a turn.
+            return actions
+
+        order = _action_order(previous_action)
+        actions = [a for a in actions
+                   if isinstance(a, PASS) or _action_order(a) >= order or
+                   _depends_on(previous_action, a, self._game)]
+
+        if IS_DEBUG:  # Logging for debug
+            self._logger.debug(f'Canonical successor actions after {previous_action}: {actions}')
+        return actions
+
+    def get_productive_actions(self, with_resources: bool = False) -> list:
+        """
+        Get the actions which change the current board: trades possible at the current rates, and the cities,
+        villages and roads which the player can afford at the applicable positions, with PASS.
+        (A build without enough resources does nothing, so simulating it only gives a copy of the current state.)
+
+        :param with_resources: If True, tag each action with the resource cards after the action.
+        :return: List of actions, in the same order as the default agents: trades, cities, villages, PASS and roads.
+            If with_resources is True, list of (action, dictionary of resource name to number of cards).
+        """
+        player = self._game.players[self._player_number]
+        resources = {res.name: count for res, count in player.resources.items()}
+
+        actions = []
+        # Trades possible at the current rates
+        for given in RESOURCES:
+            rate = self._stats.trading_rates[given]
+            if resources[given] < rate:
+                continue
+            for request in RESOURCES:
+                if request != given:
+                    actions.append((TRADE(given, request), {given: -rate, request: 1}))
+        # Buildings which the player can afford
+        if player.has_resources(BuildingType.CITY.get_required_resources()):
+            cost = _negative_cost(BuildingType.CITY)
+            actions += [(UPGRADE(v), cost) for v in self.get_applicable_cities()]
+        if player.has_resources(BuildingType.SETTLEMENT.get_required_resources()):
+            cost = _negative_cost(BuildingType.SETTLEMENT)
+            actions += [(VILLAGE(v), cost) for v in self.get_applicable_villages()]
+        # PASS always changes the dice roll. Resources are given for each dice roll other than 7.
+        rolls = sum(1 for i in range(1, len(self._game.players) + 1)
+                    if self._dice_roll_order[(self._dice_roll + i) % len(self._dice_roll_order)] != 7)
+        actions.append((PASS(), {r: rolls * self._stats.multiplier for r in RESOURCES}))
+        if player.has_resources(BuildingType.ROAD.get_required_resources()):
+            cost = _negative_cost(BuildingType.ROAD)
+            actions += [(ROAD(road), cost) for road in self.get_applicable_roads()]
+
+        if IS_DEBUG:  # Logging for debug
+            self._logger.debug(f'Productive actions: {[a for a, _ in actions]}')
+
+        if not with_resources:
+            return [action for action, _ in actions]
+        # Apply the changes of resources
+        return [(action, {r: count + change.get(r, 0) for r, count in resources.items()})
+                for action, change in actions]
+
     def get_resource_cards(self) -> Dict[str, int]:
         """
         Get the number of resource cards that the player have.
@@ -521,21 +1444,16 @@ class GameBoard:
         :return: The minimum number of resources required to get one required resource.
         If trading is impossible, then -1 will be given.
         """
-        # Get all possible trade conditions
-        trading_conds = self._game.players[self._player_number].get_possible_trades()
-        # Filter out other resources
+        # Read the trading rate given by the connected harbors
         resource = Resource[resource.upper()]
-        trading_conds = [-c[resource] for c in trading_conds
-                         if c.get(resource, 0) < 0]
+        min_cond = self._stats.trading_rates[resource.name]
 
-        if not trading_conds:
+        if self._game.players[self._player_number].resources[resource] < min_cond:
             # If you cannot do trading due to lack of resources, the trading rate will be returned as -1.
             if IS_DEBUG:  # Logging for debug
                 self._logger.debug(f'Not enough {resource} resources for TRADE.')
             return -1
 
-        # Return minimum trading rate
-        min_cond = min(trading_conds)
         if IS_DEBUG:  # Logging for debug
             self._logger.debug(f'To get one of other resource cards, you need {min_cond} {resource} cards.')
 
@@ -563,6 +1481,35 @@ class GameBoard:
         # Return it.
         return roll
 
+    def _set_budgets(self, deadline: float = None, memory_limit: int = None):
+        """
+        Set the limits enforced by the evaluator. ONLY for evaluation purposes.
+        [WARN] Don't access this method in your agent code.
+
+        :param deadline: Timestamp (time.time()) when the search will be stopped. None if there's no time limit.
+        :param memory_limit: Memory usage (RSS, bytes) at which the search will be stopped. None if there's no limit.
+        """
+        self._deadline = deadline
+        self._memory_limit = memory_limit
+
+    def remaining_time(self) -> float:
+        """
+        :return: Seconds left until the evaluator stops the search. (Infinity if there's no time limit)
+        """
+        if self._deadline is None:
+            return float('inf')
+        return self._deadline - time()
+
+    def memory_budget(self) -> float:
+        """
+        :return: Bytes which the process can allocate more, before the evaluator stops the search.
+            (Infinity if there's no memory limit, or the memory usage cannot be tracked)
+        """
+        current = self.get_current_memory_usage()
+        if self._memory_limit is None or current < 0:
+            return float('inf')
+        return self._memory_limit - current
+
     def get_current_memory_usage(self):
         """
         :return: Current memory usage for the process having this board
@@ -589,7 +1536,216 @@ class GameBoard:
         if self._max_memory >= 0:
             self._max_memory = max(self._max_memory, self.get_current_memory_usage())
 
-    def simulate_action(self, state: dict = None, *actions: Action) -> dict:
+        if self._memory_profiler is not None:
+            self._memory_profiler.update()
+
+    def _build_road(self, edge: frozenset):
+        """
+        [PRIVATE] Build a road of the current player, paying the resources, and update the statistics.
+
+        :param edge: Path coordinate (frozenset of two Coords)
+        """
+        player = self._game.players[self._player_number]
+        required = BuildingType.ROAD.get_required_resources()
+        if not player.has_resources(required):
+            raise NotEnoughResourcesError('Player does not have the resources to build a road')
+        # Same as Game.build_road, except for the longest road token: pycatan recomputes the longest road on every
+        # road only to update the token, which gives victory points not counted in this game.
+        self._game.board.add_path_building(player=player,
+                                           path_coords=edge,
+                                           building_type=BuildingType.ROAD,
+                                           ensure_connected=True)
+        player.remove_resources(required)
+        self._stats.add_road(self._game.board, frozenset(edge), player)
+
+    def _build_settlement(self, node):
+        """
+        [PRIVATE] Build a settlement of the current player, paying the resources, and update the statistics.
+
+        :param node: Intersection coordinate (Coords)
+        """
+        player = self._game.players[self._player_number]
+        self._game.build_settlement(player=player,
+                                    coords=node,
+                                    ensure_connected=True,
+                                    cost_resources=True)
+        self._stats.add_settlement(self._game.board, node, player)
+
+    def _upgrade_to_city(self, node):
+        """
+        [PRIVATE] Upgrade a settlement of the current player to a city, paying the resources,
+        and update the statistics.
+
+        :param node: Intersection coordinate (Coords)
+        """
+        self._game.upgrade_settlement_to_city(player=self._game.players[self._player_number],
+                                              coords=node,
+                                              cost_resources=True)
+        self._stats.upgrade_to_city()
+
+    def push(self, action: Action):
+        """
+        Apply an action to the current board in place, and remember how to undo it.
+        Unlike `simulate_action`, this neither restores nor reads a whole state, so walking down and back up
+        a search tree costs O(1) per move. (Useful for depth-first searches such as DFS or IDA*)
+
+        Usage:
+            - `board.push(action)` applies `action` to the current board.
+            - `board.pop()` undoes the last pushed action.
+            - `board.get_current_state()` builds the state representation of the current board, only when needed.
+
+        Calling `set_to_state` or `simulate_action` clears the actions pushed so far.
+
+        :param action: Action to apply
+        """
+        if IS_DEBUG:  # Logging for debug
+            self._logger.debug(f'Pushing an action: {action}')
+
+        player = self._game.players[self._player_number]
+        board = self._game.board
+
+        # Record the building which can be replaced by the action
+        intersection = None
+        path = None
+        if isinstance(action, ROAD):
+            key = frozenset(action.edge)
+            if key in board.paths:
+                path = (key, board.paths[key].building)
+        elif isinstance(action, (VILLAGE, UPGRADE)):
+            if action.node in board.intersections:
+                intersection = (action.node, board.intersections[action.node].building)
+
+        # Undo record: (action, resources, dice roll, longest road owner, connected harbors,
+        #               saved statistics with the journal of changed placements,
+        #               (intersection coordinate, previous building), (path coordinate, previous building))
+        record = (action, dict(player.resources), self._dice_roll, self._game.longest_road_owner,
+                  set(player.connected_harbors), self._stats.save(), intersection, path)
+
+        try:
+            action(self)
+        except Exception:
+            # Revert partial changes (e.g., when the action is not applicable), and let the caller know.
+            self._undo(record)
+            raise
+        # Stop recording changes (Later changes belong to the next push)
+        self._stats.changes = None
+
+        self._undo_stack.append(record)
+        # Count the number of simulations
+        self._simulation_count += 1
+
+        if self._tracer is not None:  # Recording for tracing
+            self._tracer.record('push', action=action)
+
+        # Update memory usage
+        self._update_memory_usage()
+
+    def pop(self) -> Action:
+        """
+        Undo the last action applied by `push`.
+
+        :return: The action undone
+        """
+        assert self._undo_stack, 'There is no action to undo. (set_to_state or simulate_action clears the actions)'
+        record = self._undo_stack.pop()
+        self._undo(record)
+
+        if self._tracer is not None:  # Recording for tracing
+            self._tracer.record('pop', action=record[0])
+
+        if IS_DEBUG:  # Logging for debug
+            self._logger.debug(f'Popped an action: {record[0]}')
+
+        return record[0]
+
+    def _undo(self, record: tuple):
+        """
+        [PRIVATE] Restore the board using an undo record.
+
+        :param record: Undo record made in `push`
+        """
+        _, resources, dice_roll, longest_road_owner, harbors, saved_stats, intersection, path = record
+        player = self._game.players[self._player_number]
+
+        player.resources.update(resources)
+        self._dice_roll = dice_roll
+        self._game.longest_road_owner = longest_road_owner
+        player.connected_harbors = harbors
+        self._stats.restore(saved_stats)
+
+        if intersection is not None:
+            self._game.board.intersections[intersection[0]].building = intersection[1]
+        if path is not None:
+            self._game.board.paths[path[0]].building = path[1]
+
+    def get_current_state(self) -> dict:
+        """
+        Build the state representation of the current board. (e.g., after some actions are pushed)
+
+        :return: State representation dictionary
+        """
+        state = _read_state(self._game, self._player_number)
+        state['dice_roll'] = self._dice_roll
+
+        # Update memory usage
+        self._update_memory_usage()
+
+        return state
+
+    def get_state_record_size(self) -> int:
+        """
+        :return: The size of a binary state record in bytes. (Every record has the same size.)
+        """
+        return self._codec.size
+
+    def encode_state(self, state: dict) -> bytes:
+        """
+        Encode a state into a compact binary record.
+        The record keeps buildings, roads, resources, connected harbors and dice roll of the state.
+        (Information added by agents, such as 'parent', is not kept.)
+
+        :param state: State representation to encode
+        :return: Fixed-size bytes record
+        """
+        return self._codec.encode(state)
+
+    def decode_state(self, record, lazy: bool = False) -> dict:
+        """
+        Decode a binary record into a state representation, which can be passed to `set_to_state`.
+        For a state read from this board, `decode_state(encode_state(state))` is identical to the state.
+
+        :param record: Bytes record made by `encode_state`
+        :param lazy: If True, return a lazy state holding the record (See simulate_action)
+        :return: State representation
+        """
+        if lazy:
+            return _LazyState(self._codec, bytes(record))
+        return self._codec.decode(record)
+
+    def encode_states(self, states: List[dict]) -> bytes:
+        """
+        Encode a list of states into concatenated binary records.
+
+        :param states: List of state representations
+        :return: Bytes of concatenated records
+        """
+        encode = self._codec.encode
+        return b''.join([encode(s) for s in states])
+
+    def decode_states(self, records) -> List[dict]:
+        """
+        Decode concatenated binary records into a list of state representations.
+
+        :param records: Bytes-like object of concatenated records, made by `encode_states`
+        :return: List of state representations
+        """
+        size = self._codec.size
+        records = memoryview(records)
+        assert len(records) % size == 0, 'The length of records should be a multiple of the record size.'
+        decode = self._codec.decode
+        return [decode(records[i:i + size]) for i in range(0, len(records), size)]
+
+    def simulate_action(self, state: dict = None, *actions: Action, lazy: bool = False) -> dict:
         """
         Simulate given actions.
 
@@ -598,16 +1754,30 @@ class GameBoard:
             - `simulate_action(state, action1, action2)` will execute two consecutive actions, `action1` and `action2`
             - ...
             - `simulate_action(state, *action_list)` will execute actions in the order specified in the `action_list`
+            - `simulate_action(state, action1, lazy=True)` returns a lazy state (See below)
+
+        A lazy state works as the state dictionary, but it only holds a compact snapshot of the board, and builds
+        'state_id', 'board' (each of hexes, intersections, paths and harbors) and 'player' when they are accessed.
+        Until 'board' and 'player' are accessed, `set_to_state` restores the board directly from the snapshot,
+        and `encode_state` returns the snapshot. (Useful when most children are only compared by 'state_id'.)
 
         :param state: State where the simulation starts from. If None, the simulation starts from the initial state.
         :param actions: Actions to simulate or execute.
+        :param lazy: If True, return a lazy state.
         :return: The last state after simulating all actions
         """
         if IS_DEBUG:  # Logging for debug
             self._logger.debug(f'------- SIMULATION START: {actions} -------')
 
+        # Count the number of simulations
+        self._simulation_count += 1
+
         # Restore to the given state
-        self.set_to_state(state)
+        self._set_to_state(state)
+
+        if self._tracer is not None:  # Recording for tracing
+            for act in actions:
+                self._tracer.record('simulate_action', action=act, state=self._initial if state is None else state)
 
         for act in actions:  # For each actions in the variable arguments,
             # Run actions through calling each action object
@@ -618,8 +1788,14 @@ class GameBoard:
                 break
 
         # Copy the current state to return
-        self._current = _read_state(self._game, self._player_number)
-        self._current['dice_roll'] = self._dice_roll
+        if lazy:
+            self._current = _LazyState(self._codec, self._codec.snapshot(self._player_number, self._dice_roll))
+        else:
+            self._current = _read_state(self._game, self._player_number)
+            self._current['dice_roll'] = self._dice_roll
+
+        if self._tracer is not None:  # Recording for tracing
+            self._tracer.record('result', state=self._current)
 
         if IS_DEBUG:  # Logging for debug
             self._logger.debug('State has been changed to: \n' + _unique_game_state_identifier(self._game))
@@ -630,6 +1806,9 @@ class GameBoard:
         # Update memory usage
         self._update_memory_usage()
 
+        if lazy:
+            # A new lazy state has nothing to be shared.
+            return self._current
         return deepcopy(self._current)
 
 
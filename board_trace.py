@@ -0,0 +1,339 @@
+# Hash function for making state keys
+from hashlib import blake2b
+# Memory-mapped files (for ring buffers which survive a killed process)
+import mmap
+# Package for serializing the problem (state representations have tuple keys, so JSON cannot be used)
+import pickle
+# Library for writing the rendered board to stdout
+import sys
+# Command line argument parser for the offline tool
+from argparse import ArgumentParser
+# Binary packing of events
+from struct import Struct
+# Package for file handling
+from pathlib import Path
+# High-resolution clock for timestamps
+from time import perf_counter_ns
+# Type specification for Python code
+from typing import Dict, List, Tuple
+
+# Board renderer of the Settlers of Catan game
+from pycatan.board import BoardRenderer
+
+# Import action specifications
+from action import Action, PASS, ROAD, VILLAGE, UPGRADE, TRADE
+# Import the board and the order of resources (used by trade codes)
+from board import GameBoard, RESOURCES
+# Import some utilities
+from util import coordinate_to_tuple
+
+
+#: Format of an event: timestamp (ns since the recorder started), method code, action code, state key
+EVENT = Struct('<QBHQ')
+
+#: Interval (ns) of flushing the files without a ring buffer
+FLUSH_INTERVAL = 1000000000
+#: Header of the events file in ring buffer mode: number of events recorded (including those overwritten)
+RING_HEADER = Struct('<Q')
+
+#: Method codes of events
+METHODS = {
+    'set_to_state': 1,  # A state is restored. (Key of the restored state)
+    'simulate_action': 2,  # An action is simulated. (Key of the state where the simulation starts)
+    'result': 3,  # A simulation has finished. (Key of the resulting state)
+    'push': 4,  # An action is pushed. (No state key)
+    'pop': 5,  # An action is popped. (No state key)
+}
+#: Method names of codes
+METHOD_NAMES = {code: name for name, code in METHODS.items()}
+
+#: Action codes are (type << 12 | argument). The argument is an index of a path/intersection or a trade pair.
+_ACTION_TYPES = [PASS, ROAD, VILLAGE, UPGRADE, TRADE]
+#: Action code when there is no action
+NO_ACTION = 0xFFFF
+
+
+def _file_names(prefix) -> Tuple[Path, Path, Path]:
+    """
+    :return: Paths of the event file, the state record file, and the problem file of a trace
+    """
+    prefix = Path(prefix)
+    return (prefix.with_name(prefix.name + '.events'),
+            prefix.with_name(prefix.name + '.states'),
+            prefix.with_name(prefix.name + '.problem'))
+
+
+def encode_action(action: Action, codec) -> int:
+    """
+    Encode an action into a 16-bit code.
+
+    :param action: Action to encode
+    :param codec: State codec of the board (which numbers the paths and intersections)
+    :return: Action code
+    """
+    kind = _ACTION_TYPES.index(type(action))
+    argument = 0
+    if isinstance(action, ROAD):
+        argument = codec._path_index[tuple(sorted(coordinate_to_tuple(c) for c in action.edge))]
+    elif isinstance(action, (VILLAGE, UPGRADE)):
+        argument = codec._intersection_index[coordinate_to_tuple(action.node)]
+    elif isinstance(action, TRADE):
+        argument = len(RESOURCES) * RESOURCES.index(action.given.name) + \
+                   RESOURCES.index(action.request.name)
+    return kind << 12 | argument
+
+
+def decode_action(code: int, codec) -> Action:
+    """
+    Decode an action code.
+
+    :param code: Action code made by `encode_action`
+    :param codec: State codec of the board
+    :return: Action
+    """
+    kind, argument = _ACTION_TYPES[code >> 12], code & 0xFFF
+    if kind is ROAD:
+        return ROAD(codec.paths[argument])
+    if kind in (VILLAGE, UPGRADE):
+        return kind(codec.intersections[argument])
+    if kind is TRADE:
+        given, request = divmod(argument, len(RESOURCES))
+        return TRADE(RESOURCES[given], RESOURCES[request])
+    return PASS()
+
+
+def state_key(state: dict) -> int:
+    """
+    :return: 64-bit key of a state (Keys are comparable only within a trace.)
+    """
+    return int.from_bytes(blake2b(state['state_id'].encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class TraceRecorder:
+    """
+    Recorder of board calls as compact binary events, for debugging deep searches.
+    Unlike debug logging, nothing is formatted or rendered while recording: each event takes `EVENT.size` bytes,
+    and each distinct state is stored once as a binary record (see `GameBoard.encode_state`).
+
+    A trace consists of three files:
+        - <prefix>.events: Events in the order of calls
+        - <prefix>.states: State records, each preceded by its 8-byte key
+        - <prefix>.problem: Pickled problem of the board, to restore states offline
+
+    Without `capacity`, all events and states are appended to the files, which are flushed every `FLUSH_INTERVAL`
+    so that a killed process leaves the trace up to the last second.
+    With `capacity`, only the last `capacity` events are kept in a ring buffer, with the states they refer to.
+    Both files are preallocated with a fixed size and memory-mapped, so the trace is readable even when the process
+    is killed (e.g., by the evaluator at the time or memory limit) before it is closed:
+        - The events file has the number of events recorded (RING_HEADER), followed by `capacity` event slots.
+        - The states file has `capacity + 1` state slots. A slot is freed (its key is set to 0) when no event
+          in the ring refers to its state anymore.
+    """
+
+    def __init__(self, prefix, board, capacity: int = None):
+        """
+        :param prefix: Path prefix of the trace files
+        :param board: GameBoard to trace. (The recorder should be set as `board._tracer`.)
+        :param capacity: Number of events in the ring buffer. If None, all events are written.
+        """
+        self._codec = board._codec
+        events, states, problem = _file_names(prefix)
+        events.parent.mkdir(parents=True, exist_ok=True)
+        record_size = board.get_state_record_size()
+        with problem.open('wb') as fp:
+            pickle.dump({'problem': board._export_problem(), 'record_size': record_size, 'capacity': capacity}, fp)
+
+        self._begin = perf_counter_ns()
+        self.capacity = capacity
+        #: Number of events recorded (including those overwritten in the ring buffer)
+        self.count = 0
+
+        if capacity is None:
+            self._events = events.open('wb', buffering=1 << 16)
+            self._states = states.open('wb')
+            #: [PRIVATE] Keys of the states written
+            self._known = set()
+            #: [PRIVATE] Timestamp of the last flush
+            self._flushed = 0
+            self._ring = None
+            return
+
+        # Ring buffer mode: preallocated files, mapped into memory
+        self._events = events.open('w+b')
+        self._events.truncate(RING_HEADER.size + capacity * EVENT.size)
+        self._ring = mmap.mmap(self._events.fileno(), 0)
+        self._states = states.open('w+b')
+        #: [PRIVATE] Size of a state slot (key and record)
+        self._slot_size = 8 + record_size
+        # An event may refer to a new state before the oldest event is overwritten, so one more slot is needed.
+        self._states.truncate((capacity + 1) * self._slot_size)
+        self._state_ring = mmap.mmap(self._states.fileno(), 0)
+        #: [PRIVATE] Slots of the states in the ring: key -> [slot index, number of events referring to it]
+        self._slots = {}
+        #: [PRIVATE] Free slot indices
+        self._free = list(range(capacity, -1, -1))
+        #: [PRIVATE] State key of each event in the ring (0 if none)
+        self._ring_keys = [0] * capacity
+
+    def _reference(self, key: int, state: dict):
+        """
+        [PRIVATE] Count a reference to a state in the ring, storing the state if it is new.
+        """
+        slot = self._slots.get(key)
+        if slot is not None:
+            slot[1] += 1
+            return
+        index = self._free.pop()
+        self._slots[key] = [index, 1]
+        self._state_ring[index * self._slot_size:(index + 1) * self._slot_size] = \
+            key.to_bytes(8, 'little') + self._codec.encode(state)
+
+    def _release(self, key: int):
+        """
+        [PRIVATE] Remove a reference to a state in the ring, freeing its slot if it is not referred anymore.
+        """
+        slot = self._slots[key]
+        slot[1] -= 1
+        if slot[1] == 0:
+            del self._slots[key]
+            self._free.append(slot[0])
+            self._state_ring[slot[0] * self._slot_size:slot[0] * self._slot_size + 8] = bytes(8)
+
+    def record(self, method: str, action: Action = None, state: dict = None):
+        """
+        Record an event.
+
+        :param method: Name of the board method (one of METHODS)
+        :param action: Action of the event, if any
+        :param state: State of the event, if any
+        """
+        key = state_key(state) if state is not None else 0
+        code = NO_ACTION if action is None else encode_action(action, self._codec)
+        event = (perf_counter_ns() - self._begin, METHODS[method], code, key)
+
+        if self._ring is None:
+            if key and key not in self._known:
+                self._known.add(key)
+                self._states.write(key.to_bytes(8, 'little') + self._codec.encode(state))
+            self._events.write(EVENT.pack(*event))
+            self.count += 1
+            if event[0] - self._flushed > FLUSH_INTERVAL:
+                # States first, so that every event written refers to a written state
+                self._states.flush()
+                self._events.flush()
+                self._flushed = event[0]
+            return
+
+        # The state is stored before the event refers to it, and the count is updated last,
+        # so that the files are consistent whenever the process is killed.
+        position = self.count % self.capacity
+        if key:
+            self._reference(key, state)
+        if self._ring_keys[position]:
+            self._release(self._ring_keys[position])
+        self._ring_keys[position] = key
+        EVENT.pack_into(self._ring, RING_HEADER.size + position * EVENT.size, *event)
+        self.count += 1
+        RING_HEADER.pack_into(self._ring, 0, self.count)
+
+    def close(self):
+        """
+        Write the remaining events, and close the files.
+        """
+        if self._ring is not None:
+            self._ring.close()
+            self._state_ring.close()
+        self._events.close()
+        self._states.close()
+
+
+def read_trace(prefix) -> Tuple[dict, List[tuple], Dict[int, bytes]]:
+    """
+    Read a trace.
+
+    :param prefix: Path prefix of the trace files
+    :return: Tuple of (problem, list of events (timestamp, method code, action code, state key),
+        dictionary of state key to state record)
+    """
+    events_path, states_path, problem_path = _file_names(prefix)
+    with problem_path.open('rb') as fp:
+        header = pickle.load(fp)
+
+    data = events_path.read_bytes()
+    capacity = header.get('capacity')
+    if capacity:
+        # Ring buffer: put the events in chronological order
+        count, = RING_HEADER.unpack_from(data)
+        ring = data[RING_HEADER.size:RING_HEADER.size + capacity * EVENT.size]
+        split = (count % capacity) * EVENT.size
+        # If the buffer is full, the oldest event is at the split point.
+        data = ring[split:] + ring[:split] if count >= capacity else ring[:split]
+    else:
+        # Ignore an incomplete event at the end (e.g., when the process was killed)
+        data = data[:len(data) - len(data) % EVENT.size]
+    events = list(EVENT.iter_unpack(data))
+
+    states = {}
+    data = states_path.read_bytes()
+    size = 8 + header['record_size']
+    # Ignore an incomplete record at the end (e.g., when the process was killed), and free slots (key 0)
+    for i in range(0, len(data) - size + 1, size):
+        key = int.from_bytes(data[i:i + 8], 'little')
+        if key:
+            states[key] = data[i + 8:i + size]
+    return header['problem'], events, states
+
+
+def main(argv=None):
+    """
+    Offline tool: print events of a trace, and render selected states.
+    """
+    parser = ArgumentParser(description='Decode a board trace, and render selected states.')
+    parser.add_argument('prefix', type=str, help='Path prefix of the trace files (without .events)')
+    parser.add_argument('--first', type=int, default=None, help='Print only the first N events.')
+    parser.add_argument('--last', type=int, default=None, help='Print only the last N events.')
+    parser.add_argument('--render', type=str, nargs='*', default=[],
+                        help='Render the states of the given keys (hexadecimal, as printed).')
+    parser.add_argument('--render-event', type=int, nargs='*', default=[],
+                        help='Render the states of the events at the given indices.')
+    args = parser.parse_args(argv)
+
+    problem, events, states = read_trace(args.prefix)
+    # The layout of hexagons is always the same, so a new board can load the problem.
+    board = GameBoard()
+    board._initialize()
+    board._load_problem(problem)
+    codec = board._codec
+
+    indices = list(range(len(events)))
+    if args.first is not None:
+        indices = indices[:args.first]
+    if args.last is not None:
+        indices = indices[-args.last:]
+
+    print(f'{len(events)} events, {len(states)} distinct states')
+    for i in indices:
+        timestamp, method, action, key = events[i]
+        action = '' if action == NO_ACTION else repr(decode_action(action, codec))
+        key = f'{key:016x}' if key else '-'
+        print(f'{i:8d} {timestamp / 1e6:12.3f}ms {METHOD_NAMES[method]:16s} {key:16s} {action}')
+
+    keys = [int(k, 16) for k in args.render] + [events[i][3] for i in args.render_event]
+    for key in keys:
+        if key not in states:
+            print(f'State {key:016x} is not in the trace.')
+            continue
+
+        state = board.decode_state(states[key])
+        board._set_to_state(state)
+        print(f'\nState {key:016x}: dice roll #{state["dice_roll"]}, resources {state["player"]["resources"]}')
+        sys.stdout.flush()
+        BoardRenderer(board._game.board).render_board()
+
+
+# Export the recorder and decoding functions
+__all__ = ['TraceRecorder', 'read_trace', 'encode_action', 'decode_action', 'state_key', 'EVENT', 'METHODS']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+# Deterministic profiler
+import cProfile
+# Serialization of pstats files (the format read by pstats.Stats)
+import marshal
+# Statistics of the deterministic profiler
+import pstats
+# Timer signals for the sampling profiler
+import signal
+# A dictionary class which can set the default value
+from collections import defaultdict
+# Package for file handling
+from pathlib import Path
+# Type specification for Python code
+from typing import Dict, List, Tuple
+
+#: Directory of this repository (board.py, action.py, ...)
+_REPOSITORY = Path(__file__).resolve().parent
+#: Categories of functions, in the order of reports
+CATEGORIES = ['agent', 'board/action', 'pycatan', 'others']
+#: Files of the game board, which agents call
+_BOARD_FILES = {'board.py', 'action.py', 'util.py'}
+#: Files of the evaluation infrastructure (not called by agents)
+_EVALUATION_FILES = {'evaluate.py', 'cpu_profile.py', 'memory_profile.py', 'board_trace.py', 'result_log.py',
+                     'job_queue.py', 'plan_optimizer.py', 'result_cache.py'}
+
+
+def _function_category(filename: str) -> str:
+    """
+    Classify a function by the file defining it.
+
+    :param filename: File name of the function's code
+    :return: One of CATEGORIES
+    """
+    if filename == '~':
+        # Built-in functions without a caller
+        return 'others'
+    path = Path(filename)
+    try:
+        path = path.resolve()
+    except (OSError, RuntimeError):
+        return 'others'
+
+    if 'pycatan' in path.parts:
+        return 'pycatan'
+    if path.parent == _REPOSITORY / 'agents':
+        return 'agent'
+    if path.parent == _REPOSITORY:
+        if path.name in _BOARD_FILES:
+            return 'board/action'
+        if path.name not in _EVALUATION_FILES:
+            # Search libraries used by agents (e.g., anytime.py, storage.py)
+            return 'agent'
+    return 'others'
+
+
+def _function_label(filename: str, line: int, name: str) -> str:
+    """
+    :return: Short label of a function, e.g., 'board.py:650(get_applicable_roads)'
+    """
+    return f'{Path(filename).name}:{line}({name})'
+
+
+#: Unit of the collapsed stacks made from cProfile data (a count is the number of microseconds)
+_MICROSECONDS = 1e6
+#: Smallest share of the total time for a stack to be written, when collapsed stacks are made from cProfile data
+_MIN_STACK_SHARE = 1e-5
+
+
+def _collapse_pstats(stats: dict) -> Dict[str, int]:
+    """
+    Make collapsed stacks from cProfile data, which only has caller -> callee edges.
+    The time of a function is split among its callers in proportion to the cumulative time of each edge,
+    following the edges from the functions without callers. (Recursive edges are not followed.)
+
+    :param stats: Statistics of pstats.Stats: function -> (cc, nc, tottime, cumtime, callers)
+    :return: Dictionary of collapsed stack ('frame;frame;...') -> microseconds of self time
+    """
+    callees = defaultdict(list)
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            # Cumulative time of the calls from the caller
+            callees[caller].append((function, edge[3]))
+
+    total = sum(tottime for _, _, tottime, _, _ in stats.values())
+    threshold = total * _MIN_STACK_SHARE
+    stacks = defaultdict(int)
+
+    def visit(function, time: float, path: tuple, labels: str):
+        _, _, tottime, cumtime, _ = stats[function]
+        share = min(1.0, time / cumtime) if cumtime > 0 else 0.0
+        own = tottime * share
+        if own >= threshold:
+            stacks[labels] += int(round(own * _MICROSECONDS))
+        for callee, edge_time in callees.get(function, ()):
+            if callee in path or callee not in stats:
+                continue
+            callee_time = edge_time * share
+            if callee_time >= threshold:
+                visit(callee, callee_time, path + (callee,),
+                      labels + ';' + _function_label(*callee))
+
+    for function, (_, _, _, cumtime, callers) in stats.items():
+        if not callers:
+            visit(function, cumtime, (function,), _function_label(*function))
+    return {stack: count for stack, count in stacks.items() if count > 0}
+
+
+class CpuProfiler:
+    """
+    CPU profiler for a search, with two modes:
+        - 'cprofile': Deterministic profiling by cProfile. Exact call counts, but slows down the search.
+        - 'sampling': Samples the stack of the main thread on a CPU timer signal (SIGPROF). Low overhead.
+    Both modes write a pstats file (readable by `python -m pstats` or snakeviz) and a collapsed-stack file
+    (one 'frame;frame;... count' line per stack, for flame graph tools), and a summary of the top functions,
+    split into agent code, board/action code and pycatan.
+        - From cProfile data, collapsed stacks are made by splitting the time along caller -> callee edges,
+          and a count is the number of microseconds.
+        - From samples, the pstats file has the number of samples as call counts, and the sampled time.
+    """
+
+    def __init__(self, mode: str = 'cprofile', interval: float = 0.005):
+        """
+        :param mode: 'cprofile' or 'sampling'
+        :param interval: Seconds of CPU time between samples (sampling mode)
+        """
+        assert mode in ('cprofile', 'sampling'), f'Unknown profiling mode: {mode}'
+        assert mode == 'cprofile' or hasattr(signal, 'setitimer'), 'Sampling needs signal.setitimer (POSIX).'
+        self.mode = mode
+        self.interval = interval
+        self._profile = None
+        #: [PRIVATE] Number of samples for each stack of functions (filename, line, name), from the outermost
+        self._samples: Dict[tuple, int] = defaultdict(int)
+        #: [PRIVATE] Signal handler replaced by the sampler
+        self._previous_handler = None
+
+    def start(self):
+        """
+        Start profiling.
+        """
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        """
+        Stop profiling.
+        """
+        if self.mode == 'cprofile':
+            self._profile.disable()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+
+    def _sample(self, signum, frame):
+        """
+        [PRIVATE] Signal handler: record the current stack, from the outermost frame.
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        self._samples[tuple(reversed(stack))] += 1
+
+    @property
+    def stacks(self) -> Dict[str, int]:
+        """
+        :return: Collapsed stacks: 'frame;frame;...' -> count (samples, or microseconds for cProfile data)
+        """
+        if self.mode == 'cprofile':
+            return _collapse_pstats(pstats.Stats(self._profile).stats)
+        stacks = defaultdict(int)
+        for stack, count in self._samples.items():
+            stacks[';'.join(_function_label(*function) for function in stack)] += count
+        return stacks
+
+    def _sampled_stats(self) -> dict:
+        """
+        [PRIVATE] Build pstats statistics from the samples: function -> (samples, samples, self time,
+        cumulative time, callers), where callers are (caller -> (samples, samples, self time, cumulative time)).
+        """
+        own = defaultdict(int)
+        total = defaultdict(int)
+        edges = defaultdict(lambda: [0, 0])  # (caller, callee) -> [self samples, cumulative samples]
+        for stack, count in self._samples.items():
+            own[stack[-1]] += count
+            if len(stack) > 1:
+                edges[(stack[-2], stack[-1])][0] += count
+            # Count a function (and an edge) once per stack, even if it is recursive.
+            for function in set(stack):
+                total[function] += count
+            for edge in set(zip(stack, stack[1:])):
+                edges[edge][1] += count
+
+        callers = defaultdict(dict)
+        for (caller, callee), (own_count, count) in edges.items():
+            callers[callee][caller] = (count, count, own_count * self.interval, count * self.interval)
+        return {function: (count, count, own[function] * self.interval, count * self.interval,
+                           callers.get(function, {}))
+                for function, count in total.items()}
+
+    def _stats(self) -> dict:
+        """
+        [PRIVATE] :return: pstats statistics of the profile: function -> (cc, nc, tottime, cumtime, callers)
+        """
+        if self.mode == 'cprofile':
+            return pstats.Stats(self._profile).stats
+        return self._sampled_stats()
+
+    def _top_functions(self) -> Tuple[str, Dict[str, List[Tuple[str, float, float]]]]:
+        """
+        [PRIVATE] Aggregate the profile by function.
+
+        :return: Tuple of (unit, dictionary of category -> list of (function label, self, cumulative)),
+            sorted by the self value.
+        """
+        functions = defaultdict(list)
+        if self.mode == 'cprofile':
+            for (filename, line, name), (_, _, tottime, cumtime, callers) in self._stats().items():
+                if filename == '~' and callers:
+                    # Built-in functions are attributed to the category of their main caller.
+                    caller = max(callers.items(), key=lambda t: t[1][3])[0]
+                    category = _function_category(caller[0])
+                else:
+                    category = _function_category(filename)
+                functions[category].append((_function_label(filename, line, name), tottime, cumtime))
+            unit = 'sec'
+        else:
+            for (filename, line, name), (_, _, tottime, cumtime, _) in self._stats().items():
+                functions[_function_category(filename)].append(
+                    (_function_label(filename, line, name), round(tottime / self.interval),
+                     round(cumtime / self.interval)))
+            unit = 'samples'
+
+        for entries in functions.values():
+            entries.sort(key=lambda t: -t[1])
+        return unit, functions
+
+    def write_reports(self, prefix, title: str = '', limit: int = 15) -> str:
+        """
+        Write the profile (pstats and collapsed stacks) and the summary of top functions.
+
+        :param prefix: Path prefix of the files. ('.pstats', '.collapsed' and '.txt' will be appended.)
+        :param title: Title of the summary
+        :param limit: Number of functions for each category
+        :return: Summary text
+        """
+        prefix = Path(prefix)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        if self.mode == 'cprofile':
+            self._profile.dump_stats(str(prefix.with_name(prefix.name + '.pstats')))
+        else:
+            # Same format as cProfile's dump_stats
+            with prefix.with_name(prefix.name + '.pstats').open('wb') as fp:
+                marshal.dump(self._sampled_stats(), fp)
+        prefix.with_name(prefix.name + '.collapsed').write_text(
+            ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items())))
+
+        unit, functions = self._top_functions()
+        precision = 3 if self.mode == 'cprofile' else 0
+        lines = [f'# CPU profile {title} ({self.mode})']
+        for category in CATEGORIES:
+            entries = functions.get(category, [])
+            own_total = sum(t[1] for t in entries)
+            lines.append(f'## {category}: {own_total:.{precision}f} {unit} in total (self)')
+            lines.append(f'{"self":>12s} {"cumulative":>12s}  function')
+            for label, own, cumulative in entries[:limit]:
+                lines.append(f'{own:12.{precision}f} {cumulative:12.{precision}f}  {label}')
+            lines.append('')
+
+        summary = '\n'.join(lines)
+        prefix.with_name(prefix.name + '.txt').write_text(summary + '\n')
+        return summary
+
+
+# Export only the profiler class
+__all__ = ['CpuProfiler']
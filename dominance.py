@@ -0,0 +1,131 @@
+# Logging method for pruning statistics
+import logging
+# Type specification for Python code
+from typing import Dict, Hashable, List, Tuple, Union
+
+# Import the board
+from board import GameBoard
+
+
+class DominanceIndex:
+    """
+    Index of resource-dominance among states, for pruning searches.
+
+    Two states with the same layout (buildings, roads, connected harbors and dice roll) differ only in their
+    resources. The state with at least as many cards of every resource can do everything the other can do
+    (every build and trade is possible with more cards), so the other state can be pruned, if it was not reached
+    with fewer actions.
+
+    The index keeps, for each layout, the Pareto-maximal entries seen so far: (resource counts, cost), where
+    an entry dominates another when it has at least as many resources and at most the same cost.
+    A new entry is rejected if it is dominated, and otherwise evicts the entries which it dominates.
+
+    Usage (in a search):
+        index = DominanceIndex(board)
+        ...
+        if not index.insert(child, cost=g + 1):
+            continue  # A state at least as good has been reached with at most the same cost.
+    """
+
+    #: [PRIVATE] Logger instance for the index
+    _logger = logging.getLogger('Dominance')
+
+    def __init__(self, board: GameBoard):
+        """
+        :param board: Game board, for encoding states into records (See GameBoard.encode_state)
+        """
+        self._board = board
+        #: [PRIVATE] Layout key -> list of Pareto-maximal entries (total resources, resource counts, cost).
+        #: Sorted in the descending order of total resources, as only an entry with a larger or equal total
+        #: can dominate another.
+        self._fronts: Dict[Hashable, List[Tuple[int, Tuple[int, ...], float]]] = {}
+        #: Number of entries kept, rejected (dominated) and evicted
+        self.size = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def split(self, state: Union[dict, bytes], tag: Hashable = None) -> Tuple[Hashable, Tuple[int, ...]]:
+        """
+        Split a state into its layout key and resource counts.
+
+        :param state: State representation, or a binary record from `GameBoard.encode_state`
+        :param tag: Additional part of the layout key. (e.g., the previous action, when the successors of a state
+            depend on it, as in `GameBoard.get_successor_actions`)
+        :return: Tuple of (layout key, resource counts in the order of RESOURCES)
+        """
+        record = state if isinstance(state, (bytes, bytearray, memoryview)) else self._board.encode_state(state)
+        layout, resources = self._board._codec.split(record)
+        return (layout, tag), resources
+
+    def is_dominated(self, state: Union[dict, bytes], cost: float = 0, tag: Hashable = None) -> bool:
+        """
+        :param state: State representation, or a binary record
+        :param cost: Cost of reaching the state (e.g., the number of actions)
+        :param tag: Additional part of the layout key (See split)
+        :return: True if an entry with at least as many resources and at most the same cost is in the index.
+            (A state already in the index is dominated by itself.)
+        """
+        layout, resources = self.split(state, tag)
+        return self._dominated(self._fronts.get(layout, ()), sum(resources), resources, cost)
+
+    @staticmethod
+    def _dominated(front, total: int, resources: Tuple[int, ...], cost: float) -> bool:
+        """
+        [PRIVATE] :return: True if an entry of the front dominates the given entry
+        """
+        for other_total, other, other_cost in front:
+            if other_total < total:
+                # The rest have fewer resources in total.
+                return False
+            if other_cost <= cost and all(a >= b for a, b in zip(other, resources)):
+                return True
+        return False
+
+    def insert(self, state: Union[dict, bytes], cost: float = 0, tag: Hashable = None) -> bool:
+        """
+        Insert a state, unless it is dominated. Entries dominated by the state are evicted.
+
+        :param state: State representation, or a binary record
+        :param cost: Cost of reaching the state (e.g., the number of actions)
+        :param tag: Additional part of the layout key (See split)
+        :return: True if the state is inserted, False if it is dominated (so it can be pruned).
+        """
+        layout, resources = self.split(state, tag)
+        total = sum(resources)
+        front = self._fronts.get(layout)
+        if front is None:
+            self._fronts[layout] = [(total, resources, cost)]
+            self.size += 1
+            return True
+
+        if self._dominated(front, total, resources, cost):
+            self.rejected += 1
+            return False
+
+        # Evict the entries dominated by the new one (only the entries with smaller or equal totals)
+        kept = [entry for entry in front
+                if not (entry[0] <= total and entry[2] >= cost and all(a <= b for a, b in zip(entry[1], resources)))]
+        self.evicted += len(front) - len(kept)
+        self.size -= len(front) - len(kept)
+
+        # Insert in the descending order of totals
+        position = 0
+        while position < len(kept) and kept[position][0] >= total:
+            position += 1
+        kept.insert(position, (total, resources, cost))
+        self._fronts[layout] = kept
+        self.size += 1
+        return True
+
+    def __len__(self):
+        return self.size
+
+    def layouts(self) -> int:
+        """
+        :return: Number of distinct layouts in the index
+        """
+        return len(self._fronts)
+
+
+# Export the index only
+__all__ = ['DominanceIndex']
@@ -1,16 +1,23 @@
 # Package for logging your execution
 import logging
 import os
+import sys
 # Package for random seed control
 import random
+# Package for reading command line options
+from argparse import ArgumentParser
 # A dictionary class which can set the default value
 from collections import defaultdict
 # Package for runtime importing
 from importlib import import_module
 # Package for multiprocessing (evaluation will be done with multiprocessing)
-from multiprocessing import Process, Queue
+from multiprocessing import Process, Queue, get_context, get_all_start_methods
 # Querying function for the number of CPUs
 from os import cpu_count
+# Exception for reading an empty queue
+from queue import Empty
+# Querying function for the host name (for identifying workers)
+from socket import gethostname
 # Package for file handling
 from pathlib import Path
 from time import time, sleep
@@ -24,31 +31,120 @@ import psutil as pu
 from board import *
 # Function for loading your agents
 from agents.load import get_all_agents
+# Append-only log of finished jobs
+from result_log import ResultLog, encode_record, decode_record
+# Shared-directory job queue for multi-host evaluation
+from job_queue import JobQueue
+# Allocation profiler
+from memory_profile import PeakMemoryProfiler
+# Binary trace recorder
+from board_trace import TraceRecorder
+# CPU profiler
+from cpu_profile import CpuProfiler
+# Plan post-optimizer (optional final stage of searches)
+from plan_optimizer import PlanOptimizer
+# Content-addressed cache of results
+from result_cache import ResultCache, job_key, board_digest, evaluation_digest, agent_digests
 
 #: Size of MB in bytes
 MEGABYTES = 1024 ** 2
 #: The number of games to run the evaluation
 GAMES = 5
-#: LIMIT FOR A SINGLE EXECUTION, 60 minutes
-TIME_LIMIT = 1000 * 60 * 60
+#: LIMIT FOR A SINGLE EXECUTION, 60 minutes (in seconds). The process is terminated after this.
+TIME_LIMIT = 60 * 60
+#: Time for the search procedure, 50 minutes (in seconds), as the rules say. Agents read it by `remaining_time()`.
+SEARCH_DEADLINE = 50 * 60
 #: LIMIT OF MEMORY USAGE, 4GB
 MEMORY_LIMIT = 4 * 1024 * MEGABYTES
 
+#: [PRIVATE] Board template, initialized on the first use (See _board_template)
+_BOARD_TEMPLATE = None
+
 # Set a random seed
 random.seed(5606)
 
 
-def evaluate_algorithm(agent_name, initial_state, result_queue: Queue):
+def _board_template() -> GameBoard:
+    """
+    [PRIVATE] Get the board template, building it on the first call. (Not on import, so that importing this module
+    for its constants or functions does not build a board or consume the random state.)
+    Evaluation processes forked from the forkserver (or from this process) reuse it instead of building a new board.
+
+    :return: Board template of this process
+    """
+    global _BOARD_TEMPLATE
+    if _BOARD_TEMPLATE is None:
+        _BOARD_TEMPLATE = GameBoard()
+        _BOARD_TEMPLATE._initialize()
+    return _BOARD_TEMPLATE
+
+
+def search_metrics(problem: GameBoard, process: pu.Process, cpu_begin, ctx_begin, wall_begin: float) -> dict:
+    """
+    Measure the resources used during a search.
+    :param problem: Board used for the search
+    :param process: Process information of the current process
+    :param cpu_begin: CPU times (psutil) before the search
+    :param ctx_begin: Context switches (psutil) before the search
+    :param wall_begin: Timestamp before the search
+    :return: Dictionary of metrics
+    """
+    wall = time() - wall_begin
+    cpu_end = process.cpu_times()
+    ctx_end = process.num_ctx_switches()
+    statistics = problem._get_search_statistics()
+
+    return {
+        'cpu_user': cpu_end.user - cpu_begin.user,  # CPU time in user mode (sec)
+        'cpu_system': cpu_end.system - cpu_begin.system,  # CPU time in kernel mode (sec)
+        'wall': wall,  # Wall clock time (sec)
+        'ctx_voluntary': ctx_end.voluntary - ctx_begin.voluntary,  # Voluntary context switches
+        'ctx_involuntary': ctx_end.involuntary - ctx_begin.involuntary,  # Involuntary context switches
+        'expanded': statistics['expanded'],  # Number of states expanded
+        'simulated': statistics['simulated'],  # Number of simulate_action calls
+        'simulations_per_sec': statistics['simulated'] / wall if wall > 0 else 0.0
+    }
+
+
+def format_metrics(metrics: dict) -> str:
+    """
+    Make a human-readable string of metrics.
+    :param metrics: Dictionary of metrics, returned from search_metrics. (None if not measured)
+    :return: String representation
+    """
+    if not metrics:
+        return 'metrics not measured'
+
+    return (f'CPU {metrics["cpu_user"]:.2f}s user + {metrics["cpu_system"]:.2f}s sys, '
+            f'wall {metrics["wall"]:.2f}s, '
+            f'ctx switches {metrics["ctx_voluntary"]} vol. + {metrics["ctx_involuntary"]} invol., '
+            f'{metrics["expanded"]} expanded, {metrics["simulated"]} simulated '
+            f'({metrics["simulations_per_sec"]:.1f}/s)')
+
+
+def evaluate_algorithm(agent_name, problem_spec, result_queue: Queue, options: dict = None):
     """
     Run the evaluation for an agent.
     :param agent_name: Agent to be evaluated
-    :param initial_state: Initial state for the test
+    :param problem_spec: Problem specification for the test, exported from a GameBoard
     :param result_queue: A multiprocessing Queue to return the execution result.
+    :param options: Dictionary of evaluation options. The following keys are used:
+        - 'trial': Game trial number
+        - 'memory_profile': Directory to write allocation reports. If None, memory profiling is off.
+        - 'trace': Directory to write binary traces of board calls. If None, tracing is off.
+        - 'trace_capacity': Number of last events to keep in a trace. If None, all events are kept.
+        - 'profile': Directory to write CPU profiles. If None, CPU profiling is off.
+        - 'profile_mode': 'cprofile' (deterministic) or 'sampling' (signal timer)
+        - 'deadline': Timestamp when the search should be finished. Agents can read it by `remaining_time()`.
+        - 'optimize_plan': If True, the returned plan is shortened by PlanOptimizer, as a part of the search.
     """
-    # Set up the given problem
-    problem = GameBoard()
-    problem._initialize()
-    problem.set_to_state(initial_state)
+    options = options if options else {}
+    # Set up the given problem (on the board template, which is a private copy of this process)
+    problem = _board_template()
+    problem._load_problem(problem_spec)
+    # Tell the limits to the board, so that agents can stop before being terminated.
+    problem._set_budgets(deadline=options.get('deadline'), memory_limit=MEMORY_LIMIT)
+    initial_state = problem.get_initial_state()
 
     # Log initial memory size
     init_memory = problem.get_current_memory_usage()
@@ -63,7 +159,8 @@ def evaluate_algorithm(agent_name, initial_state, result_queue: Queue):
         # When agent loading fails, send the failure log to main process.
         failure = format_exc()
         logger.error('Loading failed!', exc_info=e)
-        result_queue.put((agent_name, failure, 200, 0, float('inf')))
+        result_queue.put(dict(agent=agent_name, failure=failure, memory=200, route=0, actions=float('inf'),
+                              metrics=None))
         return
 
     # Do search
@@ -72,15 +169,70 @@ def evaluate_algorithm(agent_name, initial_state, result_queue: Queue):
     longest_route = 0  # Record for Performance measure III
     num_actions = float('inf')  # Record for Performance measure IV
 
+    # Start allocation profiling, if requested.
+    profiler = None
+    if options.get('memory_profile'):
+        profiler = PeakMemoryProfiler()
+        problem._memory_profiler = profiler
+        profiler.start()
+
+    # Start tracing board calls, if requested.
+    tracer = None
+    if options.get('trace'):
+        trace_prefix = Path(options['trace'], f'trace-{options.get("trial", 0):04d}-{agent_name}')
+        tracer = TraceRecorder(trace_prefix, problem, capacity=options.get('trace_capacity'))
+        problem._tracer = tracer
+
     logger.info(f'Begin to search using {agent_name} agent.')
+    # Record CPU time, context switches and wall time before the search
+    process = pu.Process(os.getpid())
+    cpu_begin = process.cpu_times()
+    ctx_begin = process.num_ctx_switches()
+    wall_begin = time()
+    # Start CPU profiling, if requested. (Only the search is profiled.)
+    cpu_profiler = None
+    if options.get('profile'):
+        cpu_profiler = CpuProfiler(mode=options.get('profile_mode') or 'cprofile')
+        cpu_profiler.start()
     try:
         solution = agent.search_for_longest_route(problem)
         assert type(solution) is list, 'Solution should be a list!'
+        if options.get('optimize_plan') and solution:
+            # Post-optimization is a part of the search (measured and profiled with it).
+            solution = PlanOptimizer().optimize(problem, solution, initial_state)
     except:
         failure = format_exc()
+    if cpu_profiler is not None:
+        cpu_profiler.stop()
+
+    # Compute resource usage during the search
+    metrics = search_metrics(problem, process, cpu_begin, ctx_begin, wall_begin)
+
+    # Write the CPU profile and print the top functions
+    if cpu_profiler is not None:
+        report = Path(options['profile'], f'cpu-{options.get("trial", 0):04d}-{agent_name}')
+        print(cpu_profiler.write_reports(report, title=f'of {agent_name} at trial #{options.get("trial", 0)}'),
+              flush=True)
+        logger.info(f'CPU profile of {agent_name} is written to {report}.*')
+
+    # Finish the trace (The execution of the solution below is not traced.)
+    if tracer is not None:
+        problem._tracer = None
+        tracer.close()
+        logger.info(f'Trace of {agent_name} ({tracer.count} events) is written to {trace_prefix}.*')
+
+    # Write the allocation report at the peak
+    if profiler is not None:
+        problem._memory_profiler = None
+        profiler.stop()
+        report = Path(options['memory_profile'], f'memory-{options.get("trial", 0):04d}-{agent_name}.txt')
+        report.parent.mkdir(parents=True, exist_ok=True)
+        profiler.write_report(report, title=f'of {agent_name} at trial #{options.get("trial", 0)}')
+        logger.info(f'Memory profile of {agent_name} is written to {report}')
 
     # Get maximum memory usage during search (Performance measure II)
-    max_memory_usage = int(max(0, problem.get_max_memory_usage() - init_memory) / MEGABYTES / 10) * 10
+    metrics['memory_mb'] = max(0, problem.get_max_memory_usage() - init_memory) / MEGABYTES  # Before rounding
+    max_memory_usage = int(metrics['memory_mb'] / 10) * 10
     logger.info(f'Search finished for {agent_name}, using {max_memory_usage}MB during search.')
     # Ignore memory usage below 200MB.
     max_memory_usage = max(200, max_memory_usage)
@@ -104,16 +256,239 @@ def evaluate_algorithm(agent_name, initial_state, result_queue: Queue):
 
     if IS_DEBUG:
         logger.debug(f'Execution Result: Failure {not not failure}, {max_memory_usage}MB, '
-                     f'route with {longest_route} blocks, {num_actions} actions.')
-    result_queue.put((agent_name, failure, max_memory_usage, longest_route, num_actions))
+                     f'route with {longest_route} blocks, {num_actions} actions, {format_metrics(metrics)}.')
+    result_queue.put(dict(agent=agent_name, failure=failure, memory=max_memory_usage,
+                          route=longest_route, actions=num_actions, metrics=metrics))
+
+
+def check_limits(proc: Process, begin: float):
+    """
+    Check whether an evaluation process exceeds the limits. If it does, the process will be terminated.
+    :param proc: Process running evaluate_algorithm
+    :param begin: Timestamp when the process began
+    :return: Failure message if the process exceeded a limit. Otherwise, None.
+    """
+    # For each running process, check for timeout
+    if begin + TIME_LIMIT < time():
+        proc.terminate()
+        message = f'Process is running more than {TIME_LIMIT} sec, from ts={begin}; now={time()}'
+        logging.info(f'[TIMEOUT] {proc.agent} / {message}')
+        return message
+
+    try:
+        p_bytes = pu.Process(proc.pid).memory_info().rss
+        if p_bytes > MEMORY_LIMIT:
+            proc.terminate()
+            message = f'Process consumed memory more than {MEMORY_LIMIT / MEGABYTES}MB (used: {p_bytes / MEGABYTES}MB)'
+            logging.info(f'[MEM LIMIT] {proc.agent} / {message}')
+            return message
+    except pu.NoSuchProcess:
+        pass
+
+    return None
+
+
+def load_agents(agents) -> list:
+    """
+    Check whether the agents can be imported, by importing each of them once.
+    :param agents: List of agent names
+    :return: List of agent names which are successfully imported
+    """
+    loadable = []
+    for agent_i in agents:
+        try:
+            import_module(f'agents.{agent_i}')
+            loadable.append(agent_i)
+        except Exception as e:
+            # The agent will fail in the evaluation process, and the failure will be recorded there.
+            logging.warning(f'Importing {agent_i} agent failed!', exc_info=e)
+
+    return loadable
+
+
+def evaluation_context(agents):
+    """
+    Prepare the multiprocessing context for evaluation processes.
+    If possible, a forkserver is used. The forkserver preloads the board, pycatan, psutil and the agent modules,
+    builds the board template once, and forks evaluation processes from itself.
+    (In debug mode, the default context is used, as the forkserver cannot see the '--debug' option.)
+
+    :param agents: List of agent names to preload
+    :return: Multiprocessing context
+    """
+    if IS_DEBUG or 'forkserver' not in get_all_start_methods():
+        return get_context()
+
+    context = get_context('forkserver')
+    context.set_forkserver_preload(['__main__', 'board', 'action', 'util', 'pycatan', 'psutil'] +
+                                   [f'agents.{agent_i}' for agent_i in load_agents(agents)])
+    return context
+
+
+def execute(prob, agent_i, result_queue: Queue, context, options: dict = None) -> Process:
+    """
+    Execute an evaluation for an agent with given problem.
+    :param prob: Problem specification
+    :param agent_i: Agent
+    :param result_queue: A multiprocessing Queue to return the execution result.
+    :param context: Multiprocessing context to create a process
+    :param options: Dictionary of evaluation options (See evaluate_algorithm)
+    :return: A process
+    """
+    # Unless given, the deadline is set before the process starts. The search should finish within SEARCH_DEADLINE,
+    # which is earlier than TIME_LIMIT checked by check_limits.
+    options = dict(options if options else {})
+    options.setdefault('deadline', time() + SEARCH_DEADLINE)
+    proc = context.Process(name=f'EvalProc', target=evaluate_algorithm,
+                           args=(agent_i, prob, result_queue, options), daemon=True)
+    proc.start()
+    proc.agent = agent_i  # Make an agent tag for this process
+    return proc
+
+
+def missing_result(proc: Process, exceeded: str = None) -> dict:
+    """
+    Build a failure result for a process which ended without sending any result (killed or crashed).
+    :param proc: Process ended
+    :param exceeded: Failure message, if the process was terminated due to limits
+    :return: Result dictionary
+    """
+    failure = exceeded if exceeded else f'Process exited with code {proc.exitcode} without reporting a result.'
+    return dict(agent=proc.agent, failure=failure, memory=200, route=0, actions=float('inf'), metrics=None)
+
+
+def work(queue_dir, worker_id: str = None):
+    """
+    Run as a worker of the shared-directory job queue, until the coordinator asks to stop.
+    :param queue_dir: Path to the shared directory
+    :param worker_id: Identifier of this worker. If None, host name and process ID will be used.
+    """
+    queue = JobQueue(queue_dir)
+    worker_id = worker_id if worker_id else f'{gethostname()}-{os.getpid()}'
+    context = evaluation_context(get_all_agents())
+    result_queue = context.Queue()
+    logging.info(f'Worker {worker_id} begins with queue {queue_dir}')
+
+    while not queue.is_stopped():
+        job = queue.claim(worker_id)
+        if job is None:
+            # Wait for a new job
+            sleep(1)
+            continue
+
+        begin = time()
+        proc = execute(job['problem'], job['agent'], result_queue, context, job['options'])
+        exceeded = None
+        result = None
+        while result is None:
+            if proc.is_alive() and exceeded is None:
+                exceeded = check_limits(proc, begin)
+
+            try:
+                result = result_queue.get(timeout=1)
+            except Empty:
+                if not proc.is_alive():
+                    # Read the result that might have been sent just before the process ends
+                    result = result_queue.get(timeout=1) if not result_queue.empty() else missing_result(proc, exceeded)
+
+            queue.heartbeat(job)
+
+        if result['failure'] is None and exceeded is not None:
+            result['failure'] = exceeded
+        finish = time()
+        record = dict(job['info'], **result, started=begin, finished=finish, elapsed=finish - begin, worker=worker_id,
+                      killed=exceeded is not None)
+        queue.complete(job, encode_record(record))
+        proc.join()
+
+    logging.info(f'Worker {worker_id} stops.')
+
+
+def _job_id(trial, agent) -> str:
+    """
+    :return: Identifier of a (trial, agent) job in the job queue
+    """
+    return f'{trial:04d}-{agent}'
+
+
+# Preloading by the forkserver, which imports this script as '__mp_main__' (See evaluation_context):
+# build the board template there, so that the evaluation processes forked from it share the board.
+if __name__ == '__mp_main__':
+    _board_template()
 
 
 # Main function
 if __name__ == '__main__':
+    # Read command line options
+    parser = ArgumentParser(description='Evaluate all agents in the agents directory.')
+    parser.add_argument('--debug', action='store_true', help='Log debugging messages of the board.')
+    parser.add_argument('--results', type=str, default='results.jsonl',
+                        help='JSON lines file where the result of each finished job is appended.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip the jobs already recorded in the results file, and rebuild the ranks from it.')
+    parser.add_argument('--queue', type=str, default=None,
+                        help='Run as a coordinator: submit jobs to this shared directory, '
+                             'and build the ranking from the results of workers.')
+    parser.add_argument('--worker', type=str, default=None,
+                        help='Run as a worker: run jobs submitted to this shared directory.')
+    parser.add_argument('--heartbeat-timeout', type=float, default=60,
+                        help='Seconds without heartbeat, after which a job of a worker is reclaimed.')
+    parser.add_argument('--memory-profile', type=str, default=None,
+                        help='Trace allocations of each run, and write reports at the peak to this directory. '
+                             '(Slows down the search and inflates memory usage.)')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Record board calls of each run as binary events in this directory. '
+                             'Use "python board_trace.py <file prefix>" to decode them and render states.')
+    parser.add_argument('--trace-capacity', type=int, default=None,
+                        help='Keep only the last N events of each trace in a ring buffer.')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Profile the CPU usage of each search, and write the profiles and summaries '
+                             'of top functions to this directory.')
+    parser.add_argument('--profile-mode', type=str, default='cprofile', choices=['cprofile', 'sampling'],
+                        help='cprofile: deterministic profiling. sampling: low-overhead stack sampling. '
+                             'Both write pstats files and collapsed stacks.')
+    parser.add_argument('--optimize-plan', action='store_true',
+                        help='Shorten the plan returned by each agent with PlanOptimizer (counted as search time).')
+    parser.add_argument('--cache', type=str, default='.result_cache',
+                        help='Directory of the result cache. A job is not run again when its agent (with the local '
+                             'modules it imports), board.py/action.py/util.py, evaluate.py (with the local modules '
+                             'it imports, e.g., plan_optimizer.py) and the problem are unchanged. '
+                             'Crashes and runs killed by the limits are not cached.')
+    parser.add_argument('--no-cache', action='store_true', help='Run every job, without reading the result cache.')
+    args = parser.parse_args()
+    # Options passed to each evaluation process
+    run_options = dict(memory_profile=args.memory_profile, trace=args.trace, trace_capacity=args.trace_capacity,
+                       profile=args.profile, profile_mode=args.profile_mode, optimize_plan=args.optimize_plan)
+
+    if args.worker:
+        work(args.worker)
+        sys.exit(0)
+
     # Problem generator for the same execution
     prob_generator = GameBoard()
     # List of all agents
     all_agents = get_all_agents()
+    # Random generator for the execution order of agents.
+    # (Separated from the problem generation, so that the problems don't depend on the set of agents.)
+    agent_shuffler = random.Random(5606)
+    # Log of finished jobs
+    result_log = ResultLog(args.results, resume=args.resume)
+    finished_jobs = result_log.load()
+    if finished_jobs:
+        logging.info(f'Resuming with {len(finished_jobs)} finished jobs in {args.results}')
+
+    # Cache of results, keyed by the contents of the inputs.
+    # (Not used for profiling or tracing runs, which are run for their reports and have slower searches.)
+    result_cache = None
+    if not args.no_cache and not (args.memory_profile or args.trace or args.profile):
+        result_cache = ResultCache(args.cache)
+        source_digests = agent_digests(all_agents)
+        board_files = board_digest()
+        evaluation_files = evaluation_digest()
+        # Other settings which change the results
+        cache_settings = dict(time_limit=TIME_LIMIT, memory_limit=MEMORY_LIMIT, optimize_plan=args.optimize_plan)
+    cache_keys = {}  # (trial, agent) -> key of the job in the cache
+    cached_jobs = {}  # (trial, agent) -> record read from the cache
 
     # Performance measures
     failures = defaultdict(list)  # This will be counted across different games
@@ -121,6 +496,7 @@ if __name__ == '__main__':
     route_ranksum = defaultdict(list)  # This will be computed as sum of rank across different games
     act_ranksum = defaultdict(list)  # This will be computed as sum of rank across different games
     last_execution = defaultdict(lambda: (200, 0, float('inf')))
+    last_metrics = {}  # Resource usage of the last execution (not used for ranking)
 
     def _compute_rank(sort, reverse=False):
         """
@@ -151,8 +527,8 @@ if __name__ == '__main__':
         # Print header
         print(f'\nCurrent game trial: #{t}')
         print(f' StudentID    | #Failure  MemNow [RankSum]  RouteNow [RankSum]  Action [RankSum] |'
-              f' Rank  Percentile')
-        print('=' * 14 + '|' + '=' * 66 + '|' + '=' * 17)
+              f' Rank  Percentile |   CPU(s)   Wall(s)     Sim/s')
+        print('=' * 14 + '|' + '=' * 66 + '|' + '=' * 17 + '|' + '=' * 30)
 
         # Sort agents by performance measures
         for_ranking = [(k, (len(failures[k]),  # Failure in ascending order
@@ -171,103 +547,224 @@ if __name__ == '__main__':
                   f' {last_execution[agent][0]:4d}MB [{sum(memory_ranksum[agent]):7d}] '
                   f' L= {last_execution[agent][1]:5d} [{sum(route_ranksum[agent]):7d}] '
                   f' {last_execution[agent][2]:6.0f} [{sum(act_ranksum[agent]):7d}] |'
-                  f' {rank:4d}  {percentile:3d}th/100')
+                  f' {rank:4d}  {percentile:3d}th/100 |', end='')
 
-            # Write-down the failures
-            with Path(f'./failure_{agent}.txt').open('w+t') as fp:
-                fp.write('\n\n'.join(failures[agent]))
+            # Print resource usage (Not used for ranking)
+            metrics = last_metrics.get(agent)
+            if metrics:
+                print(f' {metrics["cpu_user"] + metrics["cpu_system"]:8.1f}  {metrics["wall"]:8.1f}'
+                      f'  {metrics["simulations_per_sec"]:8.1f}')
+            else:
+                print(f' {"-":>8s}  {"-":>8s}  {"-":>8s}')
 
-    # Start evaluation process (using multi-processing)
-    process_results = Queue(len(all_agents) * 2)
-    process_count = max(cpu_count() - 2, 1)
 
-    def _execute(prob, agent_i):
+    def _write_failures(agent):
         """
-        Execute an evaluation for an agent with given initial state.
-        :param prob: Initial state for a problem
-        :param agent_i: Agent
-        :return: A process
+        Write-down the failures of an agent
+        :param agent: Agent whose failure file will be written
         """
-        proc = Process(name=f'EvalProc', target=evaluate_algorithm, args=(agent_i, prob, process_results), daemon=True)
-        proc.start()
-        proc.agent = agent_i  # Make an agent tag for this process
-        return proc
+        with Path(f'./failure_{agent}.txt').open('w+t') as fp:
+            fp.write('\n\n'.join(failures[agent]))
 
 
-    def _read_result(res_queue, exceeds):
+    def _record(record, is_new=True, cacheable=True):
+        """
+        Reflect the record of a finished job to the performance measures.
+        :param record: Record of a finished job
+        :param is_new: True if the record should be appended to the result log
+        :param cacheable: False if the record should not be cached (e.g., its job was reclaimed from a worker)
+        """
+        agent_i = record['agent']
+        last_metrics[agent_i] = record.get('metrics')
+        if record['failure'] is None:
+            last_execution[agent_i] = record['memory'], record['route'], record['actions']
+        else:
+            last_execution[agent_i] = 200, 0, float('inf')
+            failures[agent_i].append(f'[Trial #{record["trial"]}] {format_metrics(last_metrics[agent_i])}\n'
+                                     + record['failure'])
+
+        if is_new:
+            result_log.append(record)
+            if record['failure'] is not None:
+                _write_failures(agent_i)
+            # Crashes and runs killed by the limits are not cached, as they may be caused by the environment.
+            cacheable = cacheable and record.get('metrics') is not None and not record.get('killed')
+            if result_cache is not None and cacheable and not record.get('cached') and \
+                    (record['trial'], agent_i) in cache_keys:
+                result_cache.put(cache_keys[(record['trial'], agent_i)], record)
+
+
+    # Start evaluation process (using multi-processing)
+    context = evaluation_context(all_agents)
+    process_results = context.Queue(len(all_agents) * 2)
+    process_count = max(cpu_count() - 2, 1)
+
+    def _read_result(res_queue, running, exceeds, job):
         """
         Read evaluation result from the queue.
         :param res_queue: Queue to read
+        :param running: Dictionary of running processes, which will be updated as results arrive
         :param exceeds: failure message for agents who exceeded limits
+        :param job: Dictionary of the common fields of the current jobs (trial and problem fingerprint)
         """
         while not res_queue.empty():
-            agent_i, failure_i, mem_i, route_i, act_i = res_queue.get()
-            if failure_i is None and not (agent_i in exceeds):
-                last_execution[agent_i] = mem_i, route_i, act_i
-            else:
-                last_execution[agent_i] = 200, 0, float('inf')
-                failures[agent_i].append(failure_i if failure_i else exceeds[agent_i])
+            result = res_queue.get()
+            agent_i = result['agent']
+            if agent_i not in running:
+                # Result of a process already handled (e.g., from the previous trial)
+                continue
 
+            _, begin = running.pop(agent_i)
+            if result['failure'] is None and agent_i in exceeds:
+                result['failure'] = exceeds[agent_i]
+            finish = time()
+            _record(dict(job, **result, started=begin, finished=finish, elapsed=finish - begin,
+                         killed=agent_i in exceeds))
 
-    for trial in range(GAMES):
+
+    def _run_locally(prob, job, agents_to_run):
+        """
+        Run the jobs of a trial using local processes.
+        :param prob: Problem specification
+        :param job: Dictionary of the common fields of the current jobs (trial and problem fingerprint)
+        :param agents_to_run: Agents to be executed
+        """
         # Clear all previous results
-        last_execution.clear()
         while not process_results.empty():
             process_results.get()
 
-        # Generate new problem
-        prob_spec = prob_generator._initialize()
-        logging.info(f'Trial {trial} begins!')
-
-        # Execute agents
-        processes = []
-        agents_to_run = all_agents.copy()
-        random.shuffle(agents_to_run)
-
+        running = {}
         exceed_limit = {}  # Timeout limit
-        while agents_to_run or processes:
+        while agents_to_run or running:
             # If there is a room for new execution, execute new thing.
-            if agents_to_run and len(processes) < process_count:
+            if agents_to_run and len(running) < process_count:
                 alg = agents_to_run.pop()
-                processes.append((_execute(prob_spec, alg), time()))
+                running[alg] = (execute(prob, alg, process_results, context, dict(run_options, trial=job['trial'])),
+                                time())
+
+            for alg, (p, begin) in running.items():
+                if p.is_alive() and alg not in exceed_limit:
+                    exceeded = check_limits(p, begin)
+                    if exceeded:
+                        exceed_limit[alg] = exceeded
 
-            new_proc_list = []
-            for p, begin in processes:
-                if not p.is_alive():
-                    continue
-                # For each running process, check for timeout
-                if begin + TIME_LIMIT < time():
-                    p.terminate()
-                    exceed_limit[p.agent] = \
-                        f'Process is running more than {TIME_LIMIT} sec, from ts={begin}; now={time()}'
-                    logging.info(f'[TIMEOUT] {p.agent} / '
-                                 f'Process is running more than {TIME_LIMIT} sec, from ts={begin}; now={time()}')
-                else:
-                    try:
-                        p_bytes = pu.Process(p.pid).memory_info().rss
-                        if p_bytes > MEMORY_LIMIT:
-                            p.terminate()
-                            exceed_limit[p.agent] = \
-                                f'Process consumed memory more than {MEMORY_LIMIT / MEGABYTES}MB (used: {p_bytes / MEGABYTES}MB)'
-                            logging.info(f'[MEM LIMIT] {p.agent} / '
-                                         f'Process consumed memory more than {MEMORY_LIMIT / MEGABYTES}MB (used: {p_bytes / MEGABYTES}MB)')
-                        else:
-                            new_proc_list.append((p, begin))
-                    except pu.NoSuchProcess:
-                        new_proc_list.append((p, begin))
-
-            # Prepare for the next round
-            processes = new_proc_list
             # Read result from queue
-            _read_result(process_results, exceed_limit)
+            _read_result(process_results, running, exceed_limit, job)
+
+            # Record processes which ended without sending any result (killed or crashed)
+            for alg, (p, begin) in list(running.items()):
+                if p.is_alive():
+                    continue
+                # Read the result that might have been sent just before the process ends
+                _read_result(process_results, running, exceed_limit, job)
+                if alg in running:
+                    running.pop(alg)
+                    finish = time()
+                    _record(dict(job, **missing_result(p, exceed_limit.get(alg)),
+                                 started=begin, finished=finish, elapsed=finish - begin, killed=alg in exceed_limit))
+
+            if running and (not agents_to_run or len(running) >= process_count):
+                # Wait for one seconds
+                sleep(1)
+
 
-            if len(processes) >= process_count:
+    def _wait_for_queue(queue, job, agents_to_run):
+        """
+        Wait until the workers finish the jobs of a trial.
+        :param queue: Shared-directory job queue, where all the jobs are submitted
+        :param job: Dictionary of the common fields of the current jobs (trial and problem fingerprint)
+        :param agents_to_run: Agents to be executed
+        """
+        waiting = {_job_id(job['trial'], alg): alg for alg in agents_to_run}
+        reclaimed = set()  # Jobs whose workers did not respond (Their results are not cached.)
+        while waiting:
+            for job_id, record in queue.collect(waiting).items():
+                waiting.pop(job_id)
+                _record(decode_record(record), cacheable=job_id not in reclaimed)
+
+            if waiting:
+                reclaimed.update(queue.reclaim_stale(args.heartbeat_timeout))
                 # Wait for one seconds
                 sleep(1)
 
-        # Read results
-        logging.info(f'Reading results at Trial {trial}')
-        _read_result(process_results, exceed_limit)
+
+    # Generate problems for all trials
+    problems = []
+    for trial in range(GAMES):
+        prob_generator._initialize()
+        problems.append((prob_generator._export_problem(),
+                         dict(trial=trial, problem=prob_generator._problem_fingerprint())))
+
+    # Decide the jobs to run
+    schedule = []
+    for prob_spec, job_info in problems:
+        agents_to_run = all_agents.copy()
+        agent_shuffler.shuffle(agents_to_run)
+        # Skip the jobs already finished in the previous run.
+        for key in all_agents:
+            record = finished_jobs.get((job_info['trial'], key))
+            if record is None:
+                continue
+            if record['problem'] != job_info['problem']:
+                logging.warning(f'Problem of the recorded job (trial {job_info["trial"]}, {key}) is different. '
+                                f'Run it again.')
+                continue
+            agents_to_run.remove(key)
+
+        # Skip the jobs whose inputs have not changed since they were cached.
+        if result_cache is not None:
+            for key in list(agents_to_run):
+                cache_key = job_key(source_digests[key], board_files, evaluation_files, job_info['problem'],
+                                    cache_settings)
+                cache_keys[(job_info['trial'], key)] = cache_key
+                record = result_cache.get(cache_key)
+                if record is not None:
+                    cached_jobs[(job_info['trial'], key)] = dict(record, **job_info, cached=True)
+                    agents_to_run.remove(key)
+
+        schedule.append(agents_to_run)
+
+    if result_cache is not None:
+        logging.info(f'{result_cache.hits} jobs are read from the cache in {args.cache}, '
+                     f'{result_cache.misses} jobs will be run.')
+
+    job_queue = None
+    if args.queue:
+        # Submit all jobs to the shared directory, so that the workers can run jobs of the later trials too.
+        job_queue = JobQueue(args.queue)
+        job_queue.clear()
+        for (prob_spec, job_info), agents_to_run in zip(problems, schedule):
+            for alg in agents_to_run:
+                job_queue.submit(_job_id(job_info['trial'], alg),
+                                 dict(agent=alg, problem=prob_spec, info=job_info,
+                                      options=dict(run_options, trial=job_info['trial'])))
+        logging.info(f'Submitted {sum(len(a) for a in schedule)} jobs to {args.queue}')
+
+    # Write-down the failures of the resumed jobs (or clear the failure files of the previous run)
+    for key in all_agents:
+        _write_failures(key)
+
+    for (prob_spec, job_info), agents_to_run in zip(problems, schedule):
+        trial = job_info['trial']
+        # Clear all previous results
+        last_execution.clear()
+        last_metrics.clear()
+        logging.info(f'Trial {trial} begins!')
+
+        # Read results of the jobs already finished in the previous run.
+        for key in all_agents:
+            if key not in agents_to_run and (trial, key) in finished_jobs:
+                _record(finished_jobs[(trial, key)], is_new=False)
+                _write_failures(key)
+            elif (trial, key) in cached_jobs:
+                # Results from the cache are written to the result log, as if they were run now.
+                _record(cached_jobs[(trial, key)])
+
+        # Execute agents
+        if job_queue is not None:
+            _wait_for_queue(job_queue, job_info, agents_to_run)
+        else:
+            _run_locally(prob_spec, job_info, agents_to_run)
 
         # Sort the results for each performance criteria and give ranks to agents
         mem_ranks = dict(_compute_rank([(k, last_execution[k][0]) for k in all_agents]))
@@ -281,3 +778,7 @@ if __name__ == '__main__':
             act_ranksum[key].append(act_ranks[key])
 
         _print(trial)
+
+    if job_queue is not None:
+        # Let the workers exit
+        job_queue.stop()
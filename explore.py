@@ -0,0 +1,442 @@
+# Arrays of fixed-size numbers (CSR arrays)
+from array import array
+# Package for writing the metadata of a graph
+import json
+# Logging method for exploration progress
+import logging
+# Memory-mapped files (for loading a graph)
+import mmap
+# Package for serializing the problem (state representations have tuple keys, so JSON cannot be used)
+import pickle
+# Random number generator (for seeding boards)
+import random
+# Command line argument parser
+from argparse import ArgumentParser
+# A dictionary class which can set the default value
+from collections import defaultdict
+# Process pool for expanding states
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count
+# Package for file handling
+from pathlib import Path
+# Time functions
+from time import time
+# Type specification for Python code
+from typing import Dict, List, Tuple
+
+# Import the board and action specifications
+from action import PASS, UPGRADE, VILLAGE, ROAD, TRADE
+from board import GameBoard, RESOURCES
+# Import the encoding of actions (16-bit codes)
+from board_trace import encode_action, decode_action
+
+#: Flags of a node
+GOAL = 1  # The game ends at the state
+EXPANDED = 2  # All successors of the state are in the graph
+
+#: Array files of a graph: suffix -> typecode
+_ARRAYS = {
+    'offsets': 'Q',  # Node i has edges offsets[i] .. offsets[i + 1] - 1. (n + 1 entries)
+    'targets': 'I',  # Target node of each edge (m entries)
+    'actions': 'H',  # Action code of each edge (See board_trace.encode_action) (m entries)
+    'depth': 'H',  # Depth (number of actions from the initial state) of each node (n entries)
+    'flags': 'B',  # Flags of each node (GOAL, EXPANDED) (n entries)
+}
+
+#: [PRIVATE] Board of a worker process
+_worker_board = None
+
+
+def _file(prefix, suffix: str) -> Path:
+    """
+    [PRIVATE] :return: Path of a file of a graph
+    """
+    prefix = Path(prefix)
+    return prefix.with_name(f'{prefix.name}.{suffix}')
+
+
+def make_problem(seed: int) -> dict:
+    """
+    Build a problem. The same seed gives the same problem in any process. (Same as benchmark.py)
+
+    :param seed: Seed of the board
+    :return: Problem specification, exported from a GameBoard
+    """
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    return board._export_problem()
+
+
+def _init_worker(problem: dict):
+    """
+    [PRIVATE] Initialize a worker process with a board of the problem.
+    """
+    global _worker_board
+    _worker_board = GameBoard()
+    _worker_board._initialize()
+    _worker_board._load_problem(problem)
+
+
+def _applicable_actions(board: GameBoard) -> list:
+    """
+    [PRIVATE] :return: All applicable actions at the current board, in the same order as the default agents
+    """
+    actions = [TRADE(r, r2)
+               for r in RESOURCES
+               if board.get_trading_rate(r) > 0
+               for r2 in RESOURCES
+               if r != r2]
+    actions += [UPGRADE(v) for v in board.get_applicable_cities()]
+    actions += [VILLAGE(v) for v in board.get_applicable_villages()]
+    actions += [PASS()]
+    actions += [ROAD(road) for road in board.get_applicable_roads()]
+    return actions
+
+
+def _expand(records: List[bytes]) -> List[List[Tuple[int, bytes, bool]]]:
+    """
+    [PRIVATE] Expand states in a worker process.
+
+    :param records: Binary records of the states to expand
+    :return: For each state, list of (action code, record of the successor, whether the game ends there)
+    """
+    board = _worker_board
+    codec = board._codec
+    results = []
+    for record in records:
+        state = board.decode_state(record, lazy=True)
+        board.set_to_state(state)
+        successors = []
+        for action in _applicable_actions(board):
+            child = board.simulate_action(state, action, lazy=True)
+            successors.append((encode_action(action, codec), board.encode_state(child), board.is_game_end()))
+        results.append(successors)
+    return results
+
+
+def explore(problem: dict, prefix, max_depth: int = 6, max_states: int = 1000000, workers: int = None,
+            chunk_size: int = 64) -> dict:
+    """
+    Enumerate the states reachable from the initial state of a problem, breadth first, and write the state graph.
+    States are identified by their binary records (See GameBoard.encode_state), so duplicates are merged.
+    Goal states are not expanded. Actions which do nothing (e.g., a build without resources) are not edges.
+
+    The graph is written as CSR arrays (See _ARRAYS), one file for each array, and
+        - <prefix>.records: Binary record of each node
+        - <prefix>.problem: Pickled problem
+        - <prefix>.json: Metadata and statistics
+
+    :param problem: Problem specification, exported from a GameBoard
+    :param prefix: Path prefix of the graph files
+    :param max_depth: Maximum depth of the states to expand. (States at this depth are in the graph without edges.)
+    :param max_states: Maximum number of states. New states are not added after that. (Their edges are dropped,
+        and their parents are not marked as EXPANDED.)
+    :param workers: Number of worker processes. (Default: number of CPUs, 0: expand in this process)
+    :param chunk_size: Number of states sent to a worker at once
+    :return: Metadata of the graph, with statistics
+    """
+    logger = logging.getLogger('Explore')
+    begin = time()
+    prefix = Path(prefix)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    workers = cpu_count() if workers is None else workers
+
+    # The main process also keeps a board, for the initial state.
+    _init_worker(problem)
+    board = _worker_board
+    initial = board.encode_state(board.get_initial_state())
+    with _file(prefix, 'problem').open('wb') as fp:
+        pickle.dump(problem, fp)
+
+    # Nodes: record -> index. Indices are given in the order of discovery, so each depth is a contiguous range.
+    index: Dict[bytes, int] = {initial: 0}
+    depth = array('H', [0])
+    flags = bytearray([GOAL if board.is_game_end() else 0])
+    # Arrays are streamed to files, except for the small per-node arrays (depth and flags).
+    files = {suffix: _file(prefix, suffix).open('wb') for suffix in ('records', 'offsets', 'targets', 'actions')}
+    files['records'].write(initial)
+    array('Q', [0]).tofile(files['offsets'])
+    edges = 0
+    written = 0  # Number of nodes whose edges are written
+
+    # Statistics for each depth
+    levels = defaultdict(lambda: dict(nodes=0, expanded=0, goals=0, actions=0, noops=0, edges=0,
+                                      duplicates=0, new=0, dropped=0))
+    levels[0]['nodes'] = 1
+    levels[0]['goals'] = flags[0] & GOAL
+
+    pool = None
+    if workers > 0:
+        context = get_context('fork' if 'fork' in get_all_start_methods() else None)
+        pool = context.Pool(workers, initializer=_init_worker, initargs=(problem,))
+    try:
+        level = [initial]  # Records of the nodes at the current depth, in the order of indices
+        d = 0
+        while level and d < max_depth:
+            stats = levels[d]
+            next_level = []
+            # Goal states are not expanded. The other states are sent in chunks, and the results come in order.
+            expandable = [record for record in level if not flags[index[record]] & GOAL]
+            chunks = [expandable[i:i + chunk_size] for i in range(0, len(expandable), chunk_size)]
+            results = pool.imap(_expand, chunks) if pool is not None else map(_expand, chunks)
+            results = (successors for chunk in results for successors in chunk)
+
+            for record in level:
+                node = index[record]
+                if flags[node] & GOAL:
+                    array('Q', [edges]).tofile(files['offsets'])
+                    written += 1
+                    continue
+
+                targets, actions = array('I'), array('H')
+                complete = True
+                for code, child, is_goal in next(results):
+                    stats['actions'] += 1
+                    if child == record:
+                        # The action did nothing.
+                        stats['noops'] += 1
+                        continue
+                    target = index.get(child)
+                    if target is not None:
+                        stats['duplicates'] += 1
+                    elif len(index) >= max_states:
+                        stats['dropped'] += 1
+                        complete = False
+                        continue
+                    else:
+                        target = index[child] = len(index)
+                        files['records'].write(child)
+                        depth.append(d + 1)
+                        flags.append(GOAL if is_goal else 0)
+                        next_level.append(child)
+                        stats['new'] += 1
+                    targets.append(target)
+                    actions.append(code)
+
+                targets.tofile(files['targets'])
+                actions.tofile(files['actions'])
+                edges += len(targets)
+                stats['edges'] += len(targets)
+                stats['expanded'] += 1
+                if complete:
+                    flags[node] |= EXPANDED
+                array('Q', [edges]).tofile(files['offsets'])
+                written += 1
+
+            next_stats = levels[d + 1]
+            next_stats['nodes'] = len(next_level)
+            next_stats['goals'] = sum(1 for record in next_level if flags[index[record]] & GOAL)
+            logger.info(f'Depth {d}: {stats["expanded"]} expanded, {stats["new"]} new states '
+                        f'({len(index)} in total, {time() - begin:.1f} sec)')
+            level = next_level
+            d += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    # States which are not expanded (at the maximum depth) have no edges.
+    array('Q', [edges] * (len(index) - written)).tofile(files['offsets'])
+    depth.tofile(files.setdefault('depth', _file(prefix, 'depth').open('wb')))
+    files.setdefault('flags', _file(prefix, 'flags').open('wb')).write(flags)
+    for fp in files.values():
+        fp.close()
+
+    # Statistics
+    depths = sorted(levels)
+    goal_depths = [k for k in depths if levels[k]['goals']]
+    for k in depths:
+        stats = levels[k]
+        # Branching factors: applicable actions, and edges to distinct other states, per expanded state
+        stats['branching'] = stats['actions'] / stats['expanded'] if stats['expanded'] else 0.0
+        stats['effective_branching'] = stats['edges'] / stats['expanded'] if stats['expanded'] else 0.0
+    meta = {
+        'record_size': board.get_state_record_size(),
+        'states': len(index),
+        'edges': edges,
+        'max_depth': max_depth,
+        'max_states': max_states,
+        # The graph has every reachable state, if the frontier became empty without dropping any state.
+        'exhaustive': not level and not any(levels[k]['dropped'] for k in depths),
+        'shallowest_goal': goal_depths[0] if goal_depths else None,
+        'goals': sum(levels[k]['goals'] for k in depths),
+        'duplicates': sum(levels[k]['duplicates'] for k in depths),
+        'duplicate_share': sum(levels[k]['duplicates'] for k in depths) / max(1, edges),
+        'elapsed': time() - begin,
+        'levels': [dict(depth=k, **levels[k]) for k in depths],
+    }
+    _file(prefix, 'json').write_text(json.dumps(meta, indent=2) + '\n')
+    return meta
+
+
+def print_statistics(meta: dict):
+    """
+    Print statistics of a state graph.
+
+    :param meta: Metadata of the graph (returned by explore, or StateGraph.meta)
+    """
+    print(f'{"depth":>5s} {"nodes":>10s} {"goals":>8s} {"expanded":>10s} {"actions":>11s} {"no-ops":>10s} '
+          f'{"edges":>11s} {"dups":>11s} {"new":>10s} {"branch":>7s} {"eff.":>7s}')
+    for stats in meta['levels']:
+        print(f'{stats["depth"]:5d} {stats["nodes"]:10d} {stats["goals"]:8d} {stats["expanded"]:10d} '
+              f'{stats["actions"]:11d} {stats["noops"]:10d} {stats["edges"]:11d} {stats["duplicates"]:11d} '
+              f'{stats["new"]:10d} {stats["branching"]:7.2f} {stats["effective_branching"]:7.2f}')
+    goal = meta['shallowest_goal']
+    print(f'\n{meta["states"]} distinct states, {meta["edges"]} edges, {meta["goals"]} goal states')
+    print(f'Duplicate share: {meta["duplicate_share"] * 100:.1f}% of edges lead to a state found before')
+    print(f'Shallowest goal depth: {goal if goal is not None else "none within the explored depth"}')
+    print(f'Exhaustive: {"yes" if meta["exhaustive"] else "no"} ({meta["elapsed"]:.1f} sec)')
+
+
+class StateGraph:
+    """
+    State graph written by `explore`, loaded with memory-mapped files. Loading takes no time regardless of the size,
+    and pages are read only when they are accessed (and shared among processes reading the same graph).
+
+    Usage:
+        with StateGraph('graphs/seed0') as graph:
+            board = graph.make_board()
+            for action, target in graph.successors(0):
+                ...
+    """
+
+    def __init__(self, prefix):
+        """
+        Open a state graph.
+
+        :param prefix: Path prefix of the graph files
+        """
+        self.prefix = Path(prefix)
+        #: Metadata and statistics of the graph
+        self.meta = json.loads(_file(self.prefix, 'json').read_text())
+        #: [PRIVATE] Opened files and memory maps
+        self._maps = []
+        for suffix, typecode in _ARRAYS.items():
+            setattr(self, suffix, self._map(suffix).cast(typecode))
+        #: Records of the states (record_size bytes for each state)
+        self.records = self._map('records')
+        self.record_size = self.meta['record_size']
+
+    def _map(self, suffix: str) -> memoryview:
+        """
+        [PRIVATE] :return: Read-only memory view of a file
+        """
+        with _file(self.prefix, suffix).open('rb') as fp:
+            if fp.seek(0, 2) == 0:
+                # An empty file cannot be mapped.
+                return memoryview(b'')
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped)
+
+    def __len__(self) -> int:
+        return len(self.depth)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Close the memory maps. (Views of the graph cannot be used after this.)
+        """
+        for name in list(_ARRAYS) + ['records']:
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def successors(self, node: int) -> List[Tuple[int, int]]:
+        """
+        :param node: Index of a state
+        :return: List of (action code, index of the successor). (Decode actions with `action`)
+        """
+        begin, end = self.offsets[node], self.offsets[node + 1]
+        return list(zip(self.actions[begin:end], self.targets[begin:end]))
+
+    def is_goal(self, node: int) -> bool:
+        """
+        :return: True if the game ends at the state
+        """
+        return bool(self.flags[node] & GOAL)
+
+    def is_expanded(self, node: int) -> bool:
+        """
+        :return: True if all successors of the state are in the graph
+        """
+        return bool(self.flags[node] & EXPANDED)
+
+    def record(self, node: int) -> bytes:
+        """
+        :return: Binary record of a state
+        """
+        return bytes(self.records[node * self.record_size:(node + 1) * self.record_size])
+
+    def problem(self) -> dict:
+        """
+        :return: Problem of the graph
+        """
+        with _file(self.prefix, 'problem').open('rb') as fp:
+            return pickle.load(fp)
+
+    def make_board(self) -> GameBoard:
+        """
+        :return: A new game board with the problem of the graph, for decoding states and actions
+        """
+        board = GameBoard()
+        board._initialize()
+        board._load_problem(self.problem())
+        return board
+
+    def state(self, board: GameBoard, node: int) -> dict:
+        """
+        :param board: Game board with the problem of the graph (See make_board)
+        :param node: Index of a state
+        :return: State representation, which can be passed to `board.set_to_state`
+        """
+        return board.decode_state(self.record(node))
+
+    @staticmethod
+    def action(board: GameBoard, code: int):
+        """
+        :param board: Game board with the problem of the graph (See make_board)
+        :param code: Action code of an edge
+        :return: The action
+        """
+        return decode_action(code, board._codec)
+
+
+# Main function
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Enumerate reachable states of a board, and write the state graph.')
+    parser.add_argument('prefix', type=str, help='Path prefix of the graph files.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the board (Same as benchmark.py).')
+    parser.add_argument('--depth', type=int, default=6, help='Maximum depth to expand.')
+    parser.add_argument('--max-states', type=int, default=1000000, help='Maximum number of states.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes. (Default: number of CPUs, 0: no worker process)')
+    parser.add_argument('--chunk-size', type=int, default=64, help='Number of states sent to a worker at once.')
+    parser.add_argument('--load', action='store_true', help='Print the statistics of a written graph only.')
+    args = parser.parse_args()
+
+    # Show the progress on the console. (basicConfig does nothing here, as importing board has configured the
+    # root logger to write into the execution log.)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logging.getLogger('Explore').addHandler(console)
+    if args.load:
+        with StateGraph(args.prefix) as graph:
+            print_statistics(graph.meta)
+    else:
+        print_statistics(explore(make_problem(args.seed), args.prefix, max_depth=args.depth,
+                                 max_states=args.max_states, workers=args.workers, chunk_size=args.chunk_size))
+
+
+# Export the explorer and the graph loader
+__all__ = ['explore', 'StateGraph', 'print_statistics', 'make_problem', 'GOAL', 'EXPANDED']
@@ -0,0 +1,351 @@
+# Queue for breadth-first searches
+from collections import deque
+# Logging method for enumeration results
+import logging
+# Combinations of village candidates
+from itertools import combinations
+# Type specification for Python code
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Building types of the Settlers of Catan game (for the costs)
+from pycatan.board import BuildingType
+
+# Import action specifications
+from action import Action, ROAD, VILLAGE, UPGRADE
+# Import some utilities
+from util import coordinate_to_tuple
+
+#: Victory points which end the game (from buildings only)
+GOAL_POINTS = 4
+#: Limits of the pieces of a player: 3 villages, 3 cities and 10 roads
+MAX_VILLAGES = 3
+MAX_CITIES = 3
+MAX_ROADS = 10
+
+#: [PRIVATE] Logger instance for the enumerator
+_logger = logging.getLogger('Goals')
+
+# Type aliases for coordinates in state representations
+Node = Tuple[int, int]
+Edge = Tuple[Node, Node]
+
+
+def _path_key(a: Node, b: Node) -> Edge:
+    """
+    [PRIVATE] :return: Path coordinate of the path between two intersections (as in state representations)
+    """
+    return (a, b) if a <= b else (b, a)
+
+
+def _building_cost(building: BuildingType, count: int, cost: Dict[str, int]):
+    """
+    [PRIVATE] Add the resources required for the buildings to the cost.
+    """
+    for resource, amount in building.get_required_resources().items():
+        cost[resource.name] = cost.get(resource.name, 0) + amount * count
+
+
+class GoalConfiguration:
+    """
+    A final building configuration which ends the game: new villages, city upgrades and new roads.
+    All of them can be built from the state where the configuration is enumerated, within the limits of pieces.
+
+    A configuration can be given to a search as a target (e.g., `AnytimeWeightedAStar(target=goal)`), which
+        - generates only the actions building the target's pieces (trades and PASS are always allowed),
+        - accepts a game end only when every piece of the target is built, and
+        - estimates the remaining actions by the number of pieces not yet built (see `remaining`).
+    """
+
+    def __init__(self, player: int, villages: Tuple[Node, ...], cities: Tuple[Node, ...],
+                 roads: Tuple[Edge, ...], route: int):
+        """
+        :param player: Index of the player
+        :param villages: Intersections of new villages
+        :param cities: Intersections of settlements to upgrade (existing ones or new villages)
+        :param roads: Paths of new roads
+        :param route: Length of the longest route when the configuration is built
+        """
+        self.player = player
+        self.villages = tuple(sorted(villages))
+        self.cities = tuple(sorted(cities))
+        self.roads = tuple(sorted(roads))
+        self.route = route
+        #: Minimum number of actions to build the configuration (building actions only)
+        self.actions = len(self.villages) + len(self.cities) + len(self.roads)
+        #: Resource cards needed to build the configuration
+        self.cost: Dict[str, int] = {}
+        _building_cost(BuildingType.ROAD, len(self.roads), self.cost)
+        _building_cost(BuildingType.SETTLEMENT, len(self.villages), self.cost)
+        _building_cost(BuildingType.CITY, len(self.cities), self.cost)
+
+        #: [PRIVATE] Sets for testing actions
+        self._road_set = frozenset(self.roads)
+        self._village_set = frozenset(self.villages)
+        self._city_set = frozenset(self.cities)
+
+    def __repr__(self):
+        return (f'Goal(route={self.route}, actions={self.actions}, villages={list(self.villages)}, '
+                f'cities={list(self.cities)}, roads={list(self.roads)})')
+
+    def allows(self, action: Action) -> bool:
+        """
+        :param action: Action to test
+        :return: True if the action builds a piece of this configuration, or does not build anything
+        """
+        if isinstance(action, ROAD):
+            return tuple(sorted(coordinate_to_tuple(c) for c in action.edge)) in self._road_set
+        if isinstance(action, VILLAGE):
+            return coordinate_to_tuple(action.node) in self._village_set
+        if isinstance(action, UPGRADE):
+            return coordinate_to_tuple(action.node) in self._city_set
+        return True
+
+    def remaining(self, state: dict) -> int:
+        """
+        Count the pieces of this configuration which are not built yet at the given state.
+        It is a lower bound of the number of actions to reach the configuration, as each action builds one piece.
+
+        :param state: State representation
+        :return: Number of pieces not built yet
+        """
+        intersections = state['board']['intersections']
+        paths = state['board']['paths']
+        count = sum(1 for p in self.roads if paths[p]['owner'] != self.player)
+        count += sum(1 for v in self.villages if intersections[v]['owner'] != self.player)
+        count += sum(1 for c in self.cities if intersections[c]['type'] != 'CITY')
+        return count
+
+    def is_reached(self, state: dict) -> bool:
+        """
+        :param state: State representation
+        :return: True if every piece of this configuration is built at the given state
+        """
+        return self.remaining(state) == 0
+
+
+class _BoardGraph:
+    """
+    [PRIVATE] Graph of intersections and paths, read from a state representation for the player.
+    """
+
+    def __init__(self, state: dict):
+        self.player = state['player_id']
+        board = state['board']
+        self.neighbors: Dict[Node, List[Node]] = {n: [] for n in board['intersections']}
+        for a, b in board['paths']:
+            self.neighbors[a].append(b)
+            self.neighbors[b].append(a)
+        for adjacent in self.neighbors.values():
+            adjacent.sort()
+
+        #: Buildings: intersection -> (type, owner)
+        self.buildings = {n: (i['type'], i['owner']) for n, i in board['intersections'].items()
+                          if i['type'] is not None}
+        #: Own roads, and the paths occupied by any road
+        self.own_roads = frozenset(p for p, i in board['paths'].items() if i['owner'] == self.player)
+        self.occupied_paths = frozenset(p for p, i in board['paths'].items() if i['type'])
+        #: Own settlements and cities
+        self.settlements = sorted(n for n, (t, o) in self.buildings.items() if o == self.player and t == 'SETTLEMENT')
+        self.cities = sorted(n for n, (t, o) in self.buildings.items() if o == self.player and t == 'CITY')
+
+    def is_blocked(self, node: Node) -> bool:
+        """
+        :return: True if another player's building is at the intersection (A road cannot pass through it.)
+        """
+        building = self.buildings.get(node)
+        return building is not None and building[1] != self.player
+
+    def can_settle(self, node: Node) -> bool:
+        """
+        :return: True if the intersection keeps the distance rule for a new village
+        """
+        return node not in self.buildings and all(n not in self.buildings for n in self.neighbors[node])
+
+    def network_nodes(self) -> List[Node]:
+        """
+        :return: Intersections from which the player can build a road (own buildings, and ends of own roads
+            which are not blocked by other players' buildings)
+        """
+        nodes = {n for n, (_, o) in self.buildings.items() if o == self.player}
+        nodes.update(n for p in self.own_roads for n in p if not self.is_blocked(n))
+        return sorted(nodes)
+
+    def shortest_paths(self, sources: List[Node]) -> Tuple[Dict[Node, int], Dict[Node, Node]]:
+        """
+        Breadth-first search along empty paths, not passing through other players' buildings.
+
+        :param sources: Intersections at distance 0
+        :return: Tuple of (intersection -> number of roads to build, intersection -> previous intersection)
+        """
+        distance = {n: 0 for n in sources}
+        parent = {}
+        queue = deque(sources)
+        while queue:
+            node = queue.popleft()
+            if self.is_blocked(node):
+                continue
+            for other in self.neighbors[node]:
+                if other not in distance and _path_key(node, other) not in self.occupied_paths:
+                    distance[other] = distance[node] + 1
+                    parent[other] = node
+                    queue.append(other)
+        return distance, parent
+
+    @staticmethod
+    def trace(parent: Dict[Node, Node], node: Node) -> List[Edge]:
+        """
+        :return: Paths from a source of a breadth-first search to the intersection
+        """
+        edges = []
+        while node in parent:
+            edges.append(_path_key(parent[node], node))
+            node = parent[node]
+        return edges
+
+    def longest_route(self, roads: FrozenSet[Edge], budget: int) -> Tuple[int, FrozenSet[Edge]]:
+        """
+        Find the longest route which uses the given roads and at most `budget` new roads on empty paths.
+        A route is a trail (no path is used twice), which does not pass through other players' buildings,
+        as pycatan's calculate_player_longest_road. New roads should be connected to the given roads.
+
+        :param roads: Roads of the player
+        :param budget: Number of new roads which can be built
+        :return: Tuple of (length of the route, new roads on the route)
+        """
+        own_nodes = {n for n, (_, o) in self.buildings.items() if o == self.player}
+        best = [0, frozenset()]
+
+        def extend(node: Node, used: list, new: int, connected: bool):
+            if connected and len(used) > best[0]:
+                best[0] = len(used)
+                best[1] = frozenset(p for p in used if p not in roads)
+            if used and self.is_blocked(node):
+                # A route cannot continue through another player's building.
+                return
+            for other in self.neighbors[node]:
+                path = _path_key(node, other)
+                if path in used:
+                    continue
+                if path in roads:
+                    used.append(path)
+                    extend(other, used, new, True)
+                    used.pop()
+                elif new < budget and path not in self.occupied_paths:
+                    used.append(path)
+                    extend(other, used, new + 1, connected or other in own_nodes)
+                    used.pop()
+
+        for start in sorted(self.neighbors):
+            extend(start, [], 0, start in own_nodes)
+        return best[0], best[1]
+
+
+def _connect(graph: _BoardGraph, distance: Dict[Node, int], parent: Dict[Node, Node],
+             villages: Tuple[Node, ...], searches: Dict[Node, tuple]) -> Optional[FrozenSet[Edge]]:
+    """
+    [PRIVATE] Find the fewest roads connecting the new villages to the player's network.
+
+    :param graph: Board graph
+    :param distance: Distances from the network
+    :param parent: Search tree from the network
+    :param villages: New villages (at most two)
+    :param searches: Cache of breadth-first searches from each village
+    :return: Set of new roads, or None if a village cannot be connected
+    """
+    if not villages:
+        return frozenset()
+    if any(v not in distance for v in villages):
+        return None
+    if len(villages) == 1:
+        return frozenset(graph.trace(parent, villages[0]))
+
+    # Two villages: join them at an intersection (Steiner tree with a single junction)
+    for v in villages:
+        if v not in searches:
+            searches[v] = graph.shortest_paths([v])
+    best = None
+    for junction in sorted(distance):
+        if graph.is_blocked(junction) or any(junction not in searches[v][0] for v in villages):
+            continue
+        roads = set(graph.trace(parent, junction))
+        for v in villages:
+            roads.update(graph.trace(searches[v][1], junction))
+        if best is None or len(roads) < len(best):
+            best = frozenset(roads)
+    return best
+
+
+def enumerate_goals(state: dict, extend_routes: bool = True) -> List[GoalConfiguration]:
+    """
+    Enumerate the final building configurations reachable from the given state, which end the game with the fewest
+    buildings: each configuration adds exactly the victory points still needed, with new villages and city upgrades,
+    and the fewest roads connecting the new villages. The limits of pieces (3 villages, 3 cities, 10 roads) are kept.
+
+    With `extend_routes`, each configuration also comes with a variant spending the remaining road pieces on the
+    longest route. Configurations are ranked by the length of the longest route (larger is better),
+    and then by the number of building actions (smaller is better).
+
+    :param state: State representation (e.g., the initial state of a board)
+    :param extend_routes: Whether to add the variants extending the longest route
+    :return: Sorted list of goal configurations
+    """
+    graph = _BoardGraph(state)
+    points = len(graph.settlements) + 2 * len(graph.cities)
+    needed = max(0, GOAL_POINTS - points)
+    # Each village or upgrade gives 1 point, and at most 2 points are needed from the initial state.
+    assert needed <= 2, 'Goal enumeration supports states needing at most 2 victory points.'
+
+    distance, parent = graph.shortest_paths(graph.network_nodes())
+    candidates = sorted(n for n in distance if graph.can_settle(n))
+    searches = {}
+
+    # Many configurations share the same roads, so the longest routes are cached.
+    route_cache = {}
+
+    def routes(roads: FrozenSet[Edge], budget: int) -> Tuple[int, FrozenSet[Edge]]:
+        if (roads, budget) not in route_cache:
+            route_cache[roads, budget] = graph.longest_route(graph.own_roads | roads, budget)
+        return route_cache[roads, budget]
+
+    goals = []
+    seen = set()
+    for new_villages in range(needed + 1):
+        for villages in combinations(candidates, new_villages):
+            # New villages should keep the distance rule among themselves.
+            if any(b in graph.neighbors[a] for a, b in combinations(villages, 2)):
+                continue
+            upgrades = needed - new_villages
+            for cities in combinations(graph.settlements + list(villages), upgrades):
+                if len(graph.cities) + upgrades > MAX_CITIES:
+                    continue
+                # Existing settlements are upgraded first, so that new villages fit within the limit.
+                existing = sum(1 for c in cities if c not in villages)
+                if len(graph.settlements) - existing + new_villages > MAX_VILLAGES:
+                    continue
+
+                roads = _connect(graph, distance, parent, villages, searches)
+                budget = MAX_ROADS - len(graph.own_roads) - (len(roads) if roads is not None else 0)
+                if roads is None or budget < 0:
+                    continue
+
+                route, _ = routes(roads, 0)
+                variants = [(roads, route)]
+                if extend_routes and budget > 0:
+                    extended, extra = routes(roads, budget)
+                    if extended > route:
+                        variants.append((roads | extra, extended))
+
+                for variant_roads, variant_route in variants:
+                    key = (villages, tuple(sorted(cities)), variant_roads)
+                    if key not in seen:
+                        seen.add(key)
+                        goals.append(GoalConfiguration(graph.player, villages, cities, tuple(variant_roads),
+                                                       variant_route))
+
+    goals.sort(key=lambda g: (-g.route, g.actions, g.villages, g.cities, g.roads))
+    _logger.info(f'{len(goals)} goal configurations are enumerated.')
+    return goals
+
+
+# Export the enumerator and the configuration class
+__all__ = ['GoalConfiguration', 'enumerate_goals']
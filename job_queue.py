@@ -0,0 +1,188 @@
+# Package for writing results
+import json
+# Logging method for job handling
+import logging
+# Library for OS environment (atomic renaming of files)
+import os
+# Package for serializing jobs (state representations have tuple keys, so JSON cannot be used)
+import pickle
+# Package for file handling
+from pathlib import Path
+from time import time
+# Type specification for Python code
+from typing import Dict, List, Optional
+
+
+class JobQueue:
+    """
+    File-based work queue in a (shared) directory.
+    Any number of workers, on this host or other hosts mounting the same directory, can cooperate through it.
+
+    The directory has the following structure:
+        - pending/<job>.job: Jobs waiting for a worker. (Pickled dictionary)
+        - claimed/<job>.job: Jobs claimed by a worker. Claiming is done by an atomic rename from pending/.
+        - claimed/<job>.beat: Heartbeat of the worker running the job. The worker touches it periodically.
+        - results/<job>.json: Results of finished jobs.
+        - STOP: If exists, workers will exit.
+    """
+
+    #: [PRIVATE] Logger instance for JobQueue's function calls
+    _logger = logging.getLogger('JobQueue')
+
+    def __init__(self, directory):
+        """
+        Open a job queue.
+
+        :param directory: Path to the shared directory
+        """
+        self.directory = Path(directory)
+        self.pending = self.directory / 'pending'
+        self.claimed = self.directory / 'claimed'
+        self.results = self.directory / 'results'
+        self.stop_marker = self.directory / 'STOP'
+        #: [PRIVATE] Last observed heartbeat for each claimed job: (modification time, local time of observation)
+        self._beats = {}
+
+        for d in (self.pending, self.claimed, self.results):
+            d.mkdir(parents=True, exist_ok=True)
+
+    def clear(self):
+        """
+        Remove all jobs and results in the queue. (Used by a coordinator before submitting jobs.)
+        """
+        for d in (self.pending, self.claimed, self.results):
+            for f in d.iterdir():
+                f.unlink(missing_ok=True)
+        self.stop_marker.unlink(missing_ok=True)
+        self._beats.clear()
+
+    def submit(self, job_id: str, job: dict):
+        """
+        Submit a job.
+
+        :param job_id: Unique identifier of the job. It should be usable as a file name.
+        :param job: Dictionary describing the job. It should be picklable.
+        """
+        job = dict(job, job_id=job_id)
+        # Write to a temporary file first, and then publish it atomically.
+        temp = self.directory / f'.{job_id}.{os.getpid()}.tmp'
+        with temp.open('wb') as fp:
+            pickle.dump(job, fp)
+        os.replace(temp, self.pending / f'{job_id}.job')
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        Claim a pending job.
+
+        :param worker_id: Identifier of the worker (e.g., host name and process id)
+        :return: Dictionary of the job, or None if there is no pending job.
+        """
+        for path in sorted(self.pending.glob('*.job')):
+            target = self.claimed / path.name
+            try:
+                # Renaming is atomic; only one worker can succeed.
+                os.rename(path, target)
+            except FileNotFoundError:
+                # Another worker claimed this job first.
+                continue
+
+            with target.open('rb') as fp:
+                job = pickle.load(fp)
+            job['worker'] = worker_id
+            self.heartbeat(job)
+            self._logger.info(f'{worker_id} claimed job {job["job_id"]}')
+            return job
+
+        return None
+
+    def heartbeat(self, job: dict):
+        """
+        Tell that the worker running the job is alive.
+
+        :param job: Job claimed by the worker
+        """
+        (self.claimed / f'{job["job_id"]}.beat').write_text(job['worker'])
+
+    def complete(self, job: dict, record: dict):
+        """
+        Write the result of a job, and release the claim.
+
+        :param job: Job claimed by the worker
+        :param record: Result record of the job. It should be JSON-compatible.
+        """
+        job_id = job['job_id']
+        temp = self.directory / f'.{job_id}.{os.getpid()}.tmp'
+        temp.write_text(json.dumps(record))
+        os.replace(temp, self.results / f'{job_id}.json')
+
+        (self.claimed / f'{job_id}.beat').unlink(missing_ok=True)
+        (self.claimed / f'{job_id}.job').unlink(missing_ok=True)
+
+    def collect(self, job_ids) -> Dict[str, dict]:
+        """
+        Read the results of finished jobs.
+
+        :param job_ids: Identifiers of the jobs to read
+        :return: Dictionary of job identifier to the result record, only for the finished jobs
+        """
+        finished = {}
+        for job_id in job_ids:
+            path = self.results / f'{job_id}.json'
+            if path.exists():
+                finished[job_id] = json.loads(path.read_text())
+                self._beats.pop(job_id, None)
+        return finished
+
+    def reclaim_stale(self, timeout: float) -> List[str]:
+        """
+        Move the jobs of dead workers back to the pending directory.
+        A worker is regarded as dead if its heartbeat did not change for `timeout` seconds.
+        (The time is measured by the local clock, so that clock differences among hosts do not matter.)
+
+        :param timeout: Seconds to wait for a heartbeat
+        :return: List of reclaimed job identifiers
+        """
+        now = time()
+        reclaimed = []
+        for path in self.claimed.glob('*.job'):
+            job_id = path.stem
+            beat = self.claimed / f'{job_id}.beat'
+            try:
+                modified = beat.stat().st_mtime_ns
+            except FileNotFoundError:
+                # The worker has not written the first heartbeat yet (or just finished the job).
+                modified = None
+
+            last_modified, observed = self._beats.get(job_id, (None, now))
+            if job_id not in self._beats or modified != last_modified:
+                self._beats[job_id] = (modified, now)
+                continue
+
+            if observed + timeout < now:
+                try:
+                    os.rename(path, self.pending / path.name)
+                except FileNotFoundError:
+                    # The job has finished in the meantime.
+                    continue
+                beat.unlink(missing_ok=True)
+                self._beats.pop(job_id, None)
+                reclaimed.append(job_id)
+                self._logger.warning(f'Job {job_id} is reclaimed, as its worker did not respond for {timeout} sec.')
+
+        return reclaimed
+
+    def stop(self):
+        """
+        Ask all workers to exit.
+        """
+        self.stop_marker.touch()
+
+    def is_stopped(self) -> bool:
+        """
+        :return: True if workers should exit.
+        """
+        return self.stop_marker.exists()
+
+
+# Export only the queue class
+__all__ = ['JobQueue']
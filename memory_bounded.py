@@ -0,0 +1,367 @@
+# Priority queues for the best and the worst nodes
+import heapq
+# Logging method for search progress
+import logging
+# Counter for breaking ties in the priority queues
+from itertools import count
+# Type specification for Python code
+from typing import Callable, Dict, List, Optional
+
+# Import action specifications and the board
+from action import Action, PASS
+from board import GameBoard
+# Import the default heuristic
+from anytime import victory_point_gap
+
+#: Value of a node which cannot lead to a better plan
+INFINITY = float('inf')
+
+
+class _Node:
+    """
+    [PRIVATE] Node of the search tree kept in memory.
+    """
+
+    __slots__ = ('record', 'g', 'f', 'parent', 'action', 'depth', 'children', 'forgotten', 'pending', 'expanded',
+                 'alive', 'in_open', 'version', 'key')
+
+    def __init__(self, record: bytes, g: int, f: float, parent: Optional['_Node'], action: Optional[Action],
+                 key: tuple):
+        #: Binary record of the state (See GameBoard.encode_state)
+        self.record = record
+        #: Number of actions from the root, and the lower bound of the plans through this node
+        self.g = g
+        self.f = f
+        #: Parent node, and the action from the parent
+        self.parent = parent
+        self.action = action
+        self.depth = parent.depth + 1 if parent is not None else 0
+        #: Children in memory: repr(action) -> node
+        self.children: Dict[str, '_Node'] = {}
+        #: f-values of the children dropped from memory (backed up for their regeneration): repr(action) -> f.
+        #: None until a child is dropped.
+        self.forgotten: Optional[Dict[str, float]] = None
+        #: Smallest f-value among the successors not in memory (not generated yet, or dropped)
+        self.pending = INFINITY
+        #: True if the node has been expanded (at least one successor has been generated)
+        self.expanded = False
+        #: False after the node is dropped from memory
+        self.alive = True
+        #: Whether the node is in the open list, and the version of its queue entries (older entries are stale)
+        self.in_open = False
+        self.version = 0
+        #: Key of the node in the table of reached states
+        self.key = key
+
+    def priority(self) -> float:
+        """
+        :return: f-value of the node in the open list: its own f-value before expansion,
+            or the smallest f-value of the successors not in memory after expansion.
+        """
+        return self.pending if self.expanded else self.f
+
+
+class MemoryBoundedAStar:
+    """
+    Memory-bounded best-first search (simplified memory-bounded A*, SMA*).
+
+    It runs as A* (f = g + h, where g is the number of actions) while the nodes fit in the budget: an expansion
+    generates the successors in the order of f-values, as long as there is room for them (at least one of them).
+    A node with successors not in memory stays in the open list with the smallest f-value among them, and
+    generates the next one when that value becomes the best again. When the budget is exceeded, the worst leaves
+    (largest f, shallowest first) are dropped, and their f-values are backed up to their parents for regeneration.
+    So the search keeps running within the budget, instead of failing with MemoryError or being stopped by the
+    evaluator.
+
+    The budget is a number of nodes (`max_nodes`), or the memory usage: when the board reports that the memory is
+    about to run out (`memory_budget()` is less than `memory_margin`, or `get_current_memory_usage()` exceeds
+    `memory_limit`), the number of nodes at that moment (less `shrink`) becomes the budget. (The memory of
+    dropped nodes is reused by Python, but it is not returned to the OS, so the reading itself does not go down.)
+
+    With an admissible heuristic, the plan is optimal if the budget can hold the path to the goal
+    (i.e., max_nodes is larger than the number of actions).
+    When the time is about to run out, the best plan found so far is returned.
+
+    Usage (in an agent):
+        return MemoryBoundedAStar().search(board)
+        # or, with a fixed budget of nodes:
+        return MemoryBoundedAStar(max_nodes=100000).search(board)
+    """
+
+    #: [PRIVATE] Logger instance for the search
+    _logger = logging.getLogger('MemoryBounded')
+
+    def __init__(self, heuristic: Callable[[dict], float] = victory_point_gap, max_nodes: int = None,
+                 memory_limit: int = None, memory_margin: int = 512 * 1024 ** 2, shrink: float = 0.2,
+                 time_margin: float = 30.0, check_interval: int = 100):
+        """
+        :param heuristic: Function estimating the number of actions from a state to the end of the game
+        :param max_nodes: Maximum number of nodes in memory. None to decide it from the memory usage.
+        :param memory_limit: Memory usage (bytes) at which the number of nodes is bounded. None for no limit.
+        :param memory_margin: Bytes to keep in reserve, before the board's memory limit (See memory_budget)
+        :param shrink: Share of nodes to drop, when the budget is decided from the memory usage
+        :param time_margin: Seconds to keep in reserve. The search stops when less time remains.
+        :param check_interval: Number of expansions between checking the budgets
+        """
+        self.heuristic = heuristic
+        self.max_nodes = max_nodes
+        self.memory_limit = memory_limit
+        self.memory_margin = memory_margin
+        self.shrink = shrink
+        self.time_margin = time_margin
+        self.check_interval = check_interval
+        #: Best plan found so far, and its number of actions
+        self.best_plan: Optional[List[Action]] = None
+        self.best_cost = INFINITY
+        #: Statistics: number of expansions (including regenerations), nodes dropped (including dead ends),
+        #: and the peak number of nodes in memory
+        self.expansions = 0
+        self.dropped = 0
+        self.peak_nodes = 0
+
+        #: [PRIVATE] Queues of the open list: best (smallest f, deepest first) and worst (largest f, shallowest)
+        self._best = []
+        self._worst = []
+        #: [PRIVATE] Tie breaker of the queues
+        self._tie = count()
+        #: [PRIVATE] Nodes in memory for each reached state (See _key)
+        self._reached: Dict[tuple, _Node] = {}
+        #: [PRIVATE] Number of nodes in memory
+        self._nodes = 0
+
+    @staticmethod
+    def _key(record: bytes, action: Optional[Action]) -> tuple:
+        """
+        [PRIVATE] :return: Key of a reached state. The successors depend on the previous action, except after PASS.
+            (See GameBoard.get_successor_actions)
+        """
+        return record, None if action is None or isinstance(action, PASS) else repr(action)
+
+    def _memory_exceeded(self, board: GameBoard) -> bool:
+        """
+        [PRIVATE] :return: True if the memory is about to run out
+        """
+        if board.memory_budget() < self.memory_margin:
+            return True
+        return self.memory_limit is not None and board.get_current_memory_usage() > self.memory_limit
+
+    def _open(self, node: _Node):
+        """
+        [PRIVATE] Put a node into the open list (again, if its priority has changed).
+        """
+        node.version += 1
+        node.in_open = True
+        priority = node.priority()
+        heapq.heappush(self._best, (priority, -node.depth, next(self._tie), node, node.version))
+        if not node.children:
+            # Only leaves can be dropped.
+            heapq.heappush(self._worst, (-priority, node.depth, next(self._tie), node, node.version))
+
+    def _close(self, node: _Node):
+        """
+        [PRIVATE] Take a node out of the open list. (Its queue entries become stale.)
+        """
+        node.version += 1
+        node.in_open = False
+
+    def _pop_best(self) -> Optional[_Node]:
+        """
+        [PRIVATE] :return: The node of the smallest priority in the open list, or None if it is empty
+        """
+        while self._best:
+            _, _, _, node, version = heapq.heappop(self._best)
+            if node.alive and node.in_open and node.version == version:
+                return node
+        return None
+
+    def _pop_worst(self, protected: List[_Node]) -> Optional[_Node]:
+        """
+        [PRIVATE] :param protected: Nodes which should not be dropped (e.g., the root)
+        :return: The leaf of the largest priority in the open list, or None if there's no leaf to drop
+        """
+        kept = []
+        found = None
+        while self._worst:
+            entry = heapq.heappop(self._worst)
+            _, _, _, node, version = entry
+            if not (node.alive and node.in_open and node.version == version and not node.children):
+                continue
+            if any(node is other for other in protected):
+                # Keep the entry, so that the node can be dropped later.
+                kept.append(entry)
+                continue
+            found = node
+            break
+        for entry in kept:
+            heapq.heappush(self._worst, entry)
+        return found
+
+    def _drop(self, node: _Node, value: float, root: _Node):
+        """
+        [PRIVATE] Drop a leaf from memory, and back up its f-value to the parent.
+        A parent left without children and without a finite backed-up value cannot lead to a plan,
+        so it is dropped as well.
+
+        :param node: Leaf to drop
+        :param value: f-value to back up
+        :param root: Root node, which is never dropped
+        """
+        while True:
+            self._close(node)
+            node.alive = False
+            self._nodes -= 1
+            self.dropped += 1
+            if self._reached.get(node.key) is node:
+                del self._reached[node.key]
+
+            parent = node.parent
+            name = repr(node.action)
+            del parent.children[name]
+            if parent.forgotten is None:
+                parent.forgotten = {}
+            parent.forgotten[name] = value
+            parent.pending = min(parent.pending, value)
+            if parent.pending < INFINITY:
+                # The parent regenerates the dropped child when the backed-up value becomes the best.
+                self._open(parent)
+                return
+            if parent.children or parent is root:
+                return
+            node, value = parent, INFINITY
+
+    def _plan(self, node: _Node, action: Action = None) -> List[Action]:
+        """
+        [PRIVATE] Read the actions from the root to the node (and the given last action).
+        """
+        actions = [action] if action is not None else []
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        return actions[::-1]
+
+    def search(self, board: GameBoard) -> List[Action]:
+        """
+        Search for the shortest plan within the memory budget, until it is proven optimal or the time runs out.
+
+        :param board: Game board to manipulate
+        :return: The best plan found. (Empty list if no plan has been found.)
+        """
+        initial = board.get_initial_state()
+        budget = self.max_nodes if self.max_nodes is not None else INFINITY
+        record = board.encode_state(initial)
+        root = _Node(record, 0, self.heuristic(initial), None, None, self._key(record, None))
+        self._best, self._worst = [], []
+        self._reached = {root.key: root}
+        self._nodes = 1
+        self._open(root)
+
+        board.set_to_state(initial)
+        if board.is_game_end():
+            return []
+
+        while True:
+            node = self._pop_best()
+            if node is None or node.priority() >= self.best_cost:
+                # Every plan through the open list is at least as long as the best plan.
+                finished = True
+                break
+
+            self.expansions += 1
+            if self.expansions % self.check_interval == 0:
+                if board.remaining_time() < self.time_margin:
+                    finished = False
+                    break
+                if budget == INFINITY and self._memory_exceeded(board):
+                    budget = max(2, int(self._nodes * (1 - self.shrink)))
+                    self._logger.info(f'Memory is about to run out. The search is bounded to {budget} nodes.')
+
+            generated = self._expand(board, node, root, budget)
+
+            # Drop the worst leaves until the nodes fit in the budget. (Not the nodes just generated, which would be
+            # generated again at once.)
+            protected = [root] + generated
+            while self._nodes > budget:
+                leaf = self._pop_worst(protected)
+                if leaf is None:
+                    # Only the nodes on the current paths are left.
+                    break
+                self._drop(leaf, leaf.priority(), root)
+            self.peak_nodes = max(self.peak_nodes, self._nodes)
+
+        self._logger.info(f'Memory-bounded A*: best plan has {self.best_cost} actions '
+                          f'({"finished" if finished else "stopped by the time limit"}, {self.expansions} expansions, '
+                          f'{self.dropped} nodes dropped, at most {self.peak_nodes} nodes in memory).')
+        return list(self.best_plan) if self.best_plan is not None else []
+
+    def _expand(self, board: GameBoard, node: _Node, root: _Node, budget: float) -> List[_Node]:
+        """
+        [PRIVATE] Generate the successors of a node which are not in memory, in the order of f-values, as long as
+        they fit in the budget (at least one of them). The node stays in the open list for the rest.
+
+        :param board: Game board to manipulate
+        :param node: Node to expand
+        :param root: Root node
+        :param budget: Maximum number of nodes in memory
+        :return: Nodes generated
+        """
+        self._close(node)
+        node.expanded = True
+        forgotten = node.forgotten or {}
+
+        state = board.decode_state(node.record, lazy=True)
+        board.set_to_state(state)
+        # Successors not in memory: (f, order, action, record, key)
+        candidates = []
+        for action in board.get_successor_actions(node.action):
+            name = repr(action)
+            if name in node.children or forgotten.get(name, 0) == INFINITY:
+                # In memory, or known not to lead to a better plan.
+                continue
+            child_state = board.simulate_action(state, action, lazy=True)
+            g = node.g + 1
+            if board.is_game_end():
+                if g < self.best_cost:
+                    self.best_plan = self._plan(node, action)
+                    self.best_cost = g
+                    self._logger.info(f'Found a plan with {g} actions.')
+                continue
+
+            record = board.encode_state(child_state)
+            key = self._key(record, action)
+            existing = self._reached.get(key)
+            if existing is not None and existing.g <= g:
+                # The state is in memory with a path at most as long.
+                continue
+            # Path-max: the f-value never decreases along a path. A dropped child keeps its backed-up value.
+            f = max(node.f, g + self.heuristic(child_state), forgotten.get(name, 0))
+            if f >= self.best_cost:
+                continue
+            candidates.append((f, len(candidates), action, record, key))
+
+        candidates.sort(key=lambda t: t[:2])
+        generated = []
+        for f, _, action, record, key in candidates:
+            if generated and self._nodes >= budget:
+                node.pending = f
+                break
+            child = _Node(record, node.g + 1, f, node, action, key)
+            node.children[repr(action)] = child
+            forgotten.pop(repr(action), None)
+            self._reached[key] = child
+            self._nodes += 1
+            self._open(child)
+            generated.append(child)
+        else:
+            node.pending = INFINITY
+
+        if node.pending < INFINITY:
+            # The rest of the successors will be generated when their f-value becomes the best.
+            self._open(node)
+        elif not node.children and node is not root:
+            # No successor can lead to a better plan.
+            self._drop(node, INFINITY, root)
+        return generated
+
+
+# Export the search only
+__all__ = ['MemoryBoundedAStar']
@@ -0,0 +1,156 @@
+# Garbage collector interface, for enumerating live objects
+import gc
+# Library for measuring object sizes
+import sys
+# Memory allocation tracer
+import tracemalloc
+# A dictionary class which can set the default value
+from collections import defaultdict
+# Package for file handling
+from pathlib import Path
+# Type specification for Python code
+from typing import Dict, Tuple
+
+# Import some class definitions that implements the Settlers of Catan game.
+from pycatan.board import Building
+
+# Import action specifications
+from action import Action
+
+
+def _object_category(obj) -> str:
+    """
+    Classify an object for memory attribution.
+    Dictionaries are classified by their keys, so that state representations can be recognized.
+
+    :param obj: Object to classify
+    :return: Name of category
+    """
+    if isinstance(obj, dict):
+        if 'state_id' in obj:
+            return 'dict: state'
+        if 'hexes' in obj and 'intersections' in obj:
+            return 'dict: state[board]'
+        if 'resources' in obj and 'harbors' in obj:
+            return 'dict: state[player]'
+        if 'type' in obj and ('dice' in obj or 'owner' in obj or len(obj) == 1):
+            return 'dict: state[board] cell'
+        if obj and isinstance(next(iter(obj)), tuple):
+            return 'dict: state[board] table (keyed by coordinates)'
+        return 'dict: others'
+    if isinstance(obj, Action):
+        return f'Action: {type(obj).__name__}'
+    if isinstance(obj, Building):
+        return f'Building: {type(obj).__name__}'
+    return type(obj).__name__
+
+
+class PeakMemoryProfiler:
+    """
+    Allocation profiler, which keeps the allocation snapshot at the peak of traced memory.
+    A new snapshot is taken only when the traced memory grows by the given ratio, so the number of snapshots
+    grows logarithmically with the peak memory.
+    """
+
+    def __init__(self, frames: int = 1, growth: float = 1.25, minimum: int = 1024 ** 2):
+        """
+        :param frames: Number of stack frames to record for each allocation
+        :param growth: Ratio of growth of the traced memory to take a new snapshot
+        :param minimum: Minimum traced memory (bytes) to take a snapshot
+        """
+        self.frames = frames
+        self.growth = growth
+        #: Traced memory (bytes) when the last snapshot was taken
+        self.peak = minimum / growth
+        #: Allocation snapshot at the peak
+        self.snapshot = None
+        #: Statistics of live objects when tracing starts: category -> (count, total shallow size)
+        self.baseline: Dict[str, Tuple[int, int]] = {}
+        #: Statistics of live objects at the peak: category -> (count, total shallow size)
+        self.objects: Dict[str, Tuple[int, int]] = {}
+
+    @staticmethod
+    def _count_objects() -> Dict[str, Tuple[int, int]]:
+        """
+        Count live objects by category (only objects tracked by the garbage collector)
+
+        :return: Dictionary of category -> (count, total shallow size)
+        """
+        counter = defaultdict(lambda: [0, 0])
+        for obj in gc.get_objects():
+            category = counter[_object_category(obj)]
+            category[0] += 1
+            category[1] += sys.getsizeof(obj)
+        return {k: (v[0], v[1]) for k, v in counter.items()}
+
+    def start(self):
+        """
+        Start tracing allocations.
+        """
+        self.baseline = self._count_objects()
+        tracemalloc.start(self.frames)
+
+    def stop(self):
+        """
+        Take the last snapshot (if it is the peak), and stop tracing allocations.
+        """
+        if tracemalloc.is_tracing():
+            self.update()
+            tracemalloc.stop()
+
+    def update(self):
+        """
+        Take a snapshot if the traced memory exceeds the last peak.
+        """
+        current, _ = tracemalloc.get_traced_memory()
+        if current <= self.peak * self.growth:
+            return
+
+        self.peak = current
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ])
+
+        # Count live objects created after tracing starts
+        self.objects = {}
+        for category, (count, size) in self._count_objects().items():
+            base_count, base_size = self.baseline.get(category, (0, 0))
+            if count > base_count:
+                self.objects[category] = (count - base_count, size - base_size)
+
+    def write_report(self, path, title: str = '', limit: int = 30):
+        """
+        Write the allocation report at the peak.
+
+        :param path: Path of the report file
+        :param title: Title of the report
+        :param limit: Number of entries for each table
+        """
+        lines = [f'# Memory profile {title}']
+        if self.snapshot is None:
+            lines.append('Traced memory did not reach the minimum size to take a snapshot.')
+        else:
+            lines += [f'Peak traced memory: {self.peak / 1024 ** 2:.2f}MB', '']
+            lines.append(f'## Top {limit} allocations by file')
+            for stat in self.snapshot.statistics('filename')[:limit]:
+                lines.append(f'{stat.size / 1024:12.1f}KB {stat.count:10d} blocks  {stat.traceback[0].filename}')
+            lines.append('')
+
+            lines.append(f'## Top {limit} allocations by line')
+            for stat in self.snapshot.statistics('lineno')[:limit]:
+                frame = stat.traceback[0]
+                lines.append(f'{stat.size / 1024:12.1f}KB {stat.count:10d} blocks  {frame.filename}:{frame.lineno}')
+            lines.append('')
+
+        lines.append(f'## Top {limit} live objects created during tracing, by type '
+                     f'(shallow size; strings, numbers and dicts of such values are not tracked)')
+        for category, (count, size) in sorted(self.objects.items(), key=lambda t: -t[1][1])[:limit]:
+            lines.append(f'{size / 1024:12.1f}KB {count:10d} objects {category}')
+
+        Path(path).write_text('\n'.join(lines) + '\n')
+
+
+# Export only the profiler class
+__all__ = ['PeakMemoryProfiler']
@@ -0,0 +1,348 @@
+# Logging method for building progress
+import logging
+# Memory-mapped files (for loading a database)
+import mmap
+# Library for OS environment (atomic renaming of files)
+import os
+# Command line argument parser for the offline builder
+from argparse import ArgumentParser
+# Queue for the backward breadth-first search
+from collections import deque
+# Combinations of resource counts
+from itertools import product
+# Package for file handling
+from pathlib import Path
+# Binary packing of the file header
+from struct import Struct
+# Time functions
+from time import time
+# Type specification for Python code
+from typing import Dict, List, Tuple
+
+# Building types of the Settlers of Catan game (for the costs)
+from pycatan.board import BuildingType
+
+# Import the board and the order of resources
+from board import GameBoard, RESOURCES
+
+#: Default file of the pattern database
+DEFAULT_PATH = Path(__file__).parent / 'pattern_database.pdb'
+#: Default cap of resource counts
+DEFAULT_CAP = 5
+#: Header of a database file: magic, version, cap of resource counts, number of entries
+HEADER = Struct('<4sHHI')
+#: Magic bytes and version of database files
+MAGIC = b'CPDB'
+VERSION = 1
+
+#: Victory points which end the game (from buildings only)
+GOAL_POINTS = 4
+#: Abstract building counts (villages, cities). Every count before the goal, and every count just reaching it.
+BUILDINGS = [(s, c) for c in range(GOAL_POINTS // 2 + 1) for s in range(GOAL_POINTS + 1) if s + 2 * c <= GOAL_POINTS]
+#: Abstract trading rates (the best rate of the player among all resources)
+RATES = [2, 3, 4]
+#: Number of dice rolls in a PASS (one for each player)
+ROLLS_PER_PASS = 4
+#: Distance of an entry which cannot reach the goal
+UNREACHABLE = 255
+
+#: [PRIVATE] Logger instance for the database
+_logger = logging.getLogger('PatternDB')
+
+
+def _cost(building: BuildingType) -> Tuple[int, ...]:
+    """
+    [PRIVATE] :return: Resources required for a building, in the order of RESOURCES
+    """
+    required = {resource.name: amount for resource, amount in building.get_required_resources().items()}
+    return tuple(required.get(r, 0) for r in RESOURCES)
+
+
+class _Abstraction:
+    """
+    [PRIVATE] Abstract state space of the database.
+
+    An abstract state is (villages, cities, best trading rate, resources), where each resource count is capped:
+    the count `cap` means "cap or more", and it is never decreased by spending (as if unlimited).
+    This is a relaxation of the game: every concrete plan can be replayed on the abstraction with the same number
+    of actions, as
+        - the positions of buildings are ignored (a village can always be built, and roads are never needed),
+        - a PASS yields the maximum (no dice roll of 7),
+        - every trade uses the best rate of the player, and a village may connect a 2:1 harbor,
+        - capped counts are never exhausted.
+    Hence the distance on the abstraction is an admissible heuristic for the game.
+    """
+
+    def __init__(self, cap: int):
+        """
+        :param cap: Cap of resource counts
+        """
+        self.cap = cap
+        self.radix = cap + 1
+        #: Number of resource vectors, and the number of entries of the database
+        self.vectors = self.radix ** len(RESOURCES)
+        self.size = len(BUILDINGS) * len(RATES) * self.vectors
+        #: Resource vectors, in the order of their indices
+        self.vector_list = list(product(range(self.radix), repeat=len(RESOURCES)))
+
+    def vector_index(self, vector) -> int:
+        """
+        :return: Index of a resource vector (each count should be capped already)
+        """
+        index = 0
+        for count in vector:
+            index = index * self.radix + count
+        return index
+
+    def index(self, buildings: int, rate: int, vector: int) -> int:
+        """
+        :param buildings: Index of (villages, cities) in BUILDINGS
+        :param rate: Index of the trading rate in RATES
+        :param vector: Index of the resource vector
+        :return: Index of the entry
+        """
+        return (buildings * len(RATES) + rate) * self.vectors + vector
+
+    def add(self, vector: tuple, amounts: tuple) -> tuple:
+        """
+        :return: Resource vector after receiving resources
+        """
+        return tuple(min(self.cap, count + amount) for count, amount in zip(vector, amounts))
+
+    def spend(self, vector: tuple, amounts: tuple):
+        """
+        :return: Resource vector after paying resources, or None if they are not enough
+        """
+        if any(count < amount for count, amount in zip(vector, amounts)):
+            return None
+        # A capped count is never exhausted.
+        return tuple(count if count == self.cap else count - amount for count, amount in zip(vector, amounts))
+
+    def inverse(self, forward) -> List[List[int]]:
+        """
+        Invert a transition of resource vectors.
+
+        :param forward: Function from a resource vector to the next vector (or None if not applicable)
+        :return: For each vector index, indices of the vectors leading to it
+        """
+        inverse = [[] for _ in range(self.vectors)]
+        for index, vector in enumerate(self.vector_list):
+            result = forward(vector)
+            if result is not None:
+                inverse[self.vector_index(result)].append(index)
+        return inverse
+
+
+def build_pattern_database(path=DEFAULT_PATH, cap: int = DEFAULT_CAP) -> Path:
+    """
+    Build a pattern database offline: the minimum number of actions to end the game from every abstract state
+    (See _Abstraction), computed by a breadth-first search backward from the goal states.
+
+    :param path: Path of the database file
+    :param cap: Cap of resource counts. (The size of the database is (cap + 1) ** 5 * 27 bytes.)
+    :return: Path of the written database
+    """
+    begin = time()
+    abstraction = _Abstraction(cap)
+    n = len(RESOURCES)
+    village, city = _cost(BuildingType.SETTLEMENT), _cost(BuildingType.CITY)
+
+    # Inverted transitions of resource vectors: PASS with each multiplier, trades at each rate, and buildings
+    passes = {multiplier: abstraction.inverse(lambda v, m=multiplier: abstraction.add(v, (ROLLS_PER_PASS * m,) * n))
+              for multiplier in {1 + c for _, c in BUILDINGS}}
+    trades = []
+    for rate in RATES:
+        inverses = []
+        for given, request in product(range(n), repeat=2):
+            if given == request:
+                continue
+            paid = tuple(rate if i == given else 0 for i in range(n))
+            received = tuple(1 if i == request else 0 for i in range(n))
+            inverses.append(abstraction.inverse(
+                lambda v, p=paid, r=received: None if abstraction.spend(v, p) is None
+                else abstraction.add(abstraction.spend(v, p), r)))
+        trades.append(inverses)
+    villages = abstraction.inverse(lambda v: abstraction.spend(v, village))
+    cities = abstraction.inverse(lambda v: abstraction.spend(v, city))
+    building_index = {b: i for i, b in enumerate(BUILDINGS)}
+    is_goal = [s + 2 * c >= GOAL_POINTS for s, c in BUILDINGS]
+
+    # Backward search from every goal state
+    distance = bytearray([UNREACHABLE]) * abstraction.size
+    queue = deque()
+    for b, goal in enumerate(is_goal):
+        if goal:
+            for r in range(len(RATES)):
+                start = abstraction.index(b, r, 0)
+                distance[start:start + abstraction.vectors] = bytes(abstraction.vectors)
+                queue.extend(range(start, start + abstraction.vectors))
+
+    while queue:
+        entry = queue.popleft()
+        rest, vector = divmod(entry, abstraction.vectors)
+        b, r = divmod(rest, len(RATES))
+        s, c = BUILDINGS[b]
+        step = distance[entry] + 1
+
+        # Predecessors: (buildings, rate, list of predecessor vectors)
+        predecessors = []
+        if not is_goal[b]:
+            predecessors.append((b, r, passes[1 + c][vector]))
+            predecessors += [(b, r, inverse[vector]) for inverse in trades[r]]
+        if s > 0 and RATES[r] == min(RATES):
+            # A village may connect a harbor of the best rate, from any rate.
+            previous = building_index[(s - 1, c)]
+            if not is_goal[previous]:
+                predecessors += [(previous, p, villages[vector]) for p in range(len(RATES))]
+        if c > 0 and (s + 1, c - 1) in building_index:
+            previous = building_index[(s + 1, c - 1)]
+            if not is_goal[previous]:
+                predecessors.append((previous, r, cities[vector]))
+
+        for b2, r2, vectors in predecessors:
+            base = abstraction.index(b2, r2, 0)
+            for v in vectors:
+                if distance[base + v] == UNREACHABLE:
+                    distance[base + v] = step
+                    queue.append(base + v)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, and then publish it atomically.
+    temp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with temp.open('wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, cap, abstraction.size))
+        fp.write(distance)
+    os.replace(temp, path)
+
+    _logger.info(f'Pattern database with {abstraction.size} entries (cap={cap}, max distance '
+                 f'{max(d for d in distance if d != UNREACHABLE)}) is built in {time() - begin:.1f} sec.')
+    return path
+
+
+class PatternDatabase:
+    """
+    Admissible heuristic backed by a pattern database (See build_pattern_database), memory-mapped from its file.
+    A lookup takes O(1): the building counts, the best trading rate and the capped resource counts of the player
+    give the index of the entry.
+
+    Usage (in an agent):
+        heuristic = PatternDatabase.load()
+        return AnytimeWeightedAStar(heuristic=heuristic).search(board)
+    """
+
+    #: [PRIVATE] Logger instance for the database
+    _logger = logging.getLogger('PatternDB')
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Open a pattern database.
+
+        :param path: Path of the database file
+        """
+        self.path = Path(path)
+        with self.path.open('rb') as fp:
+            #: [PRIVATE] Memory map of the file
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, cap, size = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{self.path} is not a pattern database of version {VERSION}.')
+        #: [PRIVATE] Abstraction of the database, and the entries (distances)
+        self._abstraction = _Abstraction(cap)
+        assert self._abstraction.size == size, 'The database file has a wrong number of entries.'
+        self._entries = memoryview(self._map)[HEADER.size:HEADER.size + size]
+        #: [PRIVATE] Index of (villages, cities) in BUILDINGS
+        self._buildings = {b: i for i, b in enumerate(BUILDINGS)}
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH, cap: int = DEFAULT_CAP) -> 'PatternDatabase':
+        """
+        Open a pattern database, building it first if the file does not exist.
+
+        :param path: Path of the database file
+        :param cap: Cap of resource counts, used when the database is built
+        :return: The database
+        """
+        if not Path(path).exists():
+            cls._logger.info(f'{path} does not exist. Building a new pattern database...')
+            build_pattern_database(path, cap)
+        return cls(path)
+
+    def close(self):
+        """
+        Close the memory map.
+        """
+        self._entries.release()
+        self._map.close()
+
+    def lookup(self, villages: int, cities: int, rate: int, resources) -> int:
+        """
+        :param villages: Number of villages of the player
+        :param cities: Number of cities of the player
+        :param rate: Best trading rate of the player (among all resources)
+        :param resources: Resource counts of the player, in the order of RESOURCES
+        :return: Lower bound of the number of actions to the end of the game
+        """
+        if villages + 2 * cities >= GOAL_POINTS:
+            return 0
+        cap = self._abstraction.cap
+        vector = 0
+        for count in resources:
+            vector = vector * self._abstraction.radix + (count if count < cap else cap)
+        return self._entries[self._abstraction.index(self._buildings[(villages, cities)],
+                                                     RATES.index(max(min(rate, RATES[-1]), RATES[0])), vector)]
+
+    def __call__(self, state: dict) -> int:
+        """
+        Heuristic for a state representation (See AnytimeWeightedAStar's heuristic).
+
+        :param state: State representation
+        :return: Lower bound of the number of actions to the end of the game
+        """
+        player = state['player_id']
+        villages = cities = 0
+        for intersection in state['board']['intersections'].values():
+            if intersection['owner'] == player:
+                if intersection['type'] == 'CITY':
+                    cities += 1
+                elif intersection['type'] is not None:
+                    villages += 1
+        # Best trading rate from the connected harbors
+        harbors = state['board']['harbors']
+        types = [harbors[h]['type'] for h in state['player']['harbors']]
+        rate = 4 if not types else 3 if all(t is None for t in types) else 2
+        resources = state['player']['resources']
+        return self.lookup(villages, cities, rate, [resources[r] for r in RESOURCES])
+
+    def estimate(self, board: GameBoard) -> int:
+        """
+        Heuristic for the current state of a board, read in O(1) from the board's statistics.
+
+        :param board: Game board
+        :return: Lower bound of the number of actions to the end of the game
+        """
+        stats = board._stats
+        resources = board._game.players[board._player_number].resources
+        counts = {resource.name: count for resource, count in resources.items()}
+        return self.lookup(stats.settlements, stats.cities, min(stats.trading_rates.values()),
+                           [counts[r] for r in RESOURCES])
+
+
+# Main function
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Build the pattern database offline.')
+    parser.add_argument('--output', type=str, default=str(DEFAULT_PATH), help='Path of the database file.')
+    parser.add_argument('--cap', type=int, default=DEFAULT_CAP, help='Cap of resource counts.')
+    args = parser.parse_args()
+
+    # Show the progress on the console. (basicConfig does nothing here, as importing board has configured the
+    # root logger to write into the execution log.)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logging.getLogger('PatternDB').addHandler(console)
+    print(f'Pattern database is written to {build_pattern_database(args.output, args.cap)}')
+
+
+# Export the database and the builder
+__all__ = ['PatternDatabase', 'build_pattern_database', 'DEFAULT_PATH', 'DEFAULT_CAP']
@@ -0,0 +1,209 @@
+# Logging method for optimization progress
+import logging
+# Clock for the time limit
+from time import time
+# Type specification for Python code
+from typing import Iterator, List, Optional, Tuple
+
+# Import action specifications and the board
+from action import Action, PASS, ROAD, VILLAGE, UPGRADE, TRADE
+from board import GameBoard, RESOURCES
+
+#: All trades, for replacing trade chains
+_TRADES = [(given, request) for given in RESOURCES for request in RESOURCES if given != request]
+
+
+class PlanOptimizer:
+    """
+    Local search which shortens a plan (a list of actions ending the game), keeping its longest route.
+    The following edits are tried, and an edit is accepted only when the edited plan still ends in a goal state
+    with at least the same longest route:
+        - dropping an action (e.g., a redundant PASS or TRADE, or a build which does nothing),
+        - dropping two actions (e.g., a trade and the wait for its resources),
+        - replacing two trades by a single trade (trade chains),
+        - moving a build earlier and dropping a PASS or TRADE before it (merging waits, reordering builds).
+
+    Plans are replayed with `GameBoard.push`/`pop`, sharing the prefix before an edit. The replay of an edited plan
+    stops as soon as it reaches the same board as the original plan (same dice roll, resources and buildings),
+    as the rest of the plan gives the same result. So most edits are checked with a few actions.
+
+    Usage (as the final stage of an agent):
+        return PlanOptimizer(time_limit=10).optimize(board, plan)
+    """
+
+    #: [PRIVATE] Logger instance for the optimizer
+    _logger = logging.getLogger('PlanOptimizer')
+
+    def __init__(self, window: int = 6, time_limit: float = None, time_margin: float = 10.0):
+        """
+        :param window: Maximum distance between the actions changed by a single edit
+        :param time_limit: Seconds to spend. None for no limit (until no edit improves the plan).
+        :param time_margin: Seconds to keep in reserve before the board's deadline (See GameBoard.remaining_time)
+        """
+        self.window = window
+        self.time_limit = time_limit
+        self.time_margin = time_margin
+        #: Number of edited plans checked, and accepted
+        self.candidates = 0
+        self.accepted = 0
+
+    def optimize(self, board: GameBoard, plan: List[Action], state: dict = None) -> List[Action]:
+        """
+        Shorten a plan.
+
+        :param board: Game board to replay the plan
+        :param plan: Plan to shorten
+        :param state: State where the plan starts. (Default: the initial state)
+        :return: The shortened plan. (The given plan, if it does not end the game.)
+            The board is left at the starting state.
+        """
+        state = state if state is not None else board.get_initial_state()
+        plan = list(plan)
+        stop_at = time() + self.time_limit if self.time_limit is not None else float('inf')
+
+        original_length = len(plan)
+        baseline = self._replay(board, state, plan)
+        if baseline is None:
+            self._logger.info('The plan does not end the game. It is not optimized.')
+            board.set_to_state(state)
+            return plan
+        signatures, route = baseline
+        # The evaluator stops at the first game end, so the actions after it are never executed.
+        plan = plan[:len(signatures) - 1]
+
+        improved = True
+        while improved:
+            improved = False
+            board.set_to_state(state)
+            built = frozenset()
+            position = 0  # Number of actions of the plan pushed as the shared prefix
+
+            for start, replacement, resume in self._edits(plan):
+                if time() > stop_at or board.remaining_time() < self.time_margin:
+                    break
+                # Move the shared prefix to the start of the edit
+                while position < start:
+                    built = self._push(board, plan[position], built)
+                    position += 1
+
+                self.candidates += 1
+                if self._check(board, plan, signatures, route, built, replacement, resume):
+                    plan = plan[:start] + replacement + plan[resume:]
+                    self.accepted += 1
+                    improved = True
+                    break
+
+            for _ in range(position):
+                board.pop()
+            if improved:
+                # Replay the new plan, to compare the next edits with it
+                signatures, _ = self._replay(board, state, plan)
+
+        board.set_to_state(state)
+        self._logger.info(f'Plan is shortened from {original_length} to {len(plan)} actions '
+                          f'({self.accepted} of {self.candidates} edits accepted).')
+        return plan
+
+    def _edits(self, plan: List[Action]) -> Iterator[Tuple[int, List[Action], int]]:
+        """
+        [PRIVATE] Generate edits in the increasing order of their starting positions.
+
+        :param plan: Plan to edit
+        :return: Iterator of edits (start, replacement, resume), which replace plan[start:resume] with replacement.
+            Every edit makes the plan shorter.
+        """
+        for i in range(len(plan)):
+            end = min(len(plan), i + self.window + 1)
+            # Drop an action
+            yield i, [], i + 1
+            # Drop two actions
+            for j in range(i + 1, end):
+                yield i, plan[i + 1:j], j + 1
+            # Replace two trades by a single trade
+            if isinstance(plan[i], TRADE):
+                for j in range(i + 1, end):
+                    if isinstance(plan[j], TRADE):
+                        for given, request in _TRADES:
+                            yield i, [TRADE(given, request)] + plan[i + 1:j], j + 1
+            # Move a build earlier, dropping a PASS or TRADE between them
+            for k in range(i + 1, end):
+                if not isinstance(plan[k], (ROAD, VILLAGE, UPGRADE)):
+                    continue
+                for d in range(i, k):
+                    if isinstance(plan[d], (PASS, TRADE)):
+                        yield i, [plan[k]] + plan[i:d] + plan[d + 1:k], k + 1
+
+    @staticmethod
+    def _push(board: GameBoard, action: Action, built: frozenset) -> frozenset:
+        """
+        [PRIVATE] Push an action, and update the set of buildings made by the plan.
+
+        :return: Buildings made so far (repr of the build actions which changed the board)
+        """
+        stats = board._stats
+        pieces = (stats.roads, stats.settlements, stats.cities)
+        board.push(action)
+        stats = board._stats
+        if (stats.roads, stats.settlements, stats.cities) != pieces:
+            built = built | {repr(action)}
+        return built
+
+    @staticmethod
+    def _signature(board: GameBoard, built: frozenset) -> tuple:
+        """
+        [PRIVATE] :return: Signature which identifies the board reached by a plan. (Other players never build.)
+        """
+        return board._dice_roll, tuple(board._game.players[board._player_number].resources.values()), built
+
+    def _replay(self, board: GameBoard, state: dict, plan: List[Action]) -> Optional[Tuple[List[tuple], int]]:
+        """
+        [PRIVATE] Replay a plan, stopping at the first game end (as `GameBoard.simulate_action` does).
+
+        :return: Tuple of (signatures of the boards before each action and after the action ending the game,
+            longest route at the game end), or None if the plan fails or does not end the game.
+        """
+        board.set_to_state(state)
+        built = frozenset()
+        signatures = [self._signature(board, built)]
+        try:
+            for action in plan:
+                built = self._push(board, action, built)
+                signatures.append(self._signature(board, built))
+                if board.is_game_end():
+                    return signatures, board.get_longest_route()
+        except Exception:
+            return None
+        return None
+
+    def _check(self, board: GameBoard, plan: List[Action], signatures: List[tuple], route: int,
+               built: frozenset, replacement: List[Action], resume: int) -> bool:
+        """
+        [PRIVATE] Check an edited plan, from the shared prefix pushed on the board. The board is restored afterward.
+
+        :return: True if the edited plan ends the game at its last action, with at least the given longest route.
+            (The evaluator stops at the first game end, so an edit ending the game earlier is rejected.)
+        """
+        edited = replacement + plan[resume:]
+        pushed = 0
+        try:
+            for offset, action in enumerate(edited):
+                if offset >= len(replacement) and \
+                        self._signature(board, built) == signatures[resume + offset - len(replacement)]:
+                    # Same board as the original plan, and the game has not ended so far (checked below):
+                    # the rest of the plan gives the same result.
+                    return True
+                built = self._push(board, action, built)
+                pushed += 1
+                if board.is_game_end():
+                    return offset == len(edited) - 1 and board.get_longest_route() >= route
+            return False
+        except Exception:
+            # An action is not applicable in the edited plan.
+            return False
+        finally:
+            for _ in range(pushed):
+                board.pop()
+
+
+# Export the optimizer only
+__all__ = ['PlanOptimizer']
@@ -0,0 +1,198 @@
+# Parser of Python sources (for finding the local modules imported by an agent)
+import ast
+# Package for reading/writing cached records
+import json
+# Logging method for cache handling
+import logging
+# Library for OS environment (atomic renaming of files)
+import os
+# Hash function for content addresses
+from hashlib import sha1
+# Package for file handling
+from pathlib import Path
+# Type specification for Python code
+from typing import Dict, List, Optional
+
+# Import record conversion functions
+from result_log import encode_record, decode_record
+
+#: Directory of this repository (board.py, action.py, ...)
+_REPOSITORY = Path(__file__).resolve().parent
+#: Files of the game board, which every result depends on
+BOARD_FILES = ['board.py', 'action.py', 'util.py']
+#: Evaluation script, which runs the agents and measures their plans (e.g., with PlanOptimizer)
+EVALUATION_FILE = 'evaluate.py'
+
+
+def file_digest(path) -> str:
+    """
+    :param path: Path of a file
+    :return: SHA-1 digest of the file's content
+    """
+    return sha1(Path(path).read_bytes()).hexdigest()
+
+
+def _local_imports(path: Path) -> List[Path]:
+    """
+    [PRIVATE] Find the modules of this repository imported by a Python source.
+
+    :param path: Path of the source
+    :return: Paths of the imported modules in this repository (agents/*.py or top-level *.py)
+    """
+    try:
+        tree = ast.parse(path.read_bytes(), filename=str(path))
+    except SyntaxError:
+        # The agent will fail to load, and its file hash is enough.
+        return []
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level > 0:
+                # Relative import, e.g., 'from .default import Agent' in agents/
+                base = '.'.join(path.relative_to(_REPOSITORY).parent.parts)
+                module = f'{base}.{node.module}' if node.module else base
+                names += [module] + [f'{module}.{alias.name}' for alias in node.names]
+            elif node.module:
+                names += [node.module] + [f'{node.module}.{alias.name}' for alias in node.names]
+
+    paths = []
+    for name in names:
+        candidate = _REPOSITORY.joinpath(*name.split('.')).with_suffix('.py')
+        if candidate.is_file():
+            paths.append(candidate)
+    return paths
+
+
+def source_digest(path) -> str:
+    """
+    Compute the digest of a Python source, together with the modules of this repository it imports (transitively).
+    (e.g., an agent using anytime.py changes its digest when anytime.py changes.)
+
+    :param path: Path of the source (e.g., agents/default.py)
+    :return: SHA-1 digest
+    """
+    sources = {}
+    stack = [Path(path).resolve()]
+    while stack:
+        current = stack.pop()
+        if current in sources:
+            continue
+        sources[current] = file_digest(current)
+        stack += _local_imports(current)
+
+    digest = sha1()
+    for source in sorted(sources):
+        digest.update(f'{source.relative_to(_REPOSITORY)}:{sources[source]}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def board_digest() -> str:
+    """
+    :return: SHA-1 digest of the game board files (board.py, action.py and util.py)
+    """
+    digest = sha1()
+    for name in BOARD_FILES:
+        digest.update(f'{name}:{file_digest(_REPOSITORY / name)}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def evaluation_digest() -> str:
+    """
+    :return: SHA-1 digest of the evaluation script, together with the local modules it imports
+        (e.g., plan_optimizer.py, which shortens the plans to be measured)
+    """
+    return source_digest(_REPOSITORY / EVALUATION_FILE)
+
+
+def job_key(agent_digest: str, board: str, evaluation: str, problem: str, settings: dict = None) -> str:
+    """
+    Make the content address of a job.
+
+    :param agent_digest: Digest of the agent's source (See source_digest)
+    :param board: Digest of the game board files (See board_digest)
+    :param evaluation: Digest of the evaluation code (See evaluation_digest)
+    :param problem: Fingerprint of the problem (See GameBoard._problem_fingerprint)
+    :param settings: Other settings which change the result (e.g., limits), as a JSON-compatible dictionary
+    :return: Key of the job
+    """
+    text = json.dumps(dict(agent=agent_digest, board=board, evaluation=evaluation, problem=problem,
+                           settings=settings or {}), sort_keys=True)
+    return sha1(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of evaluation results.
+    A result is stored under the key of its inputs (See job_key), so that it can be reused as long as neither
+    the agent, the board code, the evaluation code nor the problem has changed.
+    Only the results of completed searches should be stored. (Not crashes or runs killed by limits, which may be
+    caused by the environment.)
+
+    The directory has a JSON file for each key: <key[:2]>/<key>.json
+    """
+
+    #: [PRIVATE] Logger instance for ResultCache's function calls
+    _logger = logging.getLogger('ResultCache')
+
+    def __init__(self, directory):
+        """
+        Open a cache.
+
+        :param directory: Path to the cache directory
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        #: Number of hits and misses
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        """
+        [PRIVATE] :return: Path of the file for the key
+        """
+        return self.directory / key[:2] / f'{key}.json'
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Read a cached result.
+
+        :param key: Key of the job
+        :return: Cached record, or None if there's no (readable) record.
+        """
+        try:
+            record = decode_record(json.loads(self._path(key).read_text()))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record
+
+    def put(self, key: str, record: dict):
+        """
+        Store a result.
+
+        :param key: Key of the job
+        :param record: Record of the finished job
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, and then publish it atomically.
+        temp = path.with_name(f'.{key}.{os.getpid()}.tmp')
+        temp.write_text(json.dumps(encode_record(record)))
+        os.replace(temp, path)
+
+
+def agent_digests(agents: List[str]) -> Dict[str, str]:
+    """
+    :param agents: Names of agents
+    :return: Dictionary of agent name -> digest of its source
+    """
+    return {agent: source_digest(_REPOSITORY / 'agents' / f'{agent}.py') for agent in agents}
+
+
+# Export the cache class and digest functions
+__all__ = ['ResultCache', 'job_key', 'source_digest', 'board_digest', 'evaluation_digest', 'agent_digests',
+           'file_digest']
@@ -0,0 +1,99 @@
+# Package for reading/writing JSON lines
+import json
+# Library for OS environment (for flushing files to disk)
+import os
+# Logging method for result handling
+import logging
+# Package for file handling
+from pathlib import Path
+# Type specification for Python code
+from typing import Dict, Tuple, Iterator
+
+
+class ResultLog:
+    """
+    Append-only log of finished evaluation jobs.
+    Each finished (trial, agent) job is written as a single JSON line, so that the evaluation can be resumed
+    after a crash without re-running the finished jobs.
+    """
+
+    #: [PRIVATE] Logger instance for ResultLog's function calls
+    _logger = logging.getLogger('ResultLog')
+
+    def __init__(self, path, resume: bool = False):
+        """
+        Open a result log.
+
+        :param path: Path of the JSON lines file
+        :param resume: True if the existing records should be kept. Otherwise, the file will be truncated.
+        """
+        self.path = Path(path)
+        if not resume:
+            # Start from an empty log
+            self.path.write_text('')
+
+    def __iter__(self) -> Iterator[dict]:
+        """
+        Read all records in the log, in the order of writing.
+        A broken line (e.g., the last line written when the process crashed) will be ignored.
+        """
+        if not self.path.exists():
+            return
+
+        with self.path.open('rt') as fp:
+            for line_no, line in enumerate(fp):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield decode_record(json.loads(line))
+                except ValueError:
+                    self._logger.warning(f'Ignoring a broken record at line {line_no + 1} of {self.path}')
+
+    def load(self) -> Dict[Tuple[int, str], dict]:
+        """
+        Read the finished jobs from the log.
+
+        :return: Dictionary of (trial, agent) to the last record of that job
+        """
+        return {(record['trial'], record['agent']): record for record in self}
+
+    def append(self, record: dict):
+        """
+        Append a record of a finished job, and flush it to the disk immediately.
+
+        :param record: Dictionary of the result. It should contain 'trial' and 'agent' keys.
+        """
+        with self.path.open('at') as fp:
+            fp.write(json.dumps(encode_record(record)) + '\n')
+            fp.flush()
+            os.fsync(fp.fileno())
+
+
+def encode_record(record: dict) -> dict:
+    """
+    Make a record JSON-compatible. (Infinite number of actions is written as null.)
+
+    :param record: Record to write
+    :return: JSON-compatible record
+    """
+    record = dict(record)
+    if record.get('actions') == float('inf'):
+        record['actions'] = None
+    return record
+
+
+def decode_record(record: dict) -> dict:
+    """
+    Restore a record read from JSON.
+
+    :param record: Record read
+    :return: Record with the same value types as the evaluation results
+    """
+    if record.get('actions') is None:
+        record['actions'] = float('inf')
+    return record
+
+
+# Export the log class and record conversion functions
+__all__ = ['ResultLog', 'encode_record', 'decode_record']
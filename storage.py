@@ -0,0 +1,429 @@
+# Hash function for making fixed-size keys
+from hashlib import blake2b
+# Priority queue of bucket numbers
+import heapq
+# Memory-mapped file
+import mmap
+# Temporary files for storing spilled entries
+from tempfile import TemporaryFile
+# Type specification for Python code
+from typing import Dict, List, Optional, Tuple, Union
+
+
+def state_key(data: Union[bytes, str], size: int = 16) -> bytes:
+    """
+    Make a fixed-size key of a state, for storing it in `DiskHashSet`.
+
+    :param data: Identifier of a state. (e.g., `state['state_id']`, or a record from `GameBoard.encode_state`)
+    :param size: Size of the key in bytes
+    :return: Key of the given size
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return blake2b(data, digest_size=size).digest()
+
+
+class _MappedRecords:
+    """
+    [PRIVATE] Array of fixed-size records in a memory-mapped temporary file.
+    Pages of the file can be released from the process memory (RSS) at any time;
+    the data remains in the file, and it will be read again on access.
+    """
+
+    def __init__(self, record_size: int, capacity: int = 4096, directory: str = None):
+        """
+        :param record_size: Size of a record in bytes
+        :param capacity: Initial number of records
+        :param directory: Directory to make the temporary file. If None, the system default will be used.
+        """
+        self.record_size = record_size
+        self.capacity = 0
+        self._file = TemporaryFile(dir=directory)
+        self._map = None
+        self.resize(max(capacity, 1))
+
+    def resize(self, capacity: int):
+        """
+        Change the number of records that the file can hold.
+
+        :param capacity: New number of records
+        """
+        if self._map is not None:
+            self._map.close()
+        self._file.truncate(capacity * self.record_size)
+        self._map = mmap.mmap(self._file.fileno(), capacity * self.record_size)
+        self.capacity = capacity
+
+    def ensure(self, capacity: int):
+        """
+        Grow the file (by doubling) until it can hold the given number of records.
+
+        :param capacity: Required number of records
+        """
+        if capacity > self.capacity:
+            new_capacity = self.capacity
+            while new_capacity < capacity:
+                new_capacity *= 2
+            self.resize(new_capacity)
+
+    def read(self, index: int, count: int = 1) -> bytes:
+        """
+        :return: Bytes of `count` consecutive records, starting from the index
+        """
+        begin = index * self.record_size
+        return self._map[begin:begin + count * self.record_size]
+
+    def write(self, index: int, data: bytes):
+        """
+        Write consecutive records, starting from the index.
+        """
+        begin = index * self.record_size
+        self._map[begin:begin + len(data)] = data
+
+    def release(self):
+        """
+        Drop the mapped pages from the process memory. (Only where madvise is available)
+        """
+        if hasattr(self._map, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+            self._map.madvise(mmap.MADV_DONTNEED)
+
+    def close(self):
+        """
+        Close and delete the file.
+        """
+        self._map.close()
+        self._file.close()
+
+
+class SpillingStack:
+    """
+    LIFO frontier (for depth-first searches) with fixed-size records.
+    At most `hot_limit` records are kept in memory. When it overflows, the bottom half of the records is spilled
+    to a memory-mapped file as a segment, and segments are loaded back when the in-memory part becomes empty.
+    """
+
+    def __init__(self, record_size: int, hot_limit: int = 100000, directory: str = None):
+        """
+        :param record_size: Size of a record in bytes
+        :param hot_limit: Maximum number of records in memory
+        :param directory: Directory to make the temporary file
+        """
+        self.record_size = record_size
+        self.hot_limit = max(hot_limit, 2)
+        self._hot: List[bytes] = []
+        self._cold = _MappedRecords(record_size, directory=directory)
+        self._cold_count = 0
+
+    def __len__(self):
+        return len(self._hot) + self._cold_count
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def push(self, record: bytes):
+        """
+        Push a record.
+
+        :param record: Bytes of `record_size`
+        """
+        assert len(record) == self.record_size, 'The size of record is different!'
+        self._hot.append(record)
+
+        if len(self._hot) > self.hot_limit:
+            # Spill the bottom half
+            count = len(self._hot) // 2
+            self._cold.ensure(self._cold_count + count)
+            self._cold.write(self._cold_count, b''.join(self._hot[:count]))
+            self._cold_count += count
+            del self._hot[:count]
+            self._cold.release()
+
+    def pop(self) -> bytes:
+        """
+        Pop the record pushed last.
+
+        :return: Bytes of the record
+        """
+        if not self._hot:
+            assert self._cold_count > 0, 'The stack is empty!'
+            # Load the top segment back
+            count = min(self.hot_limit // 2, self._cold_count)
+            self._cold_count -= count
+            data = self._cold.read(self._cold_count, count)
+            size = self.record_size
+            self._hot = [data[i:i + size] for i in range(0, len(data), size)]
+            self._cold.release()
+
+        return self._hot.pop()
+
+    def close(self):
+        """
+        Delete the spilled records.
+        """
+        self._cold.close()
+
+
+class SpillingPriorityQueue:
+    """
+    Best-first frontier with fixed-size records and integer priorities (smaller is popped first).
+    Records are stored in buckets of the same priority. At most `hot_limit` records are kept in memory.
+    When it overflows, records of the worst (largest) priorities are spilled to a memory-mapped file in blocks,
+    and they are loaded back when their priority becomes the smallest.
+    Records of the same priority are popped in LIFO order.
+    """
+
+    def __init__(self, record_size: int, hot_limit: int = 100000, block_records: int = 1024,
+                 directory: str = None):
+        """
+        :param record_size: Size of a record in bytes
+        :param hot_limit: Maximum number of records in memory
+        :param block_records: Number of records in a block of the file
+        :param directory: Directory to make the temporary file
+        """
+        self.record_size = record_size
+        self.hot_limit = max(hot_limit, 2)
+        self.block_records = block_records
+        #: Records in memory, for each priority
+        self._hot: Dict[int, List[bytes]] = {}
+        self._hot_count = 0
+        #: Spilled blocks for each priority: list of (block index, number of records in the block)
+        self._cold: Dict[int, List[Tuple[int, int]]] = {}
+        self._cold_count = 0
+        self._blocks = _MappedRecords(record_size * block_records, capacity=16, directory=directory)
+        self._free_blocks: List[int] = []
+        self._used_blocks = 0
+        #: Heap of priorities having any record (may contain stale priorities)
+        self._priorities: List[int] = []
+
+    def __len__(self):
+        return self._hot_count + self._cold_count
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def push(self, priority: int, record: bytes):
+        """
+        Push a record.
+
+        :param priority: Priority of the record. Smaller one will be popped first.
+        :param record: Bytes of `record_size`
+        """
+        assert len(record) == self.record_size, 'The size of record is different!'
+        if priority not in self._hot and priority not in self._cold:
+            heapq.heappush(self._priorities, priority)
+
+        self._hot.setdefault(priority, []).append(record)
+        self._hot_count += 1
+
+        if self._hot_count > self.hot_limit:
+            self._spill(self._hot_count - self.hot_limit // 2)
+
+    def peek_priority(self) -> Optional[int]:
+        """
+        :return: The smallest priority in the queue, or None if the queue is empty.
+        """
+        while self._priorities:
+            priority = self._priorities[0]
+            if priority in self._hot or priority in self._cold:
+                return priority
+            heapq.heappop(self._priorities)
+        return None
+
+    def pop(self) -> Tuple[int, bytes]:
+        """
+        Pop a record of the smallest priority.
+
+        :return: Tuple of (priority, record)
+        """
+        priority = self.peek_priority()
+        assert priority is not None, 'The queue is empty!'
+
+        if priority not in self._hot:
+            self._load(priority)
+
+        bucket = self._hot[priority]
+        record = bucket.pop()
+        self._hot_count -= 1
+        if not bucket:
+            del self._hot[priority]
+        return priority, record
+
+    def _spill(self, count: int):
+        """
+        [PRIVATE] Move records of the worst priorities to the file.
+
+        :param count: Number of records to spill
+        """
+        for priority in sorted(self._hot, reverse=True):
+            if count <= 0:
+                break
+
+            bucket = self._hot[priority]
+            # Spill the bottom (oldest) records of the bucket.
+            moving = min(count, len(bucket))
+            blocks = self._cold.setdefault(priority, [])
+            for begin in range(0, moving, self.block_records):
+                chunk = bucket[begin:min(begin + self.block_records, moving)]
+                block = self._allocate_block()
+                self._blocks.write(block, b''.join(chunk))
+                blocks.append((block, len(chunk)))
+
+            del bucket[:moving]
+            if not bucket:
+                del self._hot[priority]
+            self._hot_count -= moving
+            self._cold_count += moving
+            count -= moving
+
+        self._blocks.release()
+
+    def _load(self, priority: int):
+        """
+        [PRIVATE] Move spilled records of the given priority back to memory.
+        (At most about a half of hot_limit, from the last spilled blocks)
+
+        :param priority: Priority to load
+        """
+        size = self.record_size
+        blocks = self._cold[priority]
+        bucket = []
+        while blocks and len(bucket) < self.hot_limit // 2:
+            block, count = blocks.pop()
+            data = self._blocks.read(block)[:count * size]
+            # Blocks are loaded from the last one, so put the older records in front.
+            bucket = [data[i:i + size] for i in range(0, len(data), size)] + bucket
+            self._free_blocks.append(block)
+            self._cold_count -= count
+
+        if not blocks:
+            del self._cold[priority]
+        self._hot[priority] = bucket
+        self._hot_count += len(bucket)
+        self._blocks.release()
+
+        if self._hot_count > self.hot_limit:
+            # Make a room by spilling other priorities (never the loaded one, as it is the smallest)
+            self._spill(self._hot_count - self.hot_limit // 2)
+
+    def _allocate_block(self) -> int:
+        """
+        [PRIVATE] :return: Index of a free block in the file
+        """
+        if self._free_blocks:
+            return self._free_blocks.pop()
+
+        self._blocks.ensure(self._used_blocks + 1)
+        self._used_blocks += 1
+        return self._used_blocks - 1
+
+    def close(self):
+        """
+        Delete the spilled records.
+        """
+        self._blocks.close()
+
+
+class DiskHashSet:
+    """
+    Closed set of fixed-size keys, stored as an open-addressing hash table (linear probing)
+    in a memory-mapped file. The table doubles when it is 70% full.
+    Mapped pages are released from the process memory periodically, so the set contributes little to RSS.
+    """
+
+    #: Ratio of used slots to grow the table
+    MAX_LOAD = 0.7
+
+    def __init__(self, key_size: int = 16, capacity: int = 1 << 16, release_interval: int = 1 << 14,
+                 directory: str = None):
+        """
+        :param key_size: Size of a key in bytes (Use `state_key` to make keys)
+        :param capacity: Initial number of slots (rounded up to a power of two)
+        :param release_interval: Number of insertions between releasing mapped pages
+        :param directory: Directory to make the temporary file
+        """
+        self.key_size = key_size
+        self.release_interval = release_interval
+        self.directory = directory
+        self._count = 0
+        self._inserted = 0
+        # Each slot is a byte of occupancy flag followed by a key.
+        self._slots = 1
+        while self._slots < capacity:
+            self._slots *= 2
+        self._table = _MappedRecords(key_size + 1, capacity=self._slots, directory=directory)
+
+    def __len__(self):
+        return self._count
+
+    def _find(self, key: bytes) -> Tuple[int, bool]:
+        """
+        [PRIVATE] Find the slot of the key.
+
+        :return: Tuple of (slot index, True if the key is in the slot)
+        """
+        mask = self._slots - 1
+        index = int.from_bytes(key[:8], 'little') & mask
+        table = self._table
+        while True:
+            slot = table.read(index)
+            if slot[0] == 0:
+                return index, False
+            if slot[1:] == key:
+                return index, True
+            index = (index + 1) & mask
+
+    def __contains__(self, key: bytes) -> bool:
+        return self._find(key)[1]
+
+    def add(self, key: bytes) -> bool:
+        """
+        Add a key.
+
+        :param key: Bytes of `key_size`
+        :return: True if the key is newly added, False if it was already in the set.
+        """
+        assert len(key) == self.key_size, 'The size of key is different!'
+        index, found = self._find(key)
+        if found:
+            return False
+
+        self._table.write(index, b'\x01' + key)
+        self._count += 1
+        self._inserted += 1
+
+        if self._count > self._slots * self.MAX_LOAD:
+            self._grow()
+        elif self._inserted % self.release_interval == 0:
+            self._table.release()
+        return True
+
+    def _grow(self):
+        """
+        [PRIVATE] Double the number of slots, and re-insert all keys.
+        """
+        old_table, old_slots = self._table, self._slots
+        self._slots *= 2
+        self._table = _MappedRecords(self.key_size + 1, capacity=self._slots, directory=self.directory)
+
+        mask = self._slots - 1
+        for i in range(old_slots):
+            slot = old_table.read(i)
+            if slot[0] == 0:
+                continue
+            index = int.from_bytes(slot[1:9], 'little') & mask
+            while self._table.read(index)[0] != 0:
+                index = (index + 1) & mask
+            self._table.write(index, slot)
+
+        old_table.close()
+        self._table.release()
+
+    def close(self):
+        """
+        Delete the table.
+        """
+        self._table.close()
+
+
+# Export storage classes and key function
+__all__ = ['SpillingStack', 'SpillingPriorityQueue', 'DiskHashSet', 'state_key']
@@ -0,0 +1,129 @@
+# Random number generator (for seeding boards)
+import random
+# Library for importing the modules of this repository
+import sys
+# Package for file handling
+from pathlib import Path
+
+# Test framework
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Import the board
+import board as board_module
+from board import GameBoard
+
+
+def _reordered(board: GameBoard) -> GameBoard:
+    """
+    Rebuild pycatan's tables of intersections and paths in the reverse order, as another process may build them.
+    (pycatan builds them from a set of Hex objects, which are hashed by their addresses.)
+    """
+    game_board = board._game.board
+    game_board.intersections = dict(reversed(list(game_board.intersections.items())))
+    game_board.paths = dict(reversed(list(game_board.paths.items())))
+    return board
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_applicable_positions_do_not_depend_on_board_order(seed):
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    other = GameBoard()
+    other._initialize()
+    other._load_problem(board._export_problem())
+    _reordered(other)
+    board.set_to_state(None)
+    other.set_to_state(None)
+
+    rng = random.Random(seed)
+    for _ in range(12):
+        assert board.get_applicable_roads() == other.get_applicable_roads()
+        assert board.get_applicable_villages() == other.get_applicable_villages()
+        assert board.get_applicable_cities() == other.get_applicable_cities()
+        if board.is_game_end():
+            break
+        # Prefer builds, so that more positions become applicable
+        actions = sorted(board.get_productive_actions(), key=repr)
+        builds = [a for a in actions if type(a).__name__ in ('ROAD', 'VILLAGE', 'UPGRADE')]
+        action = rng.choice(builds or actions)
+        board.push(action)
+        other.push(action)
+
+
+def _read_current_state(board: GameBoard) -> dict:
+    """
+    :return: State representation read from pycatan's game, as simulate_action returns it
+    """
+    state = board_module._read_state(board._game, board._player_number)
+    state['dice_roll'] = board._dice_roll
+    return state
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_encoded_states_decode_to_read_state(seed):
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    board.set_to_state(None)
+
+    rng = random.Random(seed)
+    states = [_read_current_state(board)]
+    for _ in range(30):
+        if board.is_game_end():
+            break
+        board.push(rng.choice(sorted(board.get_productive_actions(), key=repr)))
+        states.append(_read_current_state(board))
+
+    for state in states:
+        record = board.encode_state(state)
+        assert len(record) == board.get_state_record_size()
+        assert board.decode_state(record) == state
+
+        # Restoring the decoded state reproduces the same game.
+        board.set_to_state(board.decode_state(record))
+        assert _read_current_state(board)['state_id'] == state['state_id']
+        board.set_to_state(board.decode_state(record, lazy=True))
+        assert _read_current_state(board)['state_id'] == state['state_id']
+
+    records = board.encode_states(states)
+    assert records == b''.join(board.encode_state(state) for state in states)
+    assert board.decode_states(records) == states
+    assert board.decode_states(bytearray(records)) == states
+
+
+def _statistics(board: GameBoard) -> tuple:
+    """
+    :return: Copy of the player's statistics, including the legal placements
+    """
+    stats = board._stats
+    return tuple(getattr(stats, field) for field in stats._SCALARS) + \
+        (frozenset(stats.legal_roads), frozenset(stats.legal_villages))
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_pop_restores_statistics_and_placements(seed):
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    board.set_to_state(None)
+
+    rng = random.Random(seed)
+    history = []
+    for _ in range(25):
+        if board.is_game_end():
+            break
+        history.append((board.get_current_state()['state_id'], _statistics(board)))
+        board.push(rng.choice(sorted(board.get_productive_actions(), key=repr)))
+
+    while history:
+        board.pop()
+        state_id, statistics = history.pop()
+        assert board.get_current_state()['state_id'] == state_id
+        assert _statistics(board) == statistics
+        # The statistics are the same as those counted from the board.
+        fresh = board_module._PlayerStatistics(board._game, board._player_number, board._neighbors)
+        assert _statistics(board) == tuple(getattr(fresh, field) for field in fresh._SCALARS) + \
+            (frozenset(fresh.legal_roads), frozenset(fresh.legal_villages))
@@ -0,0 +1,100 @@
+# Library for importing the modules of this repository
+import sys
+# Multi-processing for running several workers
+from multiprocessing import get_context
+# Package for file handling
+from pathlib import Path
+# Time functions
+from time import sleep
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Import the queue
+from job_queue import JobQueue
+
+
+def _claim_all(directory: str, worker_id: str, claimed):
+    """
+    Worker process: claim and complete jobs until none is pending.
+    """
+    queue = JobQueue(directory)
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            return
+        claimed.put((job['job_id'], worker_id))
+        queue.complete(job, dict(job_id=job['job_id'], worker=worker_id, value=job['value'] * 2))
+
+
+def test_concurrent_workers_claim_each_job_once(tmp_path):
+    queue = JobQueue(tmp_path)
+    job_ids = [f'{i:04d}-agent' for i in range(60)]
+    for i, job_id in enumerate(job_ids):
+        queue.submit(job_id, dict(value=i))
+
+    context = get_context('spawn')
+    claimed = context.Queue()
+    workers = [context.Process(target=_claim_all, args=(str(tmp_path), f'worker-{w}', claimed)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    claims = [claimed.get(timeout=10) for _ in job_ids]
+    assert claimed.empty()
+    assert sorted(job_id for job_id, _ in claims) == job_ids
+
+    results = queue.collect(job_ids)
+    assert sorted(results) == job_ids
+    assert all(results[job_id]['value'] == i * 2 for i, job_id in enumerate(job_ids))
+    assert not list(queue.pending.iterdir())
+    assert not list(queue.claimed.iterdir())
+
+
+def test_reclaim_stale_moves_job_back_to_pending(tmp_path):
+    queue = JobQueue(tmp_path)
+    queue.submit('0000-agent', dict(value=1))
+    job = queue.claim('dead-worker')
+    assert job is not None and queue.claim('other-worker') is None
+
+    # The first observation only records the heartbeat.
+    assert queue.reclaim_stale(timeout=0.05) == []
+    sleep(0.1)
+    assert queue.reclaim_stale(timeout=0.05) == ['0000-agent']
+    assert (queue.pending / '0000-agent.job').exists()
+    assert not list(queue.claimed.iterdir())
+
+    job = queue.claim('live-worker')
+    assert job['job_id'] == '0000-agent' and job['value'] == 1
+
+
+def test_reclaim_stale_keeps_job_with_live_heartbeat(tmp_path):
+    queue = JobQueue(tmp_path)
+    queue.submit('0000-agent', dict(value=1))
+    job = queue.claim('worker')
+
+    assert queue.reclaim_stale(timeout=0.2) == []
+    for _ in range(3):
+        sleep(0.1)
+        queue.heartbeat(job)
+        assert queue.reclaim_stale(timeout=0.2) == []
+    assert (queue.claimed / '0000-agent.job').exists()
+
+
+def test_collect_and_stop(tmp_path):
+    queue = JobQueue(tmp_path)
+    queue.submit('0000-agent', dict(value=1))
+    queue.submit('0001-agent', dict(value=2))
+    job = queue.claim('worker')
+    queue.complete(job, dict(route=3))
+
+    assert queue.collect(['0000-agent', '0001-agent']) == {job['job_id']: dict(route=3)}
+
+    worker_view = JobQueue(tmp_path)
+    assert not worker_view.is_stopped()
+    queue.stop()
+    assert worker_view.is_stopped()
+    queue.clear()
+    assert not worker_view.is_stopped()
+    assert queue.collect(['0000-agent', '0001-agent']) == {}
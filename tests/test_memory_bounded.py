@@ -0,0 +1,51 @@
+# Random number generator (for seeding boards)
+import random
+# Library for importing the modules of this repository
+import sys
+# Package for file handling
+from pathlib import Path
+# Time functions
+from time import time
+
+# Test framework
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Import the board and the search
+from board import GameBoard
+from memory_bounded import MemoryBoundedAStar
+
+
+def _board(seed: int) -> GameBoard:
+    """
+    :return: Board of the seeded problem, with enough time for the searches
+    """
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    board._set_budgets(deadline=time() + 120)
+    return board
+
+
+def _ends_game(board: GameBoard, plan: list) -> bool:
+    """
+    :return: True if the plan ends the game from the initial state
+    """
+    board.simulate_action(board.get_initial_state(), *plan)
+    return board.is_game_end()
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_bounded_search_finds_plan_of_same_length(seed):
+    board = _board(seed)
+    unbounded = MemoryBoundedAStar(time_margin=0).search(board)
+    assert unbounded and _ends_game(board, unbounded)
+
+    # The smallest budget which can hold the path to the goal, and a slightly larger one
+    for max_nodes in (len(unbounded) + 1, 2 * len(unbounded)):
+        search = MemoryBoundedAStar(max_nodes=max_nodes, time_margin=0)
+        plan = search.search(_board(seed))
+        assert len(plan) == len(unbounded)
+        assert _ends_game(board, plan)
+        assert search.peak_nodes <= max_nodes + 1
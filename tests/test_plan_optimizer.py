@@ -0,0 +1,61 @@
+# Random number generator (for seeding boards and plans)
+import random
+# Library for importing the modules of this repository
+import sys
+# Package for file handling
+from pathlib import Path
+
+# Test framework
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Import the board and the optimizer
+from board import GameBoard
+from plan_optimizer import PlanOptimizer
+
+
+def _random_plan(board: GameBoard, rng: random.Random, limit: int = 40) -> list:
+    """
+    Make a random plan ending the game, with roads preferred so that the longest route matters.
+
+    :return: List of actions, or None if the game does not end within the limit
+    """
+    board.set_to_state(None)
+    plan = []
+    while not board.is_game_end() and len(plan) < limit:
+        actions = board.get_productive_actions()
+        builds = [a for a in actions if type(a).__name__ in ('ROAD', 'VILLAGE', 'UPGRADE')]
+        action = rng.choice(builds if builds and rng.random() < 0.8 else actions)
+        board.push(action)
+        plan.append(action)
+    return plan if board.is_game_end() else None
+
+
+def _evaluate(board: GameBoard, plan: list) -> tuple:
+    """
+    Evaluate a plan as the evaluator does. (simulate_action stops at the first game end.)
+
+    :return: Tuple of (whether the game ends, longest route)
+    """
+    initial = board.get_initial_state()
+    board.simulate_action(initial, *plan)
+    return board.is_game_end(), board.get_longest_route()
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_optimized_plan_keeps_route(seed):
+    random.seed(seed)
+    board = GameBoard()
+    board._initialize()
+    plan = _random_plan(board, random.Random(seed))
+    if plan is None:
+        pytest.skip('No random plan ends the game.')
+
+    ended, route = _evaluate(board, plan)
+    optimized = PlanOptimizer(time_limit=20).optimize(board, plan)
+    optimized_ended, optimized_route = _evaluate(board, optimized)
+
+    assert ended and optimized_ended
+    assert optimized_route >= route
+    assert len(optimized) <= len(plan)
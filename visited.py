@@ -0,0 +1,275 @@
+# Abstract Class annotations
+import abc
+# Hash function for making integer keys
+from hashlib import blake2b
+# Logging method for capacity warnings
+import logging
+# Math functions for Bloom filter parameters
+import math
+# Library for measuring object sizes
+import sys
+# Compact array of fixed-size integers
+from array import array
+# Type specification for Python code
+from typing import Union
+
+
+def state_hash(key: Union[int, str, bytes]) -> int:
+    """
+    Make a 64-bit integer key of a state.
+
+    :param key: Identifier of a state. (e.g., `state['state_id']`, or a record from `GameBoard.encode_state`)
+        An integer is regarded as an already hashed key.
+    :return: 64-bit unsigned integer
+    """
+    if isinstance(key, int):
+        return key & 0xFFFFFFFFFFFFFFFF
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), 'little')
+
+
+class VisitedSet(abc.ABC):
+    """
+    Interface of visited-state sets. Keys can be state identifiers or integers (see `state_hash`).
+    Backends other than `ExactVisitedSet` may report a state as visited although it is not (a false positive).
+    """
+
+    #: [PRIVATE] Logger instance for VisitedSet's function calls
+    _logger = logging.getLogger('VisitedSet')
+
+    @abc.abstractmethod
+    def add(self, key) -> bool:
+        """
+        Mark a state as visited.
+
+        :param key: Identifier of a state
+        :return: True if the state is newly added, False if it was (regarded as) visited.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def __contains__(self, key) -> bool:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def __len__(self):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def nbytes(self) -> int:
+        """
+        :return: Memory footprint of the set in bytes
+        """
+        raise NotImplementedError()
+
+
+class ExactVisitedSet(VisitedSet):
+    """
+    Python set of 64-bit integer keys. No false positives (except 64-bit hash collisions),
+    but it takes about 100 bytes per state.
+    """
+
+    def __init__(self):
+        self._keys = set()
+
+    def add(self, key) -> bool:
+        key = state_hash(key)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def __contains__(self, key) -> bool:
+        return state_hash(key) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def nbytes(self) -> int:
+        # Size of the hash table, and the integer objects (Each 64-bit integer takes 36 bytes.)
+        return sys.getsizeof(self._keys) + len(self._keys) * sys.getsizeof(1 << 63)
+
+
+class FingerprintVisitedSet(VisitedSet):
+    """
+    Open-addressing table (linear probing) of 32-bit fingerprints in an `array`. It takes 4 bytes per slot.
+    Two states are confused when their fingerprints collide; with n states recorded,
+    the false-positive rate of a lookup is about n / 2^32.
+
+    The table doubles when it is 75% full, as far as the memory budget allows.
+    When it cannot grow any more, new states are not recorded (so they are reported as unvisited);
+    duplicates may be expanded again, but no state is pruned incorrectly because of the budget.
+    """
+
+    #: Ratio of used slots to grow the table
+    MAX_LOAD = 0.75
+
+    def __init__(self, capacity: int = 1 << 16, memory_budget: int = None):
+        """
+        :param capacity: Initial number of slots (rounded up to a power of two)
+        :param memory_budget: Maximum size of the table in bytes. If None, the table grows without bound.
+        """
+        self.memory_budget = memory_budget
+        slots = 1
+        while slots < capacity:
+            slots *= 2
+        if memory_budget is not None:
+            while slots > 1 and slots * 4 > memory_budget:
+                slots //= 2
+        self._table = array('I', bytes(slots * 4))
+        self._mask = slots - 1
+        self._count = 0
+        #: Number of states which could not be recorded because of the memory budget
+        self.dropped = 0
+
+    @staticmethod
+    def _fingerprint(key) -> int:
+        """
+        [PRIVATE] :return: Non-zero 32-bit fingerprint of the key (Zero marks an empty slot.)
+        """
+        key = state_hash(key)
+        return ((key >> 32) ^ key) & 0xFFFFFFFF or 1
+
+    def _find(self, fingerprint: int) -> int:
+        """
+        [PRIVATE] :return: Index of the slot having the fingerprint, or the empty slot to put it.
+        """
+        table, mask = self._table, self._mask
+        # The home slot is computed from the fingerprint only, so that the table can be rebuilt when it grows.
+        index = (fingerprint * 0x9E3779B1 >> 7) & mask
+        while table[index] != 0 and table[index] != fingerprint:
+            index = (index + 1) & mask
+        return index
+
+    def add(self, key) -> bool:
+        fingerprint = self._fingerprint(key)
+        index = self._find(fingerprint)
+        if self._table[index] == fingerprint:
+            return False
+
+        if self._count + 1 > len(self._table) * self.MAX_LOAD:
+            if not self._grow():
+                if self.dropped == 0:
+                    self._logger.warning(f'Fingerprint table is full within the memory budget '
+                                         f'({self.memory_budget} bytes); new states will not be recorded.')
+                self.dropped += 1
+                return True
+            index = self._find(fingerprint)
+
+        self._table[index] = fingerprint
+        self._count += 1
+        return True
+
+    def _grow(self) -> bool:
+        """
+        [PRIVATE] Double the table if the memory budget allows.
+
+        :return: True if the table has grown
+        """
+        slots = len(self._table) * 2
+        if self.memory_budget is not None and slots * 4 > self.memory_budget:
+            return False
+
+        old_table = self._table
+        self._table = array('I', bytes(slots * 4))
+        self._mask = slots - 1
+        for fingerprint in old_table:
+            if fingerprint != 0:
+                self._table[self._find(fingerprint)] = fingerprint
+        return True
+
+    def __contains__(self, key) -> bool:
+        fingerprint = self._fingerprint(key)
+        return self._table[self._find(fingerprint)] == fingerprint
+
+    def __len__(self):
+        return self._count
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self._table)
+
+
+class BloomVisitedSet(VisitedSet):
+    """
+    Bloom filter in a `bytearray`. It takes about 1.44 * log2(1 / error_rate) bits per state,
+    e.g., 29 bits (less than 4 bytes) for the false-positive rate of 1e-6.
+    The size of the filter is fixed: the false-positive rate increases when more than `capacity` states are added.
+    """
+
+    def __init__(self, capacity: int = 1 << 20, error_rate: float = 1e-6, memory_budget: int = None):
+        """
+        :param capacity: Expected number of states
+        :param error_rate: Desired false-positive rate when `capacity` states are added
+        :param memory_budget: Maximum size of the filter in bytes. If the desired rate needs more memory,
+            the filter uses the budget (and has a higher false-positive rate).
+        """
+        bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        if memory_budget is not None:
+            bits = min(bits, memory_budget * 8)
+        self._bits = max(bits, 8)
+        #: Number of hash functions, optimal for the capacity and the size
+        self.hashes = max(1, round(self._bits / capacity * math.log(2)))
+        self._filter = bytearray((self._bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, key):
+        """
+        [PRIVATE] Positions of bits for the key, by double hashing.
+        """
+        key = state_hash(key)
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        return [(h1 + i * h2) % self._bits for i in range(self.hashes)]
+
+    def add(self, key) -> bool:
+        new = False
+        for pos in self._positions(key):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self._filter[byte] & bit:
+                self._filter[byte] |= bit
+                new = True
+        if new:
+            self._count += 1
+        return new
+
+    def __contains__(self, key) -> bool:
+        return all(self._filter[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __len__(self):
+        # Number of states regarded as new. (States lost by false positives are not counted.)
+        return self._count
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self._filter)
+
+    def error_rate(self) -> float:
+        """
+        :return: Estimated false-positive rate at the current number of states
+        """
+        return (1 - math.exp(-self.hashes * self._count / self._bits)) ** self.hashes
+
+
+def make_visited_set(kind: str = 'exact', memory_budget: int = None, capacity: int = 1 << 20,
+                     error_rate: float = 1e-6) -> VisitedSet:
+    """
+    Make a visited-state set.
+
+    :param kind: Type of the backend. 'exact', 'fingerprint', or 'bloom'
+    :param memory_budget: Maximum memory for the set in bytes (ignored by 'exact')
+    :param capacity: Expected number of states
+    :param error_rate: Desired false-positive rate of 'bloom'
+    :return: Visited-state set
+    """
+    if kind == 'exact':
+        return ExactVisitedSet()
+    if kind == 'fingerprint':
+        return FingerprintVisitedSet(capacity=int(capacity / FingerprintVisitedSet.MAX_LOAD) + 1,
+                                     memory_budget=memory_budget)
+    if kind == 'bloom':
+        return BloomVisitedSet(capacity=capacity, error_rate=error_rate, memory_budget=memory_budget)
+    raise ValueError(f'Unknown type of visited set: {kind}')
+
+
+# Export visited-set classes and helper functions
+__all__ = ['VisitedSet', 'ExactVisitedSet', 'FingerprintVisitedSet', 'BloomVisitedSet',
+           'make_visited_set', 'state_hash']